@@ -0,0 +1,239 @@
+"""
+Load-generator benchmark.
+
+Drives `engine.core.run_performance_test` against a local stand-in target
+(`target_server.py`, run in a child process so its CPU is not charged to
+the generator) at each concurrency level and engine, and reports achieved
+requests/s, generator CPU per request and resident memory growth per
+request. It then times streaming metrics aggregation (`MetricsRecorder`,
+plus the list-based `calculate_metrics` up to `--list-max` results) for
+each result count. Run from the backend folder:
+
+    python benchmarks/bench_generator.py --engines thread async --concurrency 10 100 \\
+        --sizes 100000 1000000 10000000 --output bench.json
+
+`--live` runs every load row a second time with `LiveCounters` fed and
+the /metrics page rendered every `--scrape-interval` seconds, to show
+what scraping costs the generator.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine.core import run_performance_test  # noqa: E402
+from engine.live import LiveCounters, OpenMetricsPage  # noqa: E402
+from engine.metrics import MetricsRecorder, calculate_metrics  # noqa: E402
+from bench_per_url_metrics import synthetic_results  # noqa: E402
+from target_server import start_target  # noqa: E402
+
+SAMPLE_RESULTS = 100_000  # Distinct synthetic results cycled through by the aggregation bench
+
+
+def _serve(options, ready):
+    server = start_target(**options)
+    ready.send(server.base_url)
+    ready.close()
+    while True:
+        time.sleep(3600)
+
+
+def start_target_process(**options):
+    """Run a `TargetServer` in a child process; returns `(process, base_url)`."""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_serve, args=(options, sender), daemon=True)
+    process.start()
+    return process, receiver.recv()
+
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)  # Reaped worker processes
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _scrape(live, interval, stop):
+    scrapes = 0
+    while not stop.wait(interval):
+        page = OpenMetricsPage()
+        live.expose(page, {"test_id": "bench"})
+        page.render()
+        scrapes += 1
+    return scrapes
+
+
+def bench_load(urls, engine, concurrency, args, scraped=False):
+    live = LiveCounters() if scraped else None
+    stop = threading.Event()
+    scraper = threading.Thread(
+        target=_scrape, args=(live, args.scrape_interval, stop), daemon=True)
+    if scraped:
+        scraper.start()
+    cpu_before = _cpu_seconds()
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    summary, _ = run_performance_test(
+        urls=urls,
+        concurrency_steps=[concurrency],
+        phase_length=args.phase_length,
+        request_timeout=args.request_timeout,
+        save_to_s3=False,
+        send_email=False,
+        engine=engine,
+        keep_raw=args.keep_raw,
+        processes=args.processes,
+        save_locally=False,
+        live=live
+    )
+    elapsed = time.perf_counter() - start
+    if scraped:
+        stop.set()
+        scraper.join()
+    cpu = _cpu_seconds() - cpu_before
+    rss_growth = _rss_bytes() - rss_before
+    requests = summary.get("total_requests", 0)
+    return {
+        "benchmark": "load",
+        "engine": engine,
+        "concurrency": concurrency,
+        "processes": args.processes,
+        "scraped": scraped,
+        "requests": requests,
+        "errors": summary.get("error_count", 0),
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1) if elapsed else 0,
+        "cpu_percent": round(cpu / elapsed * 100, 1) if elapsed else 0,
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1) if requests else None,
+        "rss_growth_bytes": rss_growth,
+        "bytes_per_request": round(max(rss_growth, 0) / requests, 1) if requests else None,
+        "p50": (summary.get("percentiles") or {}).get("p50"),
+        "p99": (summary.get("percentiles") or {}).get("p99"),
+    }
+
+
+def bench_aggregation(count, url_count, list_max):
+    sample = list(synthetic_results(min(count, SAMPLE_RESULTS), url_count))
+    recorder = MetricsRecorder(keep_raw=False)
+    record = recorder.record
+    start = time.perf_counter()
+    for index in range(count):
+        record(sample[index % len(sample)])
+    recorded = time.perf_counter()
+    recorder.overall.summary()
+    recorder.per_url_summary()
+    summarized = time.perf_counter()
+
+    row = {
+        "benchmark": "aggregation",
+        "results": count,
+        "urls": url_count,
+        "record_seconds": round(recorded - start, 3),
+        "record_ns_per_result": round((recorded - start) / count * 1e9, 1),
+        "summary_seconds": round(summarized - recorded, 4),
+        "list_seconds": None,
+    }
+    if count <= list_max:
+        # The list path needs every result in memory at once
+        results = [sample[index % len(sample)] for index in range(count)]
+        start = time.perf_counter()
+        calculate_metrics(results)
+        row["list_seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def _print_row(row):
+    if row["benchmark"] == "load":
+        print(f"{row['engine']:>7} c={row['concurrency']:<6}{' live' if row['scraped'] else '     '} "
+              f"{row['requests']:>8} req  "
+              f"{row['rps']:>9.1f} req/s  {row['cpu_percent']:>6.1f}% cpu  "
+              f"{row['cpu_us_per_request'] or 0:>8.1f} us/req  "
+              f"{row['bytes_per_request'] or 0:>8.1f} B/req")
+    else:
+        list_seconds = "-" if row["list_seconds"] is None else f"{row['list_seconds']:.3f}s"
+        print(f"{row['results']:>10} results  {row['record_ns_per_result']:>8.1f} ns/result  "
+              f"summary {row['summary_seconds']:.4f}s  list {list_seconds}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engines", nargs="+", default=["thread", "async"])
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[10, 100],
+                        help="closed-model levels for the load bench (none to skip)")
+    parser.add_argument("--phase-length", type=float, default=5)
+    parser.add_argument("--request-timeout", type=float, default=10)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--keep-raw", action="store_true", help="retain raw result dicts")
+    parser.add_argument("--live", action="store_true",
+                        help="repeat each load row with live counters scraped")
+    parser.add_argument("--scrape-interval", type=float, default=1.0,
+                        help="seconds between renders of the metrics page with --live")
+    parser.add_argument("--latency", type=float, default=0.0, help="target seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="target fraction of 500s")
+    parser.add_argument("--body-size", type=int, default=1024, help="target response bytes")
+    parser.add_argument("--urls", type=int, default=10, help="distinct target URLs")
+    parser.add_argument("--sizes", type=int, nargs="*",
+                        default=[100_000, 1_000_000, 10_000_000],
+                        help="result counts for the aggregation bench (none to skip)")
+    parser.add_argument("--list-max", type=int, default=1_000_000,
+                        help="largest result count to also time calculate_metrics on")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per row")
+    parser.add_argument("--output", help="also write all rows and run metadata to this file")
+    args = parser.parse_args()
+
+    rows = []
+
+    def emit(row):
+        rows.append(row)
+        if args.json:
+            print(json.dumps(row), flush=True)
+        else:
+            _print_row(row)
+
+    if args.concurrency:
+        process, base_url = start_target_process(
+            latency=args.latency, error_rate=args.error_rate, body_size=args.body_size)
+        try:
+            urls = [f"{base_url}/page/{i}" for i in range(args.urls)]
+            for engine in args.engines:
+                for concurrency in args.concurrency:
+                    emit(bench_load(urls, engine, concurrency, args))
+                    if args.live:
+                        emit(bench_load(urls, engine, concurrency, args, scraped=True))
+        finally:
+            process.terminate()
+            process.join()
+
+    for size in args.sizes:
+        emit(bench_aggregation(size, args.urls, args.list_max))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "args": vars(args),
+                },
+                "rows": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
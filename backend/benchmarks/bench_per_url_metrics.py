@@ -0,0 +1,82 @@
+"""
+Per-URL aggregation benchmark.
+
+Times the per-URL aggregation results go through while a test runs
+(`MetricsRecorder.record` into one `MetricsAggregate` per URL, then
+`per_url_summary`) on synthetic results for growing result counts, and
+reports nanoseconds per result; a flat ns/result column means the
+aggregation scales linearly. Run from the backend folder:
+
+    python benchmarks/bench_per_url_metrics.py --urls 300 --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from engine.metrics import MetricsRecorder  # noqa: E402
+
+
+def synthetic_results(count, url_count, seed=0):
+    rng = random.Random(seed)
+    urls = [f"https://example.com/page/{i}" for i in range(url_count)]
+    for _ in range(count):
+        if rng.random() < 0.02:
+            yield {
+                "url": rng.choice(urls),
+                "status_code": "error",
+                "latency": rng.uniform(0.5, 10.0),
+                "success": False,
+                "error": rng.choice(["Read timed out", "Connection refused"]),
+            }
+        else:
+            yield {
+                "url": rng.choice(urls),
+                "status_code": rng.choice((200, 200, 200, 301, 404, 500)),
+                "latency": rng.lognormvariate(-3, 0.8),
+                "success": True,
+                "error": None,
+            }
+
+
+def bench(count, url_count):
+    results = list(synthetic_results(count, url_count))
+    recorder = MetricsRecorder(keep_raw=False)
+    start = time.perf_counter()
+    for result in results:
+        recorder.record(result)
+    recorder.per_url_summary()
+    elapsed = time.perf_counter() - start
+    return {
+        "results": count,
+        "urls": url_count,
+        "seconds": round(elapsed, 4),
+        "ns_per_result": round(elapsed / count * 1e9, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=300)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--json", action="store_true",
+                        help="emit one JSON object per size")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        row = bench(size, args.urls)
+        if args.json:
+            print(json.dumps(row))
+        else:
+            print(f"{row['results']:>10} results  {row['urls']:>5} urls  "
+                  f"{row['seconds']:>8.3f}s  {row['ns_per_result']:>8.1f} ns/result")
+
+
+if __name__ == "__main__":
+    main()
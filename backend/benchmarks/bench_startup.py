@@ -0,0 +1,143 @@
+"""
+Startup benchmark.
+
+Imports each module (by default `app`, what the container runs, and
+`engine.session`, what every worker process loads) in a fresh interpreter
+under `python -X importtime`, and reports the median import time and the
+slowest modules it pulled in. It also checks that the lazily loaded
+optional subsystems (`LAZY_MODULES`) stay out of each import. Exits non-zero
+when `app` exceeds `STARTUP_IMPORT_BUDGET` or a lazy module was imported
+eagerly. Run from the backend folder:
+
+    python benchmarks/bench_startup.py --runs 5 --output startup.json
+
+`--cold` gives every run an empty bytecode cache, like a fresh container
+image without precompiled `.pyc` files.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from config import STARTUP_IMPORT_BUDGET  # noqa: E402
+
+# Loaded on first use only: S3 uploads, the run history index, and the
+# threaded engine's HTTP client (Socket.IO's client still pulls requests
+# into `app`, so it is only checked for engine.session)
+LAZY_MODULES = {
+    "app": ("boto3", "botocore", "sqlite3"),
+    "engine.session": ("boto3", "botocore", "sqlite3", "requests", "urllib3"),
+}
+
+_PROBE = "import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+
+
+def import_once(module, cold):
+    """One fresh-interpreter import: (seconds, {module: (self_us, cumulative_us)}, loaded)."""
+    command = [sys.executable, "-X", "importtime"]
+    with tempfile.TemporaryDirectory() as cache:
+        if cold:
+            command += ["-X", f"pycache_prefix={cache}"]
+        command += ["-c", _PROBE.format(module=module)]
+        started = time.perf_counter()
+        proc = subprocess.run(command, cwd=SRC, capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - started
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(own), int(cumulative))
+    total = modules[module][1] / 1e6 if module in modules else wall
+    return total, wall, modules, set(json.loads(proc.stdout))
+
+
+def bench_import(module, runs, cold, top):
+    totals, walls = [], []
+    for _ in range(runs):
+        total, wall, modules, loaded = import_once(module, cold)
+        totals.append(total)
+        walls.append(wall)
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        "benchmark": "import",
+        "module": module,
+        "cold": cold,
+        "runs": runs,
+        "import_seconds": round(statistics.median(totals), 4),
+        "import_seconds_max": round(max(totals), 4),
+        "process_seconds": round(statistics.median(walls), 4),
+        "modules": len(modules),
+        "slowest": [{"module": name, "self_ms": round(own / 1000, 2)}
+                    for name, (own, _) in slowest],
+        "eager": sorted(name for name in LAZY_MODULES.get(module, ()) if name in loaded),
+    }
+
+
+def _print_row(row):
+    print(f"{row['module']:<16} {row['import_seconds'] * 1000:>8.1f} ms import  "
+          f"{row['process_seconds'] * 1000:>8.1f} ms process  {row['modules']:>5} modules"
+          f"{'  (cold)' if row['cold'] else ''}")
+    print("    slowest: " + ", ".join(
+        f"{entry['module']} {entry['self_ms']:.1f}ms" for entry in row["slowest"]))
+    if row["eager"]:
+        print(f"    imported eagerly: {', '.join(row['eager'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=["app", "engine.session"])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--cold", action="store_true", help="empty bytecode cache on every run")
+    parser.add_argument("--top", type=int, default=8, help="slowest modules to list")
+    parser.add_argument("--budget", type=float, default=STARTUP_IMPORT_BUDGET,
+                        help="seconds `import app` may take")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per row")
+    parser.add_argument("--output", help="also write all rows and run metadata to this file")
+    args = parser.parse_args()
+
+    rows = []
+    failures = []
+    for module in args.modules:
+        row = bench_import(module, args.runs, args.cold, args.top)
+        rows.append(row)
+        if args.json:
+            print(json.dumps(row), flush=True)
+        else:
+            _print_row(row)
+        if module == "app" and row["import_seconds"] > args.budget:
+            failures.append(f"import app took {row['import_seconds']:.3f}s, "
+                            f"over the {args.budget:.3f}s budget")
+        if row["eager"]:
+            failures.append(f"{module} imported {', '.join(row['eager'])} eagerly")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpus": os.cpu_count(),
+                    "args": vars(args),
+                },
+                "rows": rows,
+                "failures": failures,
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"[STARTUP] {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
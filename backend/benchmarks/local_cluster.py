@@ -0,0 +1,85 @@
+"""
+Run a distributed test entirely on localhost.
+
+Starts a stand-in target, a coordinator on an ephemeral port and N worker
+nodes (`python src/app.py --worker HOST:PORT` subprocesses), then runs a
+short test through `DistributedSession` and prints the merged summary:
+
+    python benchmarks/local_cluster.py --workers 3 --concurrency 30 60 --phase-length 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(BACKEND, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine.cluster import ClusterCoordinator, DistributedSession  # noqa: E402
+from engine.core import run_performance_test  # noqa: E402
+from target_server import start_target  # noqa: E402
+
+
+def run_distributed(coordinator, target, args):
+    with DistributedSession(coordinator, engine=args.engine) as session:
+        summary, _ = run_performance_test(
+            urls=[f"{target.base_url}/", f"{target.base_url}/slow?latency=0.1"],
+            concurrency_steps=args.concurrency,
+            phase_length=args.phase_length,
+            request_timeout=10,
+            save_to_s3=False,
+            send_email=False,
+            session=session
+        )
+    return summary
+
+
+async def run(args):
+    target = start_target(latency=args.latency)
+    token = secrets.token_hex(16)
+    coordinator = ClusterCoordinator(token=token)
+    await coordinator.start("127.0.0.1", 0)
+    port = coordinator.port
+
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND, "src", "app.py"),
+             "--worker", f"127.0.0.1:{port}"],
+            cwd=os.path.join(BACKEND, "src"),
+            env={**os.environ, "CLUSTER_TOKEN": token},
+        )
+        for _ in range(args.workers)
+    ]
+    try:
+        while len(coordinator.workers) < args.workers:
+            await asyncio.sleep(0.1)
+
+        # The session blocks on the coordinator's loop, so drive it (and
+        # close it) from a worker thread rather than from this loop.
+        summary = await asyncio.to_thread(run_distributed, coordinator, target, args)
+        summary.pop("error_results", None)
+        print(json.dumps(summary, indent=2, default=str))
+    finally:
+        for worker in workers:
+            worker.terminate()
+        await coordinator.stop()
+        target.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local multi-node load test")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[30, 60])
+    parser.add_argument("--phase-length", type=float, default=5)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--engine", default="async")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
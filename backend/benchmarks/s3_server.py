@@ -0,0 +1,162 @@
+"""
+Local S3-compatible stand-in for exercising the result upload pipeline.
+
+Implements the path-style subset the uploader uses — PutObject, GetObject,
+CreateMultipartUpload, UploadPart, CompleteMultipartUpload and
+AbortMultipartUpload — keeping objects in memory. `--fail-rate` answers a
+fraction of writes with 503 SlowDown to exercise retries:
+
+    python benchmarks/s3_server.py --port 9000 --fail-rate 0.2
+    S3_ENDPOINT_URL=http://127.0.0.1:9000 AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x \\
+        AWS_DEFAULT_REGION=us-east-1 S3_UPLOAD=true python src/app.py
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class S3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _target(self):
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        query = {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        return bucket, key, query
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _xml(self, status, body):
+        self._reply(status, body.encode("utf-8"), {"Content-Type": "application/xml"})
+
+    def _fail_write(self):
+        if random.random() < self.server.fail_rate:
+            self._xml(503, "<Error><Code>SlowDown</Code><Message>Injected failure</Message></Error>")
+            return True
+        return False
+
+    def do_PUT(self):
+        bucket, key, query = self._target()
+        data = self._body()
+        if not key:
+            self._reply(200)
+            return
+        if self._fail_write():
+            return
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self.server.lock:
+            if "uploadId" in query:
+                upload = self.server.uploads.get(query["uploadId"])
+                if upload is None:
+                    self._xml(404, "<Error><Code>NoSuchUpload</Code></Error>")
+                    return
+                upload[int(query["partNumber"])] = data
+            else:
+                self.server.objects[(bucket, key)] = data
+        self._reply(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        bucket, key, query = self._target()
+        self._body()
+        if self._fail_write():
+            return
+        with self.server.lock:
+            if "uploads" in query:
+                upload_id = uuid.uuid4().hex
+                self.server.uploads[upload_id] = {}
+                self._xml(200, (
+                    "<InitiateMultipartUploadResult>"
+                    f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>"))
+                return
+            upload = self.server.uploads.pop(query.get("uploadId"), None)
+            if upload is None:
+                self._xml(404, "<Error><Code>NoSuchUpload</Code></Error>")
+                return
+            self.server.objects[(bucket, key)] = b"".join(
+                upload[number] for number in sorted(upload))
+        self._xml(200, (
+            "<CompleteMultipartUploadResult>"
+            f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>\"{uuid.uuid4().hex}\"</ETag>"
+            "</CompleteMultipartUploadResult>"))
+
+    def do_DELETE(self):
+        bucket, key, query = self._target()
+        with self.server.lock:
+            if "uploadId" in query:
+                self.server.uploads.pop(query["uploadId"], None)
+            else:
+                self.server.objects.pop((bucket, key), None)
+        self._reply(204)
+
+    def do_GET(self):
+        bucket, key, _ = self._target()
+        data = self.server.objects.get((bucket, key))
+        if data is None:
+            self._xml(404, "<Error><Code>NoSuchKey</Code></Error>")
+            return
+        self._reply(200, data, {"Content-Type": "application/octet-stream"})
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class S3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fail_rate=0.0):
+        super().__init__(address, S3Handler)
+        self.fail_rate = fail_rate
+        self.objects = {}  # (bucket, key) -> bytes
+        self.uploads = {}  # upload id -> {part number: bytes}
+        self.lock = threading.Lock()
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_s3(host="127.0.0.1", port=0, fail_rate=0.0):
+    """Start an `S3Server` on a background thread; call `.shutdown()` to stop it."""
+    server = S3Server((host, port), fail_rate=fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local S3-compatible stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="fraction of writes answered with 503 SlowDown")
+    args = parser.parse_args()
+
+    server = S3Server((args.host, args.port), fail_rate=args.fail_rate)
+    print(f"Serving S3 stand-in on {server.endpoint_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
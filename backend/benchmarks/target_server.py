@@ -0,0 +1,101 @@
+"""
+Local stand-in target for the load generator.
+
+A keep-alive HTTP/1.1 server with configurable latency, error injection and
+body size. Use it in-process via `start_target()` or run it standalone:
+
+    python benchmarks/target_server.py --port 8081 --latency 0.02 --error-rate 0.01
+
+Query parameters override the defaults per request, e.g.
+`/page?latency=0.2&status=503&size=4096`.
+"""
+
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class TargetHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _respond(self, send_body=True):
+        options = self.server.options
+        query = {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+        latency = float(query.get("latency", options["latency"]))
+        if latency > 0:
+            time.sleep(latency)
+
+        status = int(query.get("status", 200))
+        if status == 200 and random.random() < float(query.get("error_rate", options["error_rate"])):
+            status = 500
+
+        body = b"x" * int(query.get("size", options["body_size"]))
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._respond()
+
+    def log_message(self, *args):
+        pass
+
+
+class TargetServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=0.0, error_rate=0.0, body_size=1024):
+        super().__init__(address, TargetHandler)
+        self.options = {"latency": latency, "error_rate": error_rate, "body_size": body_size}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_target(host="127.0.0.1", port=0, **options):
+    """Start a `TargetServer` on a background thread; call `.shutdown()` to stop it."""
+    server = TargetServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in HTTP target")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500s")
+    parser.add_argument("--body-size", type=int, default=1024, help="response bytes")
+    args = parser.parse_args()
+
+    server = TargetServer((args.host, args.port), latency=args.latency,
+                          error_rate=args.error_rate, body_size=args.body_size)
+    print(f"Serving stand-in target on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,37 @@
 import os
+import re
+import hmac
+import math
+import json
+import time
 import asyncio
+import secrets
+from collections import deque
 import socketio
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from asgiref.wsgi import WsgiToAsgi
 
 from engine.core import run_performance_test
-from url_loader import validate_urls, load_urls_from_json
-from config import CONCURRENCY_STEPS, PHASE_LENGTH, REQUEST_TIMEOUT
+from engine.session import LoadSession, TestCancelled
+from engine.workers import resolve_process_count
+from engine.cluster import ClusterCoordinator, DistributedSession, run_worker_node
+from engine.metrics import ProgressTracker, MetricsRecorder
+from engine.live import LiveCounters, OpenMetricsPage, CONTENT_TYPE, expose_process
+from engine.profiles import LoadProfile
+from engine.scenario import ScenarioPlan, check_step
+from engine.client import BodyPolicy
+from engine.search import BreakingPointSearch
+from engine.history import RunHistory, target_of
+from engine.store import ResultStoreWriter
+from engine.upload import save_results_locally, S3Uploader
+from url_loader import load_url_table, load_urls_from_json, load_scenario
+from config import (CONCURRENCY_STEPS, PHASE_LENGTH, REQUEST_TIMEOUT, ENGINES, DEFAULT_ENGINE,
+                    KEEP_RAW_RESULTS, PROGRESS_INTERVAL, PROGRESS_MIN_INTERVAL,
+                    CLUSTER_HOST, CLUSTER_PORT, RESULT_STORE, RESULT_STORE_DIR,
+                    S3_UPLOAD, OUTPUT_PREFIX, ARRIVAL_MAX_IN_FLIGHT, PROFILE_TICK,
+                    MAX_RUNNING_TESTS, TEST_USER_BUDGET, TEST_PROCESS_BUDGET, RUN_HISTORY,
+                    METRICS_ENDPOINT, METRICS_RETENTION)
 
 # -------------------------------------------------
 # Flask (HTTP / Health / Metadata)
@@ -29,6 +53,67 @@ def root():
     }), 200
 
 
+@flask_app.route("/metrics", methods=["GET"])
+def scrape_metrics():
+    """
+    OpenMetrics page for Prometheus: per-test request, error and latency
+    counters, in-flight requests, generator health and this process's own
+    resources. Runs on a WSGI thread and only reads counters the engines
+    keep anyway, so scraping never slows a test down.
+    """
+    if not METRICS_ENDPOINT:
+        return jsonify({"error": "The metrics endpoint is disabled"}), 404
+    page = OpenMetricsPage()
+    current = list(tests.tests.values())
+    page.add("loadtest_tests", "gauge", "Tests by state", len([r for r in current if r.task]),
+             labels={"state": "running"})
+    page.add("loadtest_tests", "gauge", None, len([r for r in current if not r.task]),
+             labels={"state": "queued"})
+    for run in current:
+        if run.task is not None:
+            expose_test(page, run, running=True)
+    # A test_id that was reused shows its latest run only
+    now = time.monotonic()
+    shown = {run.test_id for run in current}
+    for expires, run in reversed(list(tests.finished)):
+        if expires > now and run.test_id not in shown:
+            shown.add(run.test_id)
+            expose_test(page, run, running=False)
+    expose_process(page)
+    return Response(page.render(), status=200, content_type=CONTENT_TYPE)
+
+
+@flask_app.route("/history", methods=["GET"])
+def list_runs():
+    if history is None:
+        return jsonify({"error": "Run history is disabled"}), 404
+    return jsonify(history.runs(
+        target=request.args.get("target"),
+        user_id=request.args.get("user_id"),
+        limit=request.args.get("limit", 20, type=int))), 200
+
+
+@flask_app.route("/history/<test_id>", methods=["GET"])
+def get_run(test_id):
+    if history is None:
+        return jsonify({"error": "Run history is disabled"}), 404
+    try:
+        return jsonify(history.run(test_id)), 200
+    except LookupError as exc:
+        return jsonify({"error": str(exc)}), 404
+
+
+@flask_app.route("/history/<test_id>/compare", methods=["GET"])
+def compare_run(test_id):
+    """Diff a run against `?baseline=<test_id>`, or the previous run against the same target."""
+    if history is None:
+        return jsonify({"error": "Run history is disabled"}), 404
+    try:
+        return jsonify(history.compare(test_id, request.args.get("baseline"))), 200
+    except LookupError as exc:
+        return jsonify({"error": str(exc)}), 404
+
+
 # -------------------------------------------------
 # Socket.IO (ASGI / WebSocket)
 # -------------------------------------------------
@@ -41,10 +126,28 @@ sio = socketio.AsyncServer(
 # Wrap Flask WSGI app so it can live inside ASGI
 flask_asgi_app = WsgiToAsgi(flask_app)
 
+# Worker nodes register here when CLUSTER_PORT is set
+coordinator = ClusterCoordinator()
+
+# Finished tests are indexed here for comparisons
+history = RunHistory() if RUN_HISTORY else None
+
+
+async def on_startup():
+    if CLUSTER_PORT:
+        await coordinator.start(CLUSTER_HOST, CLUSTER_PORT)
+
+
+async def on_shutdown():
+    await coordinator.stop()
+
+
 # Final ASGI application
 asgi_app = socketio.ASGIApp(
     sio,
-    other_asgi_app=flask_asgi_app
+    other_asgi_app=flask_asgi_app,
+    on_startup=on_startup,
+    on_shutdown=on_shutdown
 )
 
 # -------------------------------------------------
@@ -58,6 +161,7 @@ async def connect(sid, environ):
     await sio.emit(
         "connected",
         {"message": "WebSocket connected"},
+        to=sid,
     )
 
 
@@ -69,20 +173,32 @@ async def disconnect(sid):
 @sio.event
 async def start_test(sid, data):
     """
-    Starts a stateless performance test in the background.
-    Emits:
+    Starts a stateless performance test in the background, or queues it
+    while the global load budget is in use. Emits to the test's room:
+      - test_queued (when it has to wait)
       - test_started
+      - phase_progress (every progress_interval seconds during a phase)
       - phase_complete (per phase)
-      - test_completed
+      - test_completed, or test_stopped after stop_test
     """
     try:
-        urls = data.get("urls") or load_urls_from_json()
-        urls = validate_urls(urls)
+        scenario = None
+        if data.get("scenario"):
+            scenario = load_scenario(data["scenario"])
+            # Compiling validates the definition; phases report its URL templates
+            urls = ScenarioPlan(scenario).urls
+        elif data.get("url_source"):
+            # Sitemap, HAR capture or URL list file, streamed into a weighted table
+            urls = await asyncio.to_thread(load_url_table, data["url_source"])
+            print(f"[URLS] Loaded {len(urls)} distinct URLs from {data['url_source']}")
+        else:
+            urls = load_url_table(data.get("urls") or load_urls_from_json())
 
         if not urls:
             await sio.emit(
                 "error",
                 {"error": "No valid URLs provided"},
+                to=sid,
             )
             return
 
@@ -92,150 +208,640 @@ async def start_test(sid, data):
             await sio.emit(
                 "error",
                 {"error": "test_id and user_id are required"},
+                to=sid,
             )
             return
 
         concurrency_steps = data.get("concurrency", CONCURRENCY_STEPS)
+        if data.get("arrival_rates"):
+            rates = data["arrival_rates"]
+            if not isinstance(rates, list) or not all(
+                    isinstance(rate, (int, float)) and not isinstance(rate, bool)
+                    and math.isfinite(rate) and rate > 0 for rate in rates):
+                await sio.emit(
+                    "error",
+                    {"error": "arrival_rates must be a list of positive numbers"},
+                    to=sid,
+                )
+                return
+            # Open-model test: one constant-arrival-rate phase per entry
+            concurrency_steps = [
+                {"rate": rate} for rate in data["arrival_rates"]]
+        if data.get("load_profile"):
+            # One profile-driven phase per entry; each sets its own duration
+            profiles = data["load_profile"]
+            if isinstance(profiles, dict):
+                profiles = [profiles]
+            for profile in profiles:
+                LoadProfile(profile)  # Raises ValueError on a bad spec
+            concurrency_steps = [{"profile": profile} for profile in profiles]
+        search = None
+        if data.get("breaking_point"):
+            # Steps are chosen one at a time from each step's SLO verdict
+            search = BreakingPointSearch(data["breaking_point"])
+        if scenario is not None:
+            for step in [search.step_for(search.start)] if search else concurrency_steps:
+                check_step(step)
+        baseline = data.get("baseline")
+        if baseline is not None and history is None:
+            await sio.emit(
+                "error",
+                {"error": "baseline comparison needs RUN_HISTORY enabled"},
+                to=sid,
+            )
+            return
+        body_policy = data.get("body_policy")
+        if body_policy is not None:
+            BodyPolicy(body_policy)  # Raises ValueError on a bad spec
         phase_length = data.get("phase_length", PHASE_LENGTH)
         request_timeout = data.get("request_timeout", REQUEST_TIMEOUT)
+        engine = data.get("engine", DEFAULT_ENGINE)
+        keep_raw = bool(data.get("keep_raw_results", KEEP_RAW_RESULTS))
+        store_results = bool(data.get("store_results", RESULT_STORE))
+        upload_to_s3 = bool(data.get("upload_to_s3", S3_UPLOAD))
+        processes = resolve_process_count(data.get("processes", 1))
+        distributed = bool(data.get("distributed", False))
+
+        if distributed and not coordinator.workers:
+            await sio.emit(
+                "error",
+                {"error": "distributed test requested but no cluster workers are registered"},
+                to=sid,
+            )
+            return
+        progress_interval = max(
+            float(data.get("progress_interval", PROGRESS_INTERVAL)),
+            PROGRESS_MIN_INTERVAL)
+
+        if engine not in ENGINES:
+            await sio.emit(
+                "error",
+                {"error": f"engine must be one of {', '.join(ENGINES)}"},
+                to=sid,
+            )
+            return
 
-        asyncio.create_task(
-            run_test_in_background(
-                sid=sid,
-                test_id=test_id,
+        run = TestRun(
+            sid=sid,
+            test_id=test_id,
+            user_id=user_id,
+            users=estimate_users(concurrency_steps, search, request_timeout),
+            processes=processes,
+            options=dict(
                 urls=urls,
                 concurrency_steps=concurrency_steps,
                 phase_length=phase_length,
                 request_timeout=request_timeout,
-                user_id=user_id
+                engine=engine,
+                keep_raw=keep_raw,
+                store_results=store_results,
+                upload_to_s3=upload_to_s3,
+                progress_interval=progress_interval,
+                processes=processes,
+                distributed=distributed,
+                search=search,
+                scenario=scenario,
+                body_policy=body_policy,
+                baseline=baseline
             )
         )
+        # Only the requesting client (in the test's room) sees its events.
+        # Joining after submit() accepted the test_id keeps a duplicate
+        # start_test out of the room of the test already using it; the
+        # test's first event waits for pre-warming, well after the join.
+        position = tests.submit(run)
+        await sio.enter_room(sid, run.room)
+        if position:
+            await sio.emit(
+                "test_queued",
+                {"message": "Test queued", "test_id": test_id, "position": position,
+                 "stop_token": run.stop_token},
+                to=run.room,
+            )
+            print(f"[TEST] Queued test {test_id} for user {user_id} at position {position}")
 
+    except Exception as exc:
+        print(f"[ERROR] start_test failed: {exc}")
         await sio.emit(
-            "test_started",
-            {"message": "Test started", "test_id": test_id},
+            "error",
+            {"error": str(exc)},
+            to=sid,
         )
 
-        print(
-            f"[TEST] Started test {test_id} for client {sid} and user {user_id}")
 
-    except Exception as exc:
-        print(f"[ERROR] start_test failed: {exc}")
+def _authorized_run(sid, data):
+    """The test `data` names, if `sid` started it or sent its `stop_token`, else None."""
+    run = tests.get(data.get("test_id"))
+    if run is None or (sid != run.sid and not hmac.compare_digest(
+            str(data.get("stop_token", "")), run.stop_token)):
+        return None
+    return run
+
+
+@sio.event
+async def join_test(sid, data):
+    """
+    Rejoins the room of a running or queued test after a reconnect, which
+    gives the client a new sid in no room. Requires the test's
+    `stop_token`, checked like `stop_test`. Emits `test_joined` with the
+    test's status and current phase.
+    """
+    data = data or {}
+    run = _authorized_run(sid, data)
+    if run is None:
+        await sio.emit(
+            "error",
+            {"error": f"No running or queued test {data.get('test_id')}"},
+            to=sid,
+        )
+        return
+    await sio.enter_room(sid, run.room)
+    await sio.emit(
+        "test_joined",
+        {"test_id": run.test_id, "status": "running" if run.task is not None else "queued",
+         "phase": run.phase},
+        to=sid,
+    )
+    print(f"[TEST] Client {sid} rejoined test {run.test_id}")
+
+
+@sio.event
+async def stop_test(sid, data):
+    """
+    Stops a running test, cancelling its in-flight requests, or drops a
+    queued one. Only the client that started it may stop it, or one that
+    sends the `stop_token` from `test_queued`/`test_started` (e.g. after
+    reconnecting). Emits `test_stopped` to the test's room.
+    """
+    data = data or {}
+    run = _authorized_run(sid, data)
+    if run is None:
+        await sio.emit(
+            "error",
+            {"error": f"No running or queued test {data.get('test_id')}"},
+            to=sid,
+        )
+        return
+    await tests.stop(run)
+
+
+@sio.event
+async def compare_runs(sid, data):
+    """
+    Diffs a recorded run (`test_id`) against `baseline_id`, or by default
+    the previous completed run against the same target. Emits `comparison`.
+    """
+    data = data or {}
+    try:
+        if history is None:
+            raise LookupError("Run history is disabled")
+        comparison = await asyncio.to_thread(
+            history.compare, data.get("test_id"), data.get("baseline_id"))
+    except LookupError as exc:
         await sio.emit(
             "error",
             {"error": str(exc)},
+            to=sid,
         )
+        return
+    await sio.emit(
+        "comparison",
+        comparison,
+        to=sid,
+    )
+
+
+# -------------------------------------------------
+# Test Manager
+# -------------------------------------------------
+
+def estimate_users(concurrency_steps, search, request_timeout):
+    """
+    Peak virtual users a test can reach, charging arrival-rate load as its
+    worst-case in-flight requests (rate x request timeout, capped by
+    max_in_flight). A search without a `max` is charged the whole budget.
+    """
+    if search is not None:
+        if search.max_level is None:
+            return TEST_USER_BUDGET
+        concurrency_steps = [search.step_for(search.max_level)]
+    peak = 0
+    for step in concurrency_steps:
+        if isinstance(step, dict) and "profile" in step:
+            profile = LoadProfile(step["profile"])
+            samples = int(profile.duration / PROFILE_TICK) + 1
+            level = max(profile.total(i * PROFILE_TICK) for i in range(samples))
+            if profile.model == "rate":
+                level = min(level * request_timeout,
+                            step["profile"].get("max_in_flight", ARRIVAL_MAX_IN_FLIGHT))
+        elif isinstance(step, dict):
+            level = min(step["rate"] * request_timeout,
+                        step.get("max_in_flight", ARRIVAL_MAX_IN_FLIGHT))
+        else:
+            level = step
+        peak = max(peak, level)
+    return math.ceil(peak)
+
+
+class TestRun:
+    """
+    One started test: its budget share, options and, once running, its task,
+    session and the live state /metrics reads (counters, current phase and
+    its progress tracker, last generator report).
+    """
+
+    def __init__(self, sid, test_id, user_id, users, processes, options):
+        self.sid = sid
+        self.test_id = test_id
+        self.user_id = user_id
+        self.room = f"test:{test_id}"
+        self.users = users
+        self.processes = processes
+        self.options = options
+        self.task = None
+        self.session = None
+        self.cancelled = False
+        self.live = LiveCounters()
+        self.phase = 0
+        self.tracker = None
+        self.generator = None
+        self.uploader = None
+        self.stop_token = secrets.token_urlsafe(16)  # Lets the starting client stop it from elsewhere
+
+    def cancel(self):
+        self.cancelled = True
+        if self.session is not None:
+            self.session.cancel()
+
+
+class TestManager:
+    """
+    Tracks every test by `test_id` from `start_test` until it ends.
+
+    Tests start in arrival order while the running ones stay within the
+    global budget: `MAX_RUNNING_TESTS` tests, `TEST_USER_BUDGET` virtual
+    users (see `estimate_users`) and `TEST_PROCESS_BUDGET` load-generating
+    processes. The rest wait in a queue and start as running tests finish.
+    """
+
+    def __init__(self, max_tests=MAX_RUNNING_TESTS, user_budget=TEST_USER_BUDGET,
+                 process_budget=TEST_PROCESS_BUDGET):
+        self.max_tests = max_tests
+        self.user_budget = user_budget
+        self.process_budget = process_budget
+        self.tests = {}
+        self.queue = deque()
+        self.finished = deque()  # (expiry, run) of ended tests still shown on /metrics
+
+    def get(self, test_id):
+        return self.tests.get(test_id)
+
+    @property
+    def running(self):
+        return [run for run in self.tests.values() if run.task is not None]
+
+    def _fits(self, run):
+        running = self.running
+        return (len(running) < self.max_tests
+                and sum(r.users for r in running) + run.users <= self.user_budget
+                and sum(r.processes for r in running) + run.processes <= self.process_budget)
+
+    def submit(self, run):
+        """Start `run` or queue it; returns its queue position (0 when started)."""
+        if run.test_id in self.tests:
+            raise ValueError(f"Test {run.test_id} is already running or queued")
+        if run.users > self.user_budget:
+            raise ValueError(
+                f"Test needs {run.users} virtual users but the budget is {self.user_budget}")
+        if run.processes > self.process_budget:
+            raise ValueError(
+                f"Test needs {run.processes} processes but the budget is {self.process_budget}")
+        self.tests[run.test_id] = run
+        self.queue.append(run)
+        self._admit()
+        return 0 if run.task is not None else self.queue.index(run) + 1
+
+    def _admit(self):
+        # Strict arrival order, so a large test is not starved by small ones
+        while self.queue and self._fits(self.queue[0]):
+            run = self.queue.popleft()
+            run.task = asyncio.create_task(self._run(run))
+
+    async def _run(self, run):
+        try:
+            await run_test_in_background(run=run, **run.options)
+        finally:
+            del self.tests[run.test_id]
+            now = time.monotonic()
+            while self.finished and self.finished[0][0] <= now:
+                self.finished.popleft()
+            self.finished.append((now + METRICS_RETENTION, run))
+            self._admit()
+
+    async def stop(self, run):
+        if run.task is not None:
+            # The running phase raises TestCancelled; the runner emits test_stopped
+            run.cancel()
+            return
+        self.queue.remove(run)
+        del self.tests[run.test_id]
+        print(f"[TEST] Removed queued test {run.test_id}")
+        await sio.emit(
+            "test_stopped",
+            {"test_id": run.test_id, "user_id": run.user_id, "completed_phases": 0,
+             "phase_summaries": []},
+            to=run.room,
+        )
+
+
+tests = TestManager()
+
+
+def expose_test(page, run, running):
+    """Add one test's series to an `OpenMetricsPage`, labelled with its test and user."""
+    labels = {"test_id": str(run.test_id), "user_id": str(run.user_id)}
+    page.add("loadtest_test_running", "gauge", "1 while the test runs, 0 once it ended",
+             int(running), labels=labels)
+    page.add("loadtest_phase", "gauge", "Current (or last) phase number", run.phase, labels=labels)
+    tracker = run.tracker
+    in_flight = max(tracker.in_flight, 0) if running and tracker is not None else 0
+    page.add("loadtest_in_flight_requests", "gauge", "Requests sent and not yet completed",
+             in_flight, labels=labels)
+    run.live.expose(page, labels)
+
+    # Live samples of the in-process generator, else the last phase's report
+    monitor = getattr(run.session, "monitor", None)
+    sample = monitor.current() if running and monitor is not None else {}
+    report = run.generator or {}
+    cpu = sample.get("cpu_percent")
+    if cpu is None:
+        cpu = report.get("cpu_percent", {}).get("mean")
+    lag = sample.get("scheduling_lag")
+    if lag is None:
+        lag = report.get("scheduling_lag", {}).get("p90")
+    if cpu is not None:
+        page.add("loadtest_generator_cpu_percent", "gauge",
+                 "Load generator CPU, 100 = one core", cpu, labels=labels)
+    if lag is not None:
+        page.add("loadtest_generator_scheduling_lag_seconds", "gauge",
+                 "Delay before the generator's event loop or thread pool runs a callback",
+                 lag, labels=labels)
+    if report:
+        page.add("loadtest_generator_bound", "gauge",
+                 "1 when the last phase was limited by the generator rather than the target",
+                 int(report["generator_bound"]), labels=labels)
+    if run.uploader is not None:
+        page.add("loadtest_upload_wait_seconds", "counter",
+                 "Time result writers waited on a full S3 upload queue",
+                 run.uploader.wait_seconds, "_total", labels)
 
 
 # -------------------------------------------------
 # Background Test Runner
 # -------------------------------------------------
 
+async def report_progress(tracker, interval, event, room):
+    """
+    Emit a `phase_progress` snapshot to `room` every `interval` seconds while
+    a phase runs. Emits are awaited one at a time on the event loop, never in
+    the engine thread; if an emit is slow the next snapshot just covers a
+    longer window, so load generation is never back-pressured.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await sio.emit(
+            "phase_progress",
+            {**event, **tracker.snapshot()},
+            to=room,
+        )
+
+
+def whole_test_metrics(test_metrics):
+    """Exact test-wide latency stats and error counts plus per-URL (and per-step) summaries."""
+    overall = test_metrics.overall.summary()
+    metrics = {
+        "average_time": overall["average_time"],
+        "min_time": test_metrics.overall.latency.min,
+        "percentiles": overall["percentiles"],
+        "status_codes": overall["status_codes"],
+        "per_url_metrics": test_metrics.per_url_summary(),
+    }
+    if overall["errors"]:
+        metrics["errors"] = overall["errors"]
+        metrics["error_exemplars"] = test_metrics.error_log.exemplar_summary()
+    if test_metrics.per_step:
+        metrics["per_step_metrics"] = test_metrics.per_step_summary()
+    return metrics
+
+
+async def record_run(run, status, urls, started_at, steps, phase_summaries, test_metrics):
+    """Index a finished test in the run history; a failure is logged, not raised."""
+    try:
+        await asyncio.to_thread(
+            history.record,
+            test_id=run.test_id,
+            user_id=run.user_id,
+            target=target_of(urls),
+            status=status,
+            started_at=started_at,
+            load=steps,
+            duration=sum(phase["duration"] for phase in phase_summaries),
+            recorder=test_metrics,
+            phase_summaries=phase_summaries
+        )
+    except Exception as exc:
+        print(f"[HISTORY] Could not record test {run.test_id}: {exc}")
+
+
 async def run_test_in_background(
-    sid,
-    test_id,
-    user_id,
+    run,
     urls,
     concurrency_steps,
     phase_length,
-    request_timeout
+    request_timeout,
+    engine=DEFAULT_ENGINE,
+    keep_raw=KEEP_RAW_RESULTS,
+    store_results=RESULT_STORE,
+    upload_to_s3=S3_UPLOAD,
+    progress_interval=PROGRESS_INTERVAL,
+    processes=1,
+    distributed=False,
+    search=None,
+    scenario=None,
+    body_policy=None,
+    baseline=None
 ):
+    test_id, user_id = run.test_id, run.user_id
+    if distributed:
+        session = DistributedSession(
+            coordinator, engine=engine, processes=processes, session_id=test_id,
+            scenario=scenario, body_policy=body_policy)
+    else:
+        session = LoadSession(engine=engine, processes=processes, scenario=scenario,
+                              body_policy=body_policy)
+    run.session = session
+    if run.cancelled:
+        session.cancel()
+    store_name = re.sub(r"[^\w.-]", "_", str(test_id))
+    store = None
+    uploader = S3Uploader(f"{OUTPUT_PREFIX}{store_name}/") if upload_to_s3 else None
+    run.uploader = uploader
+    if store_results and not distributed and processes == 1:
+        # Worker processes and nodes only report merged summaries, so the
+        # per-request store is written for in-process tests only
+        store = ResultStoreWriter(
+            os.path.join(RESULT_STORE_DIR, store_name), uploader=uploader)
+    phase_summaries = []
+    # Whole-test counters and histograms; each phase is merged in once, so
+    # test-wide percentiles are exact rather than averaged across phases
+    test_metrics = MetricsRecorder(keep_raw=False)
+    started_at = time.time()
+    executed_steps = []
     try:
-        total_phases = len(concurrency_steps)
-        phase_summaries = []
-        all_url_metrics = {}  # Aggregate URL metrics across all phases
+        # Connections are opened before test_started, so the first phase
+        # measures the target rather than connection setup
+        first_step = search.step_for(search.start) if search else (concurrency_steps or [None])[0]
+        prewarmed = 0
+        if not distributed:
+            prewarm_started = time.monotonic()
+            try:
+                prewarmed = await asyncio.to_thread(session.prewarm, urls, first_step)
+            except Exception as exc:
+                print(f"[TEST] Pre-warming connections for test {test_id} failed: {exc}")
+            else:
+                print(f"[TEST] Pre-warmed {prewarmed} connections for test {test_id} "
+                      f"in {time.monotonic() - prewarm_started:.3f}s")
+        await sio.emit(
+            "test_started",
+            {"message": "Test started", "test_id": test_id, "prewarmed_connections": prewarmed,
+             "stop_token": run.stop_token},
+            to=run.room,
+        )
+        print(f"[TEST] Started test {test_id} for client {run.sid} and user {user_id}")
+
+        # A search's phase count is only known at the end; report its cap
+        total_phases = search.max_steps if search else len(concurrency_steps)
+        steps = search.steps() if search else concurrency_steps
 
         print(f"[TEST] Running test {test_id} for user {user_id}")
 
-        for index, concurrency in enumerate(concurrency_steps, start=1):
-            summary, detailed = await asyncio.to_thread(
-                run_performance_test,
-                urls=urls,
-                concurrency_steps=[
-                    concurrency],
-                phase_length=phase_length,
-                request_timeout=request_timeout,
-                save_to_s3=False,
-                send_email=False
+        for index, step in enumerate(steps, start=1):
+            if run.cancelled:
+                raise TestCancelled()
+            tracker = ProgressTracker()
+            run.phase, run.tracker = index, tracker
+            reporter = asyncio.create_task(
+                report_progress(
+                    tracker=tracker,
+                    interval=progress_interval,
+                    event={
+                        "phase": index,
+                        "test_id": test_id,
+                        "user_id": user_id,
+                        "total_phases": total_phases,
+                    },
+                    room=run.room
+                )
             )
-
-            requests_count = len(detailed.get("all_requests", []))
+            phase_started = time.monotonic()
+            try:
+                summary, detailed = await asyncio.to_thread(
+                    run_performance_test,
+                    urls=urls,
+                    concurrency_steps=[
+                        step],
+                    phase_length=phase_length,
+                    request_timeout=request_timeout,
+                    save_to_s3=False,
+                    send_email=False,
+                    engine=engine,
+                    keep_raw=keep_raw,
+                    progress=tracker,
+                    session=session,
+                    store=store,
+                    save_locally=False,
+                    merge_into=test_metrics,
+                    live=run.live
+                )
+            finally:
+                reporter.cancel()
+            phase_duration = time.monotonic() - phase_started
+            executed_steps.append(step)
+
+            requests_count = summary.get("total_requests", 0)
+            phase_info = (summary.get("phase_summaries") or [{}])[0]
 
             phase_summary = {
                 "phase": index,
                 "test_id": test_id,
                 "user_id": user_id,
                 "total_phases": total_phases,
-                "concurrency": concurrency,
+                "concurrency": phase_info.get("concurrency", step),
                 "requests": requests_count,
                 "success_count": summary.get("success_count", 0),
                 "error_count": summary.get("error_count", 0),
                 "percentiles": summary.get("percentiles", {}),
+                "duration": round(phase_duration, 3),
+                "rps": round(requests_count / phase_duration, 2) if phase_duration else 0,
             }
+            generator = phase_info.get("generator")
+            if generator is not None:
+                run.generator = generator
+                phase_summary["generator"] = generator
+                phase_summary["generator_bound"] = generator["generator_bound"]
+                if generator["generator_bound"]:
+                    print(f"[TEST] Phase {index} of {test_id} was generator-bound: "
+                          f"{'; '.join(generator['reasons'])}")
+            if phase_info.get("timing_breakdown"):
+                phase_summary["timing_breakdown"] = phase_info["timing_breakdown"]
+                phase_summary["connections_opened"] = phase_info["connections_opened"]
+                phase_summary["per_url_timing_breakdown"] = {
+                    url: metrics["timing_breakdown"]
+                    for url, metrics in summary.get("per_url_metrics", {}).items()
+                    if "timing_breakdown" in metrics
+                }
+            if phase_info.get("response_size"):
+                phase_summary["response_size"] = phase_info["response_size"]
+                phase_summary["per_url_response_size"] = {
+                    url: metrics["response_size"]
+                    for url, metrics in summary.get("per_url_metrics", {}).items()
+                    if "response_size" in metrics
+                }
+            if phase_info.get("errors"):
+                phase_summary["errors"] = phase_info["errors"]
+                phase_summary["error_timeline"] = phase_info.get("error_timeline", [])
+            if summary.get("per_step_metrics"):
+                phase_summary["per_step_metrics"] = summary["per_step_metrics"]
+            if phase_info.get("mode") == "arrival_rate":
+                phase_summary["mode"] = "arrival_rate"
+                phase_summary["target_rate"] = phase_info["target_rate"]
+                phase_summary["schedule"] = phase_info["schedule"]
+                phase_summary["uncorrected_percentiles"] = phase_info.get(
+                    "uncorrected_percentiles", {})
+            elif phase_info.get("mode") == "profile":
+                phase_summary["mode"] = "profile"
+                phase_summary["shape"] = phase_info["shape"]
+                phase_summary["model"] = phase_info["model"]
+                phase_summary["timeline"] = phase_info["timeline"]
+                if "schedule" in phase_info:
+                    phase_summary["schedule"] = phase_info["schedule"]
+                    phase_summary["uncorrected_percentiles"] = phase_info.get(
+                        "uncorrected_percentiles", {})
+
+            if search is not None:
+                phase_summary["slo_passed"] = search.record(phase_summary)
+                phase_summary["slo_violations"] = search.results[-1]["violations"]
 
             phase_summaries.append(phase_summary)
 
-            # Aggregate per_url_metrics across phases
-            per_url = summary.get("per_url_metrics", {})
-            for url, metrics in per_url.items():
-                if url not in all_url_metrics:
-                    all_url_metrics[url] = {
-                        "total_requests": 0,
-                        "successful_requests": 0,
-                        "total_time": 0,
-                        "success_rate_sum": 0,
-                        "phase_count": 0,
-                        "errors": {},
-                    }
-                all_url_metrics[url]["total_requests"] += metrics.get(
-                    "total_requests", 0)
-                all_url_metrics[url]["successful_requests"] += metrics.get(
-                    "successful_requests", 0)
-                if metrics.get("average_time"):
-                    all_url_metrics[url]["total_time"] += metrics["average_time"] * \
-                        metrics.get("successful_requests", 0)
-                all_url_metrics[url]["success_rate_sum"] += metrics.get(
-                    "success_rate", 0)
-                all_url_metrics[url]["phase_count"] += 1
-
-                for err in metrics.get("errors", []):
-                    key = (err.get("status_code", "error"),
-                           err.get("error") or "Unknown error")
-                    all_url_metrics[url]["errors"][key] = (
-                        all_url_metrics[url]["errors"].get(key, 0)
-                        + err.get("count", 0)
-                    )
-
             await sio.emit(
                 "phase_complete",
                 phase_summary,
+                to=run.room,
             )
 
             print(f"[TEST] Phase {index}/{total_phases} complete")
 
-        # Calculate aggregated URL metrics
-        per_url_metrics = {}
-        for url, aggregated in all_url_metrics.items():
-            total_requests = aggregated["total_requests"]
-            successful_requests = aggregated["successful_requests"]
-            avg_time = aggregated["total_time"] / \
-                successful_requests if successful_requests > 0 else 0
-            success_rate = (successful_requests /
-                            total_requests * 100) if total_requests > 0 else 0
-
-            errors = [
-                {"status_code": code, "error": msg, "count": count}
-                for (code, msg), count in aggregated["errors"].items()
-            ]
-
-            per_url_metrics[url] = {
-                "total_requests": total_requests,
-                "successful_requests": successful_requests,
-                "average_time": avg_time,
-                "success_rate": success_rate,
-                "errors": errors,
-            }
-
         final_summary = {
             "test_id": test_id,
             "user_id": user_id,
@@ -243,22 +849,78 @@ async def run_test_in_background(
             "total_requests": sum(p["requests"] for p in phase_summaries),
             "success_count": sum(p["success_count"] for p in phase_summaries),
             "error_count": sum(p["error_count"] for p in phase_summaries),
-            "per_url_metrics": per_url_metrics,
+            **whole_test_metrics(test_metrics),
         }
+        if search is not None:
+            final_summary["breaking_point"] = search.report()
+            knee = final_summary["breaking_point"]["knee"]
+            print(f"[TEST] Breaking point of {test_id}: "
+                  f"{knee['level'] if knee else 'none (first step failed)'} "
+                  f"({final_summary['breaking_point']['stopped']})")
+        if store is not None:
+            final_summary["result_store"] = store.path
+        if uploader is not None:
+            uploader.put("summary.json", json.dumps(final_summary).encode("utf-8"),
+                         content_type="application/json")
+        if store is not None:
+            # The last chunk is on disk before test_completed; closing (and
+            # finishing any S3 upload) is left to the finally below
+            await asyncio.to_thread(store.flush)
+
+        await asyncio.to_thread(
+            save_results_locally, final_summary, None, store_name)
+
+        if history is not None:
+            await record_run(run, "completed", urls, started_at, executed_steps,
+                             phase_summaries, test_metrics)
+            if baseline is not None:
+                try:
+                    final_summary["comparison"] = await asyncio.to_thread(
+                        history.compare, test_id, None if baseline == "previous" else baseline)
+                    if final_summary["comparison"]["regressed"]:
+                        print(f"[HISTORY] {test_id} regressed against "
+                              f"{final_summary['comparison']['baseline_id']}: "
+                              f"{'; '.join(final_summary['comparison']['regressions'])}")
+                except LookupError as exc:
+                    final_summary["comparison"] = {"error": str(exc)}
 
         await sio.emit(
             "test_completed",
             final_summary,
+            to=run.room,
         )
 
         print(f"[TEST] Test {test_id} completed")
 
+    except TestCancelled:
+        print(f"[TEST] Test {test_id} stopped after {len(phase_summaries)} phases")
+        if history is not None and phase_summaries:
+            await record_run(run, "stopped", urls, started_at, executed_steps,
+                             phase_summaries, test_metrics)
+        await sio.emit(
+            "test_stopped",
+            {"test_id": test_id, "user_id": user_id,
+             "completed_phases": len(phase_summaries), "phase_summaries": phase_summaries,
+             **whole_test_metrics(test_metrics)},
+            to=run.room,
+        )
     except Exception as exc:
         print(f"[ERROR] Test {test_id} failed: {exc}")
         await sio.emit(
             "error",
-            {"error": str(exc)},
+            {"error": str(exc), "test_id": test_id},
+            to=run.room,
         )
+    finally:
+        await asyncio.to_thread(session.close)
+        if store is not None:
+            try:
+                await asyncio.to_thread(store.close)
+            except Exception as exc:
+                # Already reported if the test failed on it; never mask that error
+                print(f"[ERROR] Closing the result store of test {test_id} failed: {exc}")
+        elif uploader is not None:
+            uploader.finish()
 
 
 # -------------------------------------------------
@@ -266,8 +928,20 @@ async def run_test_in_background(
 # -------------------------------------------------
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--worker", metavar="HOST:PORT",
+        help="run as a cluster worker node for the coordinator at HOST:PORT")
+    args = parser.parse_args()
+
+    if args.worker:
+        host, _, worker_port = args.worker.rpartition(":")
+        asyncio.run(run_worker_node(host, int(worker_port)))
+        raise SystemExit(0)
+
     port = int(os.environ.get("PORT", 5001))
 
     uvicorn.run(
@@ -26,3 +26,107 @@ BATCH_SLEEP_MAX = 0.6
 
 # Threading Configuration
 MAX_THREAD_POOL_SIZE = 500  # Maximum threads per batch (system safety limit)
+
+# Engine Configuration
+ENGINES = ("thread", "async")
+DEFAULT_ENGINE = "thread"
+ASYNC_CONNECTIONS_PER_HOST = 10000  # Keep-alive sockets per target host
+ASYNC_KEEPALIVE_TIMEOUT = 15  # Seconds an idle pooled connection is reused
+DNS_CACHE_TTL = 300  # Seconds a resolved target address is reused
+
+# Open-model (arrival rate) Configuration
+ARRIVAL_MAX_IN_FLIGHT = 20000  # Requests beyond this many outstanding are dropped
+ARRIVAL_LATE_THRESHOLD = 0.01  # Seconds behind schedule before a send counts as late
+
+# Metrics Configuration
+KEEP_RAW_RESULTS = False  # Retain every per-request dict (memory grows with request count)
+
+# Live Progress Configuration
+PROGRESS_INTERVAL = 1.0  # Seconds between phase_progress events
+PROGRESS_MIN_INTERVAL = 0.25  # Upper bound on emit rate regardless of the requested progress_interval
+
+# Multi-process Configuration
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", os.cpu_count() or 1))  # "auto" process count
+
+# Cluster Configuration
+CLUSTER_HOST = os.environ.get("CLUSTER_HOST", "127.0.0.1")  # Set to a private interface for remote nodes
+CLUSTER_TOKEN = os.environ.get("CLUSTER_TOKEN", "")  # Shared secret workers register with; required
+CLUSTER_REGISTER_TIMEOUT = 5  # Seconds a new connection has to register
+CLUSTER_STEP_MARGIN = 30  # Seconds past a step's own duration before its workers are given up on
+CLUSTER_PORT = int(os.environ.get("CLUSTER_PORT", "0"))  # Coordinator port for worker nodes; 0 disables
+CLUSTER_START_DELAY = 0.5  # Seconds ahead a synchronized phase start is scheduled
+CLUSTER_RECONNECT_DELAY = 2  # Seconds a worker node waits before reconnecting
+CLUSTER_MESSAGE_LIMIT = 64 * 1024 * 1024  # Largest coordinator/worker message in bytes
+
+# Load Profile Configuration
+PROFILE_TICK = 0.1  # Seconds between load-profile target adjustments
+PROFILE_SAMPLE_INTERVAL = 1.0  # Seconds between achieved-vs-target timeline samples
+
+# Result Store Configuration
+RESULT_STORE = True  # Write every result to the columnar store under RESULT_STORE_DIR
+RESULT_STORE_DIR = "results"
+RESULT_CHUNK_ROWS = 65536  # Rows buffered per column before a chunk is written
+RESULT_WRITE_QUEUE_CHUNKS = 4  # Full chunks waiting for the store's writer thread before recording waits
+
+# Run History Configuration
+RUN_HISTORY = os.environ.get("RUN_HISTORY", "true").lower() == "true"  # Index finished tests for comparison
+RUN_HISTORY_PATH = os.environ.get("RUN_HISTORY_PATH", os.path.join(RESULT_STORE_DIR, "history.db"))
+REGRESSION_Z = 2.576  # z-score a difference must exceed to count as significant (99%, two-sided)
+REGRESSION_MIN_CHANGE = 0.05  # Smallest relative latency/throughput change worth flagging
+REGRESSION_MIN_ERROR_RATE = 0.5  # Smallest error-rate increase worth flagging, in percentage points
+
+# S3 Upload Configuration
+S3_UPLOAD = os.environ.get("S3_UPLOAD", "false").lower() == "true"  # Stream result stores to OUTPUT_BUCKET
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None  # e.g. a local S3-compatible stand-in
+S3_PART_SIZE = 8 * 1024 * 1024  # Compressed bytes per multipart part (S3 minimum is 5 MiB)
+S3_UPLOAD_RETRIES = 5
+S3_RETRY_BASE_DELAY = 0.5  # Seconds, doubled on every retry
+S3_QUEUE_ITEMS = 32  # Column chunks or objects waiting for upload before writers have to wait
+
+# Generator Monitor Configuration
+MONITOR_INTERVAL = 0.5  # Seconds between generator self-monitoring samples
+GENERATOR_CPU_THRESHOLD = 90  # Mean process CPU (% of one core) marking a phase generator-bound
+GENERATOR_LAG_THRESHOLD = 0.05  # Seconds of event-loop / thread-pool lag (p90)
+GENERATOR_SKEW_THRESHOLD = 0.05  # Seconds of send-schedule skew (p99) in arrival-rate phases
+GENERATOR_FD_THRESHOLD = 0.9  # Fraction of the open-file limit in use
+
+# Breaking-point Search Configuration
+SEARCH_GROWTH = 2.0  # Load multiplier between ramp steps
+SEARCH_RESOLUTION = 0.1  # Stop bisecting once the pass/fail gap is within this fraction
+SEARCH_MAX_STEPS = 12  # Hard cap on phases per search
+SEARCH_DEFAULT_SLO = {"p95": 0.5, "error_rate": 1.0}  # Seconds / percent
+SEARCH_MIN_ACHIEVED_RATE = 0.95  # Fraction of a target arrival rate a passing step must reach
+
+# Error Configuration
+HTTP_ERROR_STATUS = 400  # Responses with this status or above count as errors (kind http-<code>)
+ERROR_EXEMPLARS = 3  # Raw error messages kept per error kind
+ERROR_EXEMPLAR_LENGTH = 300  # Characters kept of each exemplar message
+ERROR_TIMELINE_INTERVAL = 1.0  # Seconds per bucket of the per-phase error timeline
+
+# Scrape Endpoint Configuration
+METRICS_ENDPOINT = os.environ.get("METRICS_ENDPOINT", "true").lower() == "true"  # Serve /metrics
+METRICS_MAX_URLS = 100  # URLs per test with their own series; the rest share url="other"
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Histogram bounds in seconds
+METRICS_RETENTION = 60.0  # Seconds a finished test's series stay on /metrics
+
+# URL Source Configuration
+URL_SOURCE_MAX_URLS = 1_000_000  # Distinct URLs a url_source may hold after deduplication
+URL_SOURCE_READ_SIZE = 64 * 1024  # Characters read at a time when streaming HAR and JSON files
+
+# Scenario Configuration
+RESPONSE_CAPTURE_LIMIT = 1024 * 1024  # Bytes of a response body kept for variable extraction
+
+# Response Body Configuration
+DEFAULT_BODY_POLICY = "discard"  # discard, headers, prefix or full (see BodyPolicy)
+BODY_PREFIX_BYTES = 4096  # Bytes read per response by the prefix policy
+BODY_CHECKSUM = "crc32"  # Checksum computed by the full policy: crc32 or sha256
+
+# Test Manager Configuration
+MAX_RUNNING_TESTS = int(os.environ.get("MAX_RUNNING_TESTS", "4"))  # Tests generating load at once; later ones queue
+TEST_USER_BUDGET = int(os.environ.get("TEST_USER_BUDGET", "20000"))  # Virtual users (or worst-case in-flight requests) across running tests
+TEST_PROCESS_BUDGET = int(os.environ.get("TEST_PROCESS_BUDGET", WORKER_PROCESSES))  # Load-generating processes across running tests
+
+# Startup Configuration
+STARTUP_IMPORT_BUDGET = 0.5  # Seconds `import app` may take (checked by benchmarks/bench_startup.py)
+PREWARM_CONNECTIONS = int(os.environ.get("PREWARM_CONNECTIONS", "4"))  # Connections opened per target host before test_started; 0 disables
+PREWARM_TIMEOUT = 2.0  # Seconds pre-warming may delay test_started
@@ -0,0 +1,412 @@
+import asyncio
+import resource
+import time
+
+from config import (REQUEST_TIMEOUT, ASYNC_CONNECTIONS_PER_HOST,
+                    ARRIVAL_MAX_IN_FLIGHT, ARRIVAL_LATE_THRESHOLD,
+                    PROFILE_TICK, PROFILE_SAMPLE_INTERVAL, HTTP_ERROR_STATUS)
+from .client import ConnectionPool, HTTPClientError
+from .errors import BODY_MISMATCH, SCENARIO, classify_exception
+from .metrics import MetricsRecorder, LatencyHistogram
+from .scenario import UnsafeValue
+from .sampling import UrlTable
+
+
+def raise_fd_limit():
+    """Lift the soft open-file limit to the hard limit so we can hold 10k sockets."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+async def hit_url_async(pool, url, request_timeout=REQUEST_TIMEOUT):
+    start = time.perf_counter()
+    timings = {}
+    response = {}
+    try:
+        status_code = await pool.request(url, timeout=request_timeout, timings=timings,
+                                         response=response)
+        if status_code >= HTTP_ERROR_STATUS:
+            error, kind = f"HTTP {status_code}", status_code
+        else:
+            error = pool.body_policy.verify(url, response["size"], response.get("checksum"))
+            kind = BODY_MISMATCH
+        return {
+            "url": url,
+            "status_code": status_code,
+            "latency": time.perf_counter() - start,
+            "success": error is None,
+            "error": error,
+            "error_kind": kind if error is not None else None,
+            "timings": timings,
+            "body_size": response["size"]
+        }
+    except (OSError, asyncio.IncompleteReadError, HTTPClientError, ValueError) as e:
+        return {
+            "url": url,
+            "status_code": "error",
+            "latency": time.perf_counter() - start,
+            "success": False,
+            "error": str(e) or type(e).__name__,
+            "error_kind": classify_exception(e)
+        }
+
+
+async def hit_step_async(pool, step, context, request_timeout=REQUEST_TIMEOUT):
+    """Run one `CompiledStep` for a virtual user whose variables are in `context`."""
+    start = time.perf_counter()
+    timings = {}
+    result = {"url": step.url, "step": step.name}
+    try:
+        response = step.response_spec()
+        status_code = await pool.send(
+            step.key, step.render(context), step.method, request_timeout, timings, response)
+        if status_code >= HTTP_ERROR_STATUS:
+            error, kind = f"HTTP {status_code}", status_code
+        else:
+            error = pool.body_policy.verify(step.url, response["size"], response.get("checksum"))
+            kind = BODY_MISMATCH
+            if error is None:
+                error, kind = step.extract(response, context), SCENARIO
+        result.update({
+            "status_code": status_code,
+            "latency": time.perf_counter() - start,
+            "success": error is None,
+            "error": error,
+            "error_kind": kind if error is not None else None,
+            "timings": timings,
+            "body_size": response["size"]
+        })
+    except KeyError as e:
+        result.update({
+            "status_code": "error",
+            "latency": time.perf_counter() - start,
+            "success": False,
+            "error": f"Undefined variable '{e.args[0]}'",
+            "error_kind": SCENARIO
+        })
+    except UnsafeValue as e:
+        result.update({
+            "status_code": "error",
+            "latency": time.perf_counter() - start,
+            "success": False,
+            "error": str(e),
+            "error_kind": SCENARIO
+        })
+    except (OSError, asyncio.IncompleteReadError, HTTPClientError, ValueError) as e:
+        result.update({
+            "status_code": "error",
+            "latency": time.perf_counter() - start,
+            "success": False,
+            "error": str(e) or type(e).__name__,
+            "error_kind": classify_exception(e)
+        })
+    return result
+
+
+async def _think(think_time, stop):
+    delay = think_time() if think_time is not None else 0
+    if delay > 0 and not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), delay)
+        except TimeoutError:
+            pass
+
+
+async def _scenario_user(pool, plan, request_timeout, recorder, stop, user, state=None):
+    """
+    One virtual user of a `ScenarioPlan`: its setup steps once, then one
+    weighted journey after another, pausing for each step's think time,
+    until `stop` is set. A user whose request could not even be rendered
+    (a variable that a failed extraction never set) stops: it would fail
+    the same way on every iteration without ever awaiting.
+    """
+    context = plan.context(user)
+    steps = plan.setup
+    while True:
+        for step in steps:
+            if stop.is_set():
+                return
+            if state is not None:
+                state["started"] += 1
+            recorder.started()
+            result = await hit_step_async(pool, step, context, request_timeout)
+            recorder.record(result)
+            if result["status_code"] == "error" and result["error_kind"] == SCENARIO:
+                return
+            await _think(step.think_time, stop)
+        if stop.is_set():
+            return
+        context["iteration"] += 1
+        steps = plan.pick()
+
+
+async def _virtual_user(pool, urls, end_time, request_timeout, recorder):
+    pick = urls.pick
+    while time.time() < end_time:
+        url = pick()
+        recorder.started()
+        recorder.record(await hit_url_async(pool, url, request_timeout))
+
+
+async def run_phase_async(urls, concurrency, duration, request_timeout=REQUEST_TIMEOUT,
+                          recorder=None, pool=None, plan=None):
+    """
+    Closed-model phase: `concurrency` virtual users each issue requests
+    back-to-back over a shared keep-alive connection pool until the phase
+    ends. Feeds the same per-request dicts as `runner.run_phase` into
+    `recorder` and returns it. A `pool` passed in is left open for reuse.
+    With a `ScenarioPlan` as `plan` the users run its journeys instead of
+    picking from `urls` (a `UrlTable` or a list, sampled by weight).
+    """
+    raise_fd_limit()
+    urls = UrlTable.of(urls)
+    recorder = recorder or MetricsRecorder()
+    end_time = time.time() + duration
+    owns_pool = pool is None
+    if owns_pool:
+        pool = ConnectionPool(limit_per_host=min(concurrency, ASYNC_CONNECTIONS_PER_HOST))
+
+    if plan is not None:
+        stop = asyncio.Event()
+        timer = asyncio.get_running_loop().call_later(duration, stop.set)
+        users = [_scenario_user(pool, plan, request_timeout, recorder, stop, user)
+                 for user in range(concurrency)]
+    else:
+        timer = None
+        users = [_virtual_user(pool, urls, end_time, request_timeout, recorder)
+                 for _ in range(concurrency)]
+
+    try:
+        await asyncio.gather(*users)
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if owns_pool:
+            await pool.close()
+
+    return recorder
+
+
+async def _send_scheduled(pool, url, intended, request_timeout, recorder, schedule):
+    sent = time.perf_counter()
+    recorder.started()
+    result = await hit_url_async(pool, url, request_timeout)
+    # Latency is measured from the intended send time so queueing inside the
+    # generator is charged to the response time (coordinated omission).
+    result["service_time"] = result["latency"]
+    result["send_delay"] = sent - intended
+    result["latency"] = result["send_delay"] + result["service_time"]
+    if result["send_delay"] > ARRIVAL_LATE_THRESHOLD:
+        schedule["late"] += 1
+    schedule["send_delay"].record(max(0.0, result["send_delay"]))
+    recorder.record(result)
+
+
+def _send_delay_summary(histogram):
+    percentiles = histogram.percentiles()
+    return {key: round(percentiles[key], 6) for key in ("p50", "p99", "max")} if percentiles else None
+
+
+async def run_arrival_phase(urls, rate, duration, request_timeout=REQUEST_TIMEOUT,
+                            max_in_flight=ARRIVAL_MAX_IN_FLIGHT, recorder=None, pool=None):
+    """
+    Open-model phase: requests are scheduled at a fixed `rate` per second
+    regardless of how quickly the target answers.
+
+    Returns `(recorder, schedule)`. Each result carries the corrected `latency`
+    (from intended send time) plus the uncorrected `service_time`; `schedule`
+    counts requests that were dropped because `max_in_flight` was reached and
+    requests that left the generator late.
+    """
+    raise_fd_limit()
+    urls = UrlTable.of(urls)
+    recorder = recorder or MetricsRecorder()
+    in_flight = set()
+    dropped = 0
+    peak_in_flight = 0
+    interval = 1.0 / rate
+    scheduled = int(duration * rate)
+    schedule = {"target_rate": rate, "scheduled": scheduled, "late": 0,
+                "send_delay": LatencyHistogram()}
+    owns_pool = pool is None
+    if owns_pool:
+        pool = ConnectionPool(limit_per_host=min(max_in_flight, ASYNC_CONNECTIONS_PER_HOST))
+    start = time.perf_counter()
+
+    try:
+        for i in range(scheduled):
+            intended = start + i * interval
+            # Always yield so already-created requests get to start even when
+            # the scheduler is running behind.
+            await asyncio.sleep(max(0.0, intended - time.perf_counter()))
+
+            if len(in_flight) >= max_in_flight:
+                dropped += 1
+                continue
+
+            task = asyncio.create_task(_send_scheduled(
+                pool, urls.pick(), intended, request_timeout, recorder, schedule))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            peak_in_flight = max(peak_in_flight, len(in_flight))
+
+        send_window = time.perf_counter() - start
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        if owns_pool:
+            await pool.close()
+
+    schedule.update({
+        "sent": scheduled - dropped,
+        "dropped": dropped,
+        "achieved_rate": round((scheduled - dropped) / send_window, 2) if send_window > 0 else None,
+        "peak_in_flight": peak_in_flight,
+        "send_delay": _send_delay_summary(schedule["send_delay"]),
+    })
+    return recorder, schedule
+
+
+async def _profile_user(pool, urls, request_timeout, recorder, state, stop, plan=None,
+                        user=0):
+    state["users"] += 1
+    try:
+        if plan is not None:
+            await _scenario_user(pool, plan, request_timeout, recorder, stop, user, state)
+            return
+        while not stop.is_set():
+            state["started"] += 1
+            recorder.started()
+            recorder.record(await hit_url_async(pool, urls.pick(), request_timeout))
+    finally:
+        state["users"] -= 1
+
+
+async def _profile_request(pool, url, intended, request_timeout, recorder, schedule, state):
+    state["users"] += 1
+    state["started"] += 1
+    try:
+        await _send_scheduled(pool, url, intended, request_timeout, recorder, schedule)
+    finally:
+        state["users"] -= 1
+
+
+async def _sample_timeline(profile, state, start, timeline):
+    last_time, last_started = start, 0
+    while True:
+        await asyncio.sleep(PROFILE_SAMPLE_INTERVAL)
+        now = time.perf_counter()
+        started = state["started"]
+        timeline.append({
+            "t": round(now - start, 3),
+            "target": round(profile.target(now - start), 2),
+            "users": state["users"],
+            "rps": round((started - last_started) / (now - last_time), 2),
+        })
+        last_time, last_started = now, started
+
+
+async def _drive_users(pool, urls, profile, request_timeout, recorder, state, start, plan):
+    users = []
+    running = set()
+    end = start + profile.duration
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            desired = profile.target(now - start)
+            while len(users) < desired:
+                stop = asyncio.Event()
+                task = asyncio.create_task(_profile_user(
+                    pool, urls, request_timeout, recorder, state, stop, plan,
+                    state["spawned"]))
+                state["spawned"] += 1
+                running.add(task)
+                task.add_done_callback(running.discard)
+                users.append(stop)
+            while len(users) > desired:
+                # Retired users finish their current request, then exit
+                users.pop().set()
+            state["peak"] = max(state["peak"], len(users))
+            await asyncio.sleep(min(PROFILE_TICK, end - now))
+    finally:
+        for stop in users:
+            stop.set()
+    if running:
+        await asyncio.gather(*running)
+
+
+async def _drive_rate(pool, urls, profile, request_timeout, recorder, state, start,
+                      max_in_flight, schedule):
+    in_flight = set()
+    intended = start
+    end = start + profile.duration
+    while intended < end:
+        rate = profile.target(intended - start)
+        if rate <= 0:
+            intended += PROFILE_TICK
+            continue
+        await asyncio.sleep(max(0.0, intended - time.perf_counter()))
+        schedule["scheduled"] += 1
+        if len(in_flight) >= max_in_flight:
+            schedule["dropped"] += 1
+        else:
+            task = asyncio.create_task(_profile_request(
+                pool, urls.pick(), intended, request_timeout, recorder, schedule, state))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            state["peak"] = max(state["peak"], len(in_flight))
+        intended += 1.0 / rate
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+async def run_profile_phase(urls, profile, request_timeout=REQUEST_TIMEOUT,
+                            max_in_flight=ARRIVAL_MAX_IN_FLIGHT, recorder=None, pool=None,
+                            plan=None):
+    """
+    Phase that follows a `LoadProfile`, re-evaluating its target every
+    `PROFILE_TICK` seconds: virtual users are added or retired for the
+    `"users"` model, and the send interval is recomputed per request for the
+    `"rate"` model (latency is then corrected like `run_arrival_phase`).
+
+    Returns `(recorder, profile_info)`; `profile_info["timeline"]` samples
+    the target next to the achieved active users / in-flight requests and
+    requests started per second every `PROFILE_SAMPLE_INTERVAL` seconds.
+    Users-model profiles run the journeys of a `ScenarioPlan` given as `plan`.
+    """
+    raise_fd_limit()
+    urls = UrlTable.of(urls)
+    recorder = recorder or MetricsRecorder()
+    state = {"users": 0, "started": 0, "peak": 0, "spawned": 0}
+    timeline = []
+    schedule = {"scheduled": 0, "late": 0, "dropped": 0, "send_delay": LatencyHistogram()}
+    owns_pool = pool is None
+    if owns_pool:
+        pool = ConnectionPool(limit_per_host=ASYNC_CONNECTIONS_PER_HOST)
+    start = time.perf_counter()
+    sampler = asyncio.create_task(_sample_timeline(profile, state, start, timeline))
+
+    try:
+        if profile.model == "rate":
+            await _drive_rate(pool, urls, profile, request_timeout, recorder, state, start,
+                              max_in_flight, schedule)
+        else:
+            await _drive_users(pool, urls, profile, request_timeout, recorder, state, start,
+                               plan)
+    finally:
+        sampler.cancel()
+        if owns_pool:
+            await pool.close()
+
+    info = {"peak_users": state["peak"], "timeline": timeline}
+    if profile.model == "rate":
+        schedule["sent"] = schedule["scheduled"] - schedule["dropped"]
+        schedule["send_delay"] = _send_delay_summary(schedule["send_delay"])
+        info["schedule"] = schedule
+    return recorder, info
@@ -0,0 +1,521 @@
+# engine/client.py
+
+import asyncio
+import hashlib
+import socket
+import ssl
+import time
+import zlib
+from collections import deque
+from urllib.parse import urlsplit
+
+from config import (REQUEST_TIMEOUT, ASYNC_CONNECTIONS_PER_HOST, ASYNC_KEEPALIVE_TIMEOUT,
+                    DNS_CACHE_TTL, RESPONSE_CAPTURE_LIMIT, DEFAULT_BODY_POLICY,
+                    BODY_PREFIX_BYTES, BODY_CHECKSUM)
+
+USER_AGENT = "performance-test-api/0.1"
+READ_CHUNK_SIZE = 64 * 1024
+BODY_MODES = ("discard", "headers", "prefix", "full")
+CHECKSUMS = ("crc32", "sha256")
+
+
+class HTTPClientError(Exception):
+    """Raised when the target sends a response we cannot parse."""
+
+
+class ConnectTimeout(TimeoutError):
+    """The request timed out while resolving or connecting."""
+
+
+class ReadTimeout(TimeoutError):
+    """The request timed out after its connection was established."""
+
+
+def split_url(url):
+    """`(pool key, Host header, request target)` for an http(s) URL."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise HTTPClientError(f"Unsupported URL: {url}")
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return (parts.hostname, port, secure), parts.netloc.rsplit("@", 1)[-1], path
+
+
+def head_lines(method, host_header, path, headers=None):
+    """
+    Request line and header lines, without the terminating blank line.
+    `headers` (a dict) override the defaults case-insensitively.
+    """
+    defaults = {"Host": host_header, "User-Agent": USER_AGENT, "Accept": "*/*",
+                "Connection": "keep-alive"}
+    overridden = {name.lower() for name in headers or ()}
+    lines = [f"{method} {path} HTTP/1.1"]
+    lines += [f"{name}: {value}" for name, value in defaults.items()
+              if name.lower() not in overridden]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def build_head(method, host_header, path, headers=None, body=b""):
+    """Serialized request head (plus `body`) ready to write to a connection."""
+    head = head_lines(method, host_header, path, headers)
+    if body or method in ("POST", "PUT", "PATCH"):
+        head += f"Content-Length: {len(body)}\r\n"
+    return (head + "\r\n").encode("latin-1") + body
+
+
+class _Crc32:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, chunk):
+        self.value = zlib.crc32(chunk, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+class _Body:
+    """Byte count, optional running checksum and optional capture of one body."""
+
+    __slots__ = ("size", "limit", "digest", "capture")
+
+    def __init__(self, limit=None, digest=None, capture=None):
+        self.size = 0
+        self.limit = limit
+        self.digest = digest
+        self.capture = capture
+
+    @property
+    def passive(self):
+        return self.limit is None and self.digest is None and self.capture is None
+
+    def wanted(self, count):
+        """How many of the next `count` bytes to read; 0 once a prefix limit is reached."""
+        if self.limit is None:
+            return count
+        return max(0, min(count, self.limit - self.size))
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        if self.digest is not None:
+            self.digest.update(chunk)
+        capture = self.capture
+        if capture is not None and len(capture) < RESPONSE_CAPTURE_LIMIT:
+            capture += chunk[:RESPONSE_CAPTURE_LIMIT - len(capture)]
+
+
+class BodyPolicy:
+    """
+    How much of each response body the generator reads (the `body_policy`
+    test option), trading realism for generator bandwidth and memory:
+
+    - `discard` reads the whole body in chunks and drops it
+    - `headers` stops at the headers, measuring time to first byte
+    - `prefix` reads at most `bytes` of the body
+    - `full` reads the whole body through a `checksum` (crc32 or sha256)
+      and checks it against `expect`, a map of URL to `{"size", "checksum"}`
+
+    A connection whose body was not read to the end cannot carry another
+    request, so `headers` and `prefix` close it unless the body was empty
+    (or fit in the prefix). `spec` is a mode name or a dict with `mode`.
+    """
+
+    __slots__ = ("mode", "prefix_bytes", "checksum", "expect")
+
+    def __init__(self, spec=None):
+        if spec is None:
+            spec = DEFAULT_BODY_POLICY
+        if isinstance(spec, str):
+            spec = {"mode": spec}
+        self.mode = spec.get("mode", DEFAULT_BODY_POLICY)
+        if self.mode not in BODY_MODES:
+            raise ValueError(f"body_policy mode must be one of {', '.join(BODY_MODES)}")
+        self.prefix_bytes = int(spec.get("bytes", BODY_PREFIX_BYTES))
+        if self.prefix_bytes < 1:
+            raise ValueError("body_policy 'bytes' must be at least 1")
+        self.checksum = spec.get("checksum", BODY_CHECKSUM)
+        if self.checksum not in CHECKSUMS:
+            raise ValueError(f"body_policy checksum must be one of {', '.join(CHECKSUMS)}")
+        self.expect = dict(spec.get("expect") or {})
+        if self.expect and self.mode != "full":
+            raise ValueError("body_policy 'expect' requires mode 'full'")
+
+    def body(self, capture=False):
+        """
+        A fresh `_Body` for one response. Capturing (for scenario variable
+        extraction) always reads the whole body whatever the mode.
+        """
+        if capture:
+            return _Body(capture=bytearray())
+        if self.mode == "prefix":
+            return _Body(limit=self.prefix_bytes)
+        if self.mode == "full":
+            return _Body(digest=_Crc32() if self.checksum == "crc32" else hashlib.sha256())
+        return _Body()
+
+    def verify(self, url, size, checksum):
+        """An error message when `url` has an expected body that this one does not match."""
+        expected = self.expect.get(url)
+        if expected is None:
+            return None
+        if "size" in expected and size != expected["size"]:
+            return f"Body size {size} does not match expected {expected['size']}"
+        if "checksum" in expected and checksum != str(expected["checksum"]).lower():
+            return f"Body {self.checksum} {checksum} does not match expected {expected['checksum']}"
+        return None
+
+
+class _Connection:
+    __slots__ = ("reader", "writer", "last_used")
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def is_reusable(self, now, keepalive_timeout):
+        return (
+            not self.writer.is_closing()
+            and not self.reader.at_eof()
+            and now - self.last_used < keepalive_timeout
+        )
+
+    def close(self):
+        self.writer.close()
+
+
+class _HostPool:
+    __slots__ = ("semaphore", "idle")
+
+    def __init__(self, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.idle = deque()
+
+
+class ConnectionPool:
+    """
+    Minimal asyncio HTTP/1.1 client with keep-alive connections.
+
+    Connections are pooled per (host, port, scheme) and each host is capped at
+    `limit_per_host` concurrent connections; callers beyond the cap wait for a
+    free slot instead of opening new sockets. Name lookups are cached for
+    `dns_ttl` seconds and shared between concurrent connects. Response
+    bodies are read as `body_policy` (a `BodyPolicy`) says.
+    """
+
+    def __init__(self, limit_per_host=ASYNC_CONNECTIONS_PER_HOST,
+                 keepalive_timeout=ASYNC_KEEPALIVE_TIMEOUT, dns_ttl=DNS_CACHE_TTL,
+                 body_policy=None):
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.body_policy = body_policy or BodyPolicy()
+        self._hosts = {}
+        self._targets = {}
+        self._dns_cache = {}
+        self._ssl_context = ssl.create_default_context()
+
+    def _target(self, url, method):
+        cache_key = (method, url)
+        target = self._targets.get(cache_key)
+        if target is None:
+            key, host_header, path = split_url(url)
+            target = (key, build_head(method, host_header, path))
+            self._targets[cache_key] = target
+        return target
+
+    def _host_pool(self, key):
+        pool = self._hosts.get(key)
+        if pool is None:
+            pool = _HostPool(self.limit_per_host)
+            self._hosts[key] = pool
+        return pool
+
+    def _checkout(self, pool):
+        now = time.monotonic()
+        while pool.idle:
+            conn = pool.idle.pop()
+            if conn.is_reusable(now, self.keepalive_timeout):
+                return conn
+            conn.close()
+        return None
+
+    async def _resolve(self, host, port):
+        now = time.monotonic()
+        entry = self._dns_cache.get((host, port))
+        if entry is None or entry[0] <= now:
+            lookup = asyncio.ensure_future(asyncio.get_running_loop().getaddrinfo(
+                host, port, type=socket.SOCK_STREAM))
+            entry = self._dns_cache[(host, port)] = (now + self.dns_ttl, lookup)
+        try:
+            # Shielded so one caller timing out does not cancel the shared lookup
+            infos = await asyncio.shield(entry[1])
+        except OSError:
+            if self._dns_cache.get((host, port)) is entry:
+                del self._dns_cache[(host, port)]
+            raise
+        return infos[0][4][0]
+
+    async def _connect(self, key, timings=None):
+        host, port, secure = key
+        start = time.perf_counter()
+        address = await self._resolve(host, port)
+        resolved = time.perf_counter()
+        # TCP and TLS are set up in two steps so each can be timed
+        reader, writer = await asyncio.open_connection(address, port, limit=READ_CHUNK_SIZE)
+        connected = time.perf_counter()
+        if secure:
+            try:
+                await writer.start_tls(self._ssl_context, server_hostname=host)
+            except BaseException:
+                writer.close()
+                raise
+        if timings is not None:
+            timings["dns"] = resolved - start
+            timings["connect"] = connected - resolved
+            if secure:
+                timings["tls"] = time.perf_counter() - connected
+        return _Connection(reader, writer)
+
+    async def request(self, url, method="GET", timeout=REQUEST_TIMEOUT, timings=None,
+                      response=None):
+        """
+        Send a request and return the response status code.
+
+        When a `timings` dict is passed it is filled with `perf_counter`
+        durations in seconds: `ttfb` (request sent to first response byte)
+        and `download` (first byte to end of body) for every request, plus
+        `dns`, `connect` and `tls` (https only) when a new connection had to
+        be opened. See `send` for `response`.
+        """
+        key, head = self._target(url, method)
+        return await self.send(key, head, method, timeout, timings, response)
+
+    async def send(self, key, head, method="GET", timeout=REQUEST_TIMEOUT, timings=None,
+                   response=None):
+        """
+        Send an already serialized request (see `build_head`) to the host
+        `key` from `split_url`, and return the response status code.
+
+        When a `response` dict is passed it receives the response `headers`
+        (lower-cased bytes names), the body `size` (its Content-Length, or
+        the bytes read when none was declared; None if unknown) and, under
+        the `full` policy, its `checksum`. If it holds `"body": True` it
+        also receives up to `RESPONSE_CAPTURE_LIMIT` bytes of the body.
+
+        Running out of `timeout` raises `ConnectTimeout` or `ReadTimeout`
+        depending on whether a connection was being set up.
+        """
+        pool = self._host_pool(key)
+        connecting = False
+
+        async with pool.semaphore:
+            try:
+                async with asyncio.timeout(timeout):
+                    conn = self._checkout(pool)
+                    if conn is not None:
+                        try:
+                            return await self._exchange(pool, conn, method, head, timings,
+                                                        response)
+                        except (ConnectionError, asyncio.IncompleteReadError):
+                            # The server closed an idle keep-alive socket; retry
+                            # once on a fresh connection.
+                            pass
+                    connecting = True
+                    conn = await self._connect(key, timings)
+                    connecting = False
+                    return await self._exchange(pool, conn, method, head, timings, response)
+            except TimeoutError:
+                error = ConnectTimeout if connecting else ReadTimeout
+                raise error(f"Request timed out after {timeout}s") from None
+
+    async def _exchange(self, pool, conn, method, head, timings=None, response=None):
+        try:
+            sent = time.perf_counter()
+            conn.writer.write(head)
+            await conn.writer.drain()
+            status, keep_alive, first_byte = await _read_response(
+                conn.reader, method, self.body_policy, response)
+        except BaseException:
+            conn.close()
+            raise
+
+        if timings is not None:
+            timings["ttfb"] = first_byte - sent
+            timings["download"] = time.perf_counter() - first_byte
+
+        if keep_alive:
+            conn.last_used = time.monotonic()
+            pool.idle.append(conn)
+        else:
+            conn.close()
+        return status
+
+    async def prewarm(self, urls, connections=1, timeout=REQUEST_TIMEOUT):
+        """
+        Open idle keep-alive connections ahead of the load, up to
+        `connections` per host of `urls` (capped by `limit_per_host`), so
+        the first requests skip DNS, TCP and TLS setup. Unsupported URLs
+        and connects that fail or take over `timeout` seconds are skipped:
+        the requests themselves report them. Returns the number of
+        connections opened.
+        """
+        keys = set()
+        for url in urls:
+            try:
+                keys.add(split_url(url)[0])
+            except HTTPClientError:
+                continue
+        wanted = []
+        for key in keys:
+            missing = min(connections, self.limit_per_host) - len(self._host_pool(key).idle)
+            wanted.extend([key] * max(missing, 0))
+        opened = 0
+        for key, conn in zip(wanted, await asyncio.gather(
+                *(asyncio.wait_for(self._connect(key), timeout) for key in wanted),
+                return_exceptions=True)):
+            if isinstance(conn, _Connection):
+                self._host_pool(key).idle.append(conn)
+                opened += 1
+        return opened
+
+    async def close(self):
+        for pool in self._hosts.values():
+            while pool.idle:
+                pool.idle.pop().close()
+        self._hosts.clear()
+
+
+async def _read_response(reader, method, policy, response=None):
+    """
+    Read one response, handling the body as `policy` says (see
+    `ConnectionPool.send` for `response`); returns
+    (status, keep_alive, first_byte_time).
+    """
+    first_byte = None
+    while True:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by remote host")
+        if first_byte is None:
+            first_byte = time.perf_counter()
+        try:
+            version, status = status_line.split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise HTTPClientError(f"Malformed status line: {status_line[:80]!r}")
+        headers = await _read_headers(reader)
+        if status >= 200 or status == 101:
+            break
+
+    capture = response is not None and response.get("body")
+    body = policy.body(capture)
+    if response is not None:
+        response["headers"] = headers
+        if capture:
+            response["body"] = body.capture
+
+    connection = headers.get(b"connection", b"").lower()
+    if version == b"HTTP/1.1":
+        keep_alive = connection != b"close"
+    else:
+        keep_alive = connection == b"keep-alive"
+
+    if method == "HEAD" or status in (101, 204, 304):
+        _report(response, 0, body)
+        return status, keep_alive and status != 101, first_byte
+
+    chunked = b"chunked" in headers.get(b"transfer-encoding", b"").lower()
+    length = None
+    if not chunked and b"content-length" in headers:
+        try:
+            length = int(headers[b"content-length"])
+        except ValueError:
+            raise HTTPClientError("Malformed Content-Length header")
+
+    if policy.mode == "headers" and not capture:
+        complete = length == 0
+    elif chunked:
+        complete = await _consume_chunked(reader, body)
+    elif length is not None:
+        complete = await _consume_exact(reader, length, body)
+    else:
+        while True:
+            chunk = await reader.read(body.wanted(READ_CHUNK_SIZE))
+            if not chunk:
+                break
+            body.feed(chunk)
+        keep_alive = False
+        complete = True
+
+    if length is not None:
+        size = length
+    elif complete or body.limit is not None:
+        size = body.size
+    else:
+        size = None  # Headers only, and no length was declared
+    _report(response, size, body)
+    return status, keep_alive and complete, first_byte
+
+
+def _report(response, size, body):
+    if response is not None:
+        response["size"] = size
+        if body.digest is not None:
+            response["checksum"] = body.digest.hexdigest()
+
+
+async def _read_headers(reader):
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise asyncio.IncompleteReadError(b"", None)
+        if line in (b"\r\n", b"\n"):
+            return headers
+        name, sep, value = line.partition(b":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+
+
+async def _consume_exact(reader, length, body=None):
+    """Read `length` bytes into `body`; False when its prefix limit stopped the read early."""
+    remaining = length
+    while remaining > 0:
+        count = min(remaining, READ_CHUNK_SIZE)
+        if body is not None:
+            count = body.wanted(count)
+            if not count:
+                return False
+        chunk = await reader.read(count)
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", remaining)
+        if body is not None:
+            body.feed(chunk)
+        remaining -= len(chunk)
+    return True
+
+
+async def _consume_chunked(reader, body):
+    while True:
+        size_line = await reader.readline()
+        try:
+            size = int(size_line.split(b";", 1)[0], 16)
+        except ValueError:
+            raise HTTPClientError(f"Malformed chunk size: {size_line[:80]!r}")
+        if size == 0:
+            await _read_headers(reader)
+            return True
+        if body.passive:
+            body.size += size
+            await _consume_exact(reader, size + 2)
+        else:
+            if not await _consume_exact(reader, size, body):
+                return False
+            await _consume_exact(reader, 2)
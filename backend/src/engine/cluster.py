@@ -0,0 +1,387 @@
+# engine/cluster.py
+
+import asyncio
+import hmac
+import json
+import os
+import socket
+import time
+import uuid
+
+from config import (DEFAULT_ENGINE, CLUSTER_START_DELAY, CLUSTER_RECONNECT_DELAY,
+                    CLUSTER_MESSAGE_LIMIT, CLUSTER_TOKEN, CLUSTER_REGISTER_TIMEOUT,
+                    CLUSTER_STEP_MARGIN, PROGRESS_INTERVAL)
+from .profiles import LoadProfile
+from .live import LiveCounters
+from .metrics import MetricsRecorder, ProgressTracker
+from .sampling import UrlTable
+from .session import LoadSession, TestCancelled
+from .workers import shard_step, merge_phase_info
+
+# Coordinator and worker nodes talk newline-delimited JSON over plain TCP.
+#
+#   worker -> coordinator: register, progress, result
+#   coordinator -> worker: run_step, cancel_session, close_session
+
+
+async def _send_message(writer, message):
+    writer.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def _read_message(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class _PendingStep:
+    __slots__ = ("worker_id", "future", "progress", "live")
+
+    def __init__(self, worker_id, future, progress, live):
+        self.worker_id = worker_id
+        self.future = future
+        self.progress = progress
+        self.live = live
+
+
+class ClusterCoordinator:
+    """
+    Accepts worker-node registrations and fans phases out to them.
+
+    Runs on the app's event loop. Each step is split across the registered
+    workers with `shard_step`, every shard is given the same wall-clock
+    `start_at` so the nodes begin together, and the returned metric
+    summaries are merged like multi-process results.
+
+    Workers must register with the shared `token`: they receive the test's
+    URLs and scenario (credentials included) and their results are merged
+    into the test, so the coordinator refuses to start without one.
+    """
+
+    def __init__(self, token=CLUSTER_TOKEN):
+        self.token = token
+        self.workers = {}
+        self.loop = None
+        self._pending = {}
+        self._server = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def start(self, host, port):
+        if not self.token:
+            raise RuntimeError("CLUSTER_TOKEN must be set to run a cluster coordinator")
+        self.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(
+            self._handle_worker, host, port, limit=CLUSTER_MESSAGE_LIMIT)
+        print(f"[CLUSTER] Coordinator listening on {host}:{self.port}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self.workers.values()):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_worker(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            async with asyncio.timeout(CLUSTER_REGISTER_TIMEOUT):
+                hello = await _read_message(reader)
+        except (TimeoutError, ConnectionError, ValueError):
+            hello = None
+        if not hello or hello.get("type") != "register" or not hmac.compare_digest(
+                str(hello.get("token", "")).encode("utf-8"), self.token.encode("utf-8")):
+            print(f"[CLUSTER] Rejected connection from {peer}")
+            writer.close()
+            return
+
+        worker_id = hello.get("worker_id") or str(peer)
+        self.workers[worker_id] = writer
+        print(f"[CLUSTER] Worker {worker_id} registered ({len(self.workers)} total)")
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                self._dispatch(message)
+        except (ConnectionError, ValueError) as exc:
+            # ValueError also covers a line over CLUSTER_MESSAGE_LIMIT
+            print(f"[CLUSTER] Worker {worker_id} connection error: {exc}")
+        finally:
+            if self.workers.get(worker_id) is writer:
+                del self.workers[worker_id]
+            for pending in self._pending.values():
+                if pending.worker_id == worker_id and not pending.future.done():
+                    pending.future.set_exception(
+                        RuntimeError(f"Worker {worker_id} disconnected"))
+            writer.close()
+            print(f"[CLUSTER] Worker {worker_id} disconnected")
+
+    def _dispatch(self, message):
+        pending = self._pending.get(message.get("request_id"))
+        if pending is None:
+            return
+        if message["type"] == "progress":
+            if pending.progress is not None:
+                pending.progress.absorb(message["delta"])
+            if pending.live is not None and message["delta"].get("live"):
+                pending.live.absorb(message["delta"]["live"])
+        elif message["type"] == "result" and not pending.future.done():
+            if message.get("error"):
+                pending.future.set_exception(RuntimeError(
+                    f"Worker {pending.worker_id} failed: {message['error']}"))
+            else:
+                pending.future.set_result(message)
+
+    async def run_step(self, session_id, engine, processes, urls, step, phase_length,
+                       request_timeout, progress=None, scenario=None, body_policy=None,
+                       live=None):
+        """Run one step on every registered worker; returns their result messages."""
+        workers = list(self.workers.items())
+        if not workers:
+            raise RuntimeError("No cluster workers registered")
+
+        start_at = time.time() + CLUSTER_START_DELAY
+        duration = (LoadProfile(step["profile"]).duration
+                    if isinstance(step, dict) and "profile" in step else phase_length)
+        deadline = duration + request_timeout + CLUSTER_START_DELAY + CLUSTER_STEP_MARGIN
+        request_ids = []
+        try:
+            for (worker_id, writer), shard in zip(workers, shard_step(step, len(workers))):
+                request_id = uuid.uuid4().hex
+                request_ids.append(request_id)
+                self._pending[request_id] = _PendingStep(
+                    worker_id, self.loop.create_future(), progress, live)
+                await _send_message(writer, {
+                    "type": "run_step",
+                    "request_id": request_id,
+                    "session_id": session_id,
+                    "engine": engine,
+                    "processes": processes,
+                    "scenario": scenario,
+                    "body_policy": body_policy,
+                    "urls": UrlTable.of(urls).to_dict(),
+                    "step": shard,
+                    "phase_length": phase_length,
+                    "request_timeout": request_timeout,
+                    "start_at": start_at,
+                })
+            # A worker that hangs but keeps its connection must not stall the test
+            pending = [self._pending[request_id] for request_id in request_ids]
+            _, late = await asyncio.wait([step.future for step in pending], timeout=deadline,
+                                         return_when=asyncio.FIRST_EXCEPTION)
+            for step in pending:
+                if step.future.done() and step.future.exception():
+                    raise step.future.exception()
+            if late:
+                await self.cancel_session(session_id)
+                raise RuntimeError(
+                    f"Workers {', '.join(step.worker_id for step in pending if step.future in late)} "
+                    f"did not finish the step within {deadline:.0f}s")
+            return [step.future.result() for step in pending]
+        finally:
+            for request_id in request_ids:
+                self._pending.pop(request_id, None)
+
+    async def cancel_session(self, session_id):
+        for writer in list(self.workers.values()):
+            try:
+                await _send_message(writer, {"type": "cancel_session", "session_id": session_id})
+            except ConnectionError:
+                pass
+
+    async def close_session(self, session_id):
+        for writer in list(self.workers.values()):
+            try:
+                await _send_message(writer, {"type": "close_session", "session_id": session_id})
+            except ConnectionError:
+                pass
+
+
+class DistributedSession:
+    """
+    `LoadSession` counterpart that runs each phase on the cluster's worker
+    nodes. Called from the test thread; the network work happens on the
+    coordinator's event loop.
+    """
+
+    def __init__(self, coordinator, engine=DEFAULT_ENGINE, processes=1, session_id=None,
+                 scenario=None, body_policy=None):
+        self.coordinator = coordinator
+        self.engine = engine
+        self.processes = processes
+        self.scenario = scenario
+        self.body_policy = body_policy
+        self.session_id = session_id or uuid.uuid4().hex
+        self.cancelled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.coordinator.loop).result()
+
+    def cancel(self):
+        """Ask every node to cancel this session's running phase. Does not block."""
+        self.cancelled = True
+        asyncio.run_coroutine_threadsafe(
+            self.coordinator.cancel_session(self.session_id), self.coordinator.loop)
+
+    def run_step(self, urls, step, phase_length, request_timeout, recorder=None):
+        if self.cancelled:
+            raise TestCancelled()
+        recorder = recorder or MetricsRecorder()
+        try:
+            results = self._call(self.coordinator.run_step(
+                session_id=self.session_id,
+                engine=self.engine,
+                processes=self.processes,
+                urls=urls,
+                step=step,
+                phase_length=phase_length,
+                request_timeout=request_timeout,
+                progress=recorder.progress,
+                live=recorder.live,
+                scenario=self.scenario,
+                body_policy=self.body_policy
+            ))
+        except Exception:
+            if self.cancelled:
+                raise TestCancelled() from None
+            raise
+        infos = []
+        for result in results:
+            recorder.merge(MetricsRecorder.from_dict(result["recorder"]))
+            infos.append(result["phase_info"])
+        return recorder, merge_phase_info(step, infos)
+
+    def close(self):
+        self._call(self.coordinator.close_session(self.session_id))
+
+
+async def _run_remote_step(message, sessions, writer, write_lock):
+    async def send(payload):
+        async with write_lock:
+            await _send_message(writer, payload)
+
+    request_id = message["request_id"]
+    session = sessions.get(message["session_id"])
+    if session is None:
+        session = sessions[message["session_id"]] = LoadSession(
+            engine=message.get("engine", DEFAULT_ENGINE),
+            processes=message.get("processes", 1),
+            scenario=message.get("scenario"),
+            body_policy=message.get("body_policy"))
+
+    tracker = ProgressTracker()
+    live = LiveCounters()
+    recorder = MetricsRecorder(keep_raw=False, progress=tracker, live=live)
+
+    def drain():
+        delta = tracker.drain()
+        delta["live"] = live.drain()
+        return delta if delta["started"] or delta["requests"] or delta["live"] else None
+
+    async def forward_progress():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL / 2)
+            delta = drain()
+            if delta is not None:
+                await send({"type": "progress", "request_id": request_id, "delta": delta})
+
+    delay = message["start_at"] - time.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    forwarder = asyncio.create_task(forward_progress())
+    try:
+        recorder, phase_info = await asyncio.to_thread(
+            session.run_step,
+            urls=UrlTable.from_dict(message["urls"]),
+            step=message["step"],
+            phase_length=message["phase_length"],
+            request_timeout=message["request_timeout"],
+            recorder=recorder
+        )
+        reply = {"type": "result", "request_id": request_id,
+                 "recorder": recorder.to_dict(), "phase_info": phase_info}
+    except Exception as exc:
+        reply = {"type": "result", "request_id": request_id, "error": str(exc)}
+    finally:
+        forwarder.cancel()
+
+    delta = drain()
+    if delta is not None:
+        await send({"type": "progress", "request_id": request_id, "delta": delta})
+    await send(reply)
+
+
+def _step_done(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[CLUSTER] Step failed on worker: {task.exception()!r}")
+
+
+async def run_worker_node(host, port, worker_id=None, token=CLUSTER_TOKEN):
+    """
+    Connect to a coordinator and execute the steps it sends until the process
+    is stopped, reconnecting if the coordinator goes away. `token` must match
+    the coordinator's `CLUSTER_TOKEN`.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    while True:
+        sessions = {}
+        try:
+            reader, writer = await asyncio.open_connection(
+                host, port, limit=CLUSTER_MESSAGE_LIMIT)
+        except OSError as exc:
+            print(f"[CLUSTER] Coordinator {host}:{port} unavailable: {exc}")
+            await asyncio.sleep(CLUSTER_RECONNECT_DELAY)
+            continue
+
+        write_lock = asyncio.Lock()
+        tasks = set()
+        await _send_message(writer, {"type": "register", "worker_id": worker_id, "token": token})
+        print(f"[CLUSTER] Worker {worker_id} connected to {host}:{port}")
+        try:
+            while True:
+                message = await _read_message(reader)
+                if message is None:
+                    break
+                if message["type"] == "run_step":
+                    task = asyncio.create_task(
+                        _run_remote_step(message, sessions, writer, write_lock))
+                    tasks.add(task)
+                    task.add_done_callback(_step_done)
+                    task.add_done_callback(tasks.discard)
+                elif message["type"] == "cancel_session":
+                    session = sessions.get(message["session_id"])
+                    if session is not None:
+                        session.cancel()
+                elif message["type"] == "close_session":
+                    session = sessions.pop(message["session_id"], None)
+                    if session is not None:
+                        await asyncio.to_thread(session.close)
+        except (ConnectionError, ValueError) as exc:
+            print(f"[CLUSTER] Lost coordinator connection: {exc}")
+        finally:
+            writer.close()
+            # Let steps already running in threads finish before releasing
+            # their sessions; their replies are lost with the connection.
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for session in sessions.values():
+                await asyncio.to_thread(session.close)
+
+        print(f"[CLUSTER] Worker {worker_id} disconnected, reconnecting")
+        await asyncio.sleep(CLUSTER_RECONNECT_DELAY)
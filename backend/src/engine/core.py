@@ -1,63 +1,130 @@
+import time
 from datetime import datetime
-from .runner import run_phase
-from .metrics import calculate_metrics, calculate_per_url_metrics
+from config import DEFAULT_ENGINE, KEEP_RAW_RESULTS
+from .session import LoadSession, TestCancelled
+from .metrics import MetricsRecorder
 from .upload import save_results_locally
 # import uuid
 import traceback
 
 
+def summarize_phase(index, phase_info, aggregate, error_log=None, started=None):
+    summary = {
+        "phase": index,
+        **phase_info,
+        "requests": aggregate.total,
+        "successful_requests": aggregate.success,
+        "error_requests": aggregate.error_count,
+        "avg_res_time": aggregate.latency.mean,
+        "percentiles": aggregate.latency.percentiles(),
+    }
+    if aggregate.service_time is not None:
+        summary["uncorrected_percentiles"] = aggregate.service_time.percentiles()
+    if aggregate.timings:
+        summary["timing_breakdown"] = aggregate.timing_breakdown()
+        summary["connections_opened"] = aggregate.connections_opened
+    if aggregate.body_size is not None:
+        summary["response_size"] = aggregate.response_size()
+    if aggregate.errors:
+        summary["errors"] = aggregate.error_list()
+        if error_log is not None:
+            summary["error_timeline"] = error_log.timeline_summary(started)
+    return summary
+
+
 def run_performance_test(urls, concurrency_steps, phase_length, request_timeout,
-                         save_to_s3=True, send_email=True):
+                         save_to_s3=True, send_email=True, engine=DEFAULT_ENGINE,
+                         keep_raw=KEEP_RAW_RESULTS, progress=None, session=None,
+                         processes=1, store=None, save_locally=True, scenario=None,
+                         body_policy=None, merge_into=None, live=None):
+    """
+    Run `concurrency_steps` as consecutive phases. Pass a `LoadSession` to
+    reuse its thread pool / connection pool across calls; otherwise one is
+    created for this call and closed at the end. `processes > 1` shards each
+    phase across that many worker processes.
+
+    With a `ResultStoreWriter` as `store`, every result is appended to the
+    columnar store as it completes, each step as a new phase. A `scenario`
+    definition replaces `urls` with its journeys (see engine/scenario.py) and
+    `body_policy` sets how response bodies are read (see `BodyPolicy`).
+
+    Pass a `MetricsRecorder` as `merge_into` to also merge this call's
+    aggregates into it: callers running a test one step at a time keep one
+    such recorder and get exact whole-test percentiles from it. `live` is a
+    `LiveCounters` every result is also counted in, for the /metrics endpoint.
+    """
+    if session is None:
+        with LoadSession(engine=engine, processes=processes, scenario=scenario,
+                         body_policy=body_policy) as session:
+            return run_performance_test(
+                urls, concurrency_steps, phase_length, request_timeout,
+                save_to_s3=save_to_s3, send_email=send_email, engine=engine,
+                keep_raw=keep_raw, progress=progress, session=session,
+                store=store, save_locally=save_locally, merge_into=merge_into, live=live)
 
     try:
-        all_results = []
+        test_recorder = MetricsRecorder(keep_raw=keep_raw)
         phase_summaries = []
 
-        for idx, concurrency in enumerate(concurrency_steps):
-            phase_results = run_phase(
+        for idx, step in enumerate(concurrency_steps):
+            if store is not None:
+                store.start_phase()
+            phase_started = time.time()
+            phase_recorder, phase_info = session.run_step(
                 urls=urls,
-                concurrency=concurrency,
-                duration=phase_length,
-                request_timeout=request_timeout
+                step=step,
+                phase_length=phase_length,
+                request_timeout=request_timeout,
+                recorder=MetricsRecorder(keep_raw=keep_raw, progress=progress, store=store,
+                                         live=live)
             )
-            all_results.extend(phase_results)
-            metrics = calculate_metrics(all_results=phase_results)
-            phase_summaries.append({
-                "phase": idx + 1,
-                "concurrency": concurrency,
-                "requests": len(phase_results),
-                "successful_requests": len(metrics["success_times"]),
-                "error_requests": len(metrics["error_results"]),
-                "avg_res_time": sum(metrics["success_times"]) / len(metrics["success_times"]) if metrics["success_times"] else None
-            })
-        overall_metrics = calculate_metrics(all_results=all_results)
-        per_url_metrics = calculate_per_url_metrics(all_results=all_results)
+            phase_summaries.append(
+                summarize_phase(idx + 1, phase_info, phase_recorder.overall,
+                                phase_recorder.error_log, phase_started))
+            test_recorder.merge(phase_recorder)
+
+        if merge_into is not None:
+            merge_into.merge(test_recorder)
+
+        overall = test_recorder.overall
+        per_url_metrics = test_recorder.per_url_summary()
 
         timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
         summary = {
             "timestamp": datetime.utcnow().isoformat(),
-            "total_requests": len(all_results),
-            "success_count": len(overall_metrics["success_times"]),
-            "error_count": len(overall_metrics["error_results"]),
-            "error_results": overall_metrics["error_results"],
-            "success_rate_percent": round((len(overall_metrics["success_times"])/len(all_results))*100, 2) if all_results else None,
-            "avg_time": sum(overall_metrics["success_times"])/len(overall_metrics["success_times"]) if overall_metrics["success_times"] else None,
-            "percentiles": overall_metrics["percentiles"],
+            "total_requests": overall.total,
+            "success_count": overall.success,
+            "error_count": overall.error_count,
+            "error_results": overall.error_list(),
+            "success_rate_percent": round((overall.success/overall.total)*100, 2) if overall.total else None,
+            "avg_time": overall.latency.mean,
+            "percentiles": overall.latency.percentiles(),
+            "uncorrected_percentiles": overall.service_time.percentiles() if overall.service_time else None,
+            "status_codes": overall.status_codes,
             "phase_summaries": phase_summaries,
             "per_url_metrics": per_url_metrics
         }
+        if test_recorder.per_step:
+            summary["per_step_metrics"] = test_recorder.per_step_summary()
+        if test_recorder.error_log.exemplars:
+            summary["error_exemplars"] = test_recorder.error_log.exemplar_summary()
+        if store is not None:
+            summary["result_store"] = store.path
         detailed = {
             "summary": summary,
-            "all_requests": all_results,
+            "all_requests": test_recorder.raw or [],
             "phase_details": phase_summaries,
             "per_url_results": per_url_metrics
         }
-        save_results_locally(
-            summary=summary, detailed=detailed, timestamp=timestamp
-        )
+        if save_locally:
+            save_results_locally(
+                summary=summary, detailed=detailed, timestamp=timestamp
+            )
 
         return summary, detailed
 
+    except TestCancelled:
+        raise
     except Exception as e:
         print(f"Error during performance test: {e}")
         traceback.print_exc()
@@ -0,0 +1,188 @@
+# engine/errors.py
+
+import time
+
+from config import (HTTP_ERROR_STATUS, ERROR_EXEMPLARS, ERROR_EXEMPLAR_LENGTH,
+                    ERROR_TIMELINE_INTERVAL)
+
+# Failed requests are counted by kind, a small int: an index into
+# ERROR_KINDS for transport and client-side failures, or the status code
+# itself (>= 100) for HTTP error responses. Raw messages embed addresses,
+# ports and pool details, so they are never used as keys.
+ERROR_KINDS = (
+    "other",
+    "timeout-connect",
+    "timeout-read",
+    "timeout",          # Deadline passed, stage unknown
+    "dns",
+    "refused",
+    "connect",          # Connection failed otherwise (unreachable, no route)
+    "reset",
+    "tls",
+    "protocol",         # Malformed or truncated response
+    "body-mismatch",    # Body differs from the body_policy expectation
+    "scenario",         # Undefined variable or failed extraction
+)
+(OTHER, TIMEOUT_CONNECT, TIMEOUT_READ, TIMEOUT, DNS, REFUSED, CONNECT, RESET, TLS,
+ PROTOCOL, BODY_MISMATCH, SCENARIO) = range(len(ERROR_KINDS))
+
+# Exception class names (matched along the MRO, so requests and urllib3
+# need not be imported here) and the kind they stand for
+_KIND_BY_CLASS = {
+    "ConnectTimeout": TIMEOUT_CONNECT,
+    "ConnectTimeoutError": TIMEOUT_CONNECT,
+    "ReadTimeout": TIMEOUT_READ,
+    "ReadTimeoutError": TIMEOUT_READ,
+    "TimeoutError": TIMEOUT,
+    "NameResolutionError": DNS,
+    "gaierror": DNS,
+    "ConnectionRefusedError": REFUSED,
+    "NewConnectionError": CONNECT,
+    "ConnectionResetError": RESET,
+    "ConnectionAbortedError": RESET,
+    "BrokenPipeError": RESET,
+    "RemoteDisconnected": RESET,
+    "SSLError": TLS,
+    "CertificateError": TLS,
+    "HTTPClientError": PROTOCOL,
+    "IncompleteReadError": PROTOCOL,
+    "IncompleteRead": PROTOCOL,
+    "ProtocolError": PROTOCOL,
+    "ChunkedEncodingError": PROTOCOL,
+    "ContentDecodingError": PROTOCOL,
+}
+
+
+def error_name(kind):
+    return ERROR_KINDS[kind] if kind < len(ERROR_KINDS) else f"http-{kind}"
+
+
+def status_kind(code):
+    """The kind of a failed result that carries no `error_kind` of its own."""
+    if isinstance(code, int) and code >= HTTP_ERROR_STATUS:
+        return code
+    return OTHER
+
+
+def _kind_of(exc):
+    for cls in type(exc).__mro__:
+        kind = _KIND_BY_CLASS.get(cls.__name__)
+        if kind is not None:
+            return kind
+    return None
+
+
+def _causes(exc):
+    # Wrapped exceptions hide in __cause__, urllib3's `reason` and requests' args
+    pending = [exc]
+    seen = set()
+    while pending and len(seen) < 16:
+        exc = pending.pop(0)
+        if id(exc) in seen:
+            continue
+        seen.add(id(exc))
+        yield exc
+        pending.extend(inner for inner in (exc.__cause__, exc.__context__,
+                                           getattr(exc, "reason", None), *exc.args)
+                       if isinstance(inner, BaseException))
+
+
+def classify_exception(exc):
+    """
+    The kind of a failed request's exception. The innermost recognized
+    cause wins (a requests `ConnectionError` is refused, reset or DNS
+    depending on what it wraps), except that a bare timeout does not
+    override a known connect or read timeout.
+    """
+    kind = OTHER
+    for inner in _causes(exc):
+        found = _kind_of(inner)
+        if found is not None and not (found == TIMEOUT and kind in (TIMEOUT_CONNECT, TIMEOUT_READ)):
+            kind = found
+    return kind
+
+
+class ErrorLog:
+    """
+    What error counts alone do not show: a few raw messages per kind, and
+    errors per kind over time.
+
+    Exemplars are sampled at the 1st, 2nd, 4th, 8th... occurrence of each
+    kind and capped at `ERROR_EXEMPLARS` distinct messages (the latest
+    kept), so a storm of unique messages costs next to nothing. The
+    timeline counts errors in `ERROR_TIMELINE_INTERVAL` buckets of wall
+    clock time, so logs from several processes or nodes merge bucket by
+    bucket.
+    """
+
+    __slots__ = ("seen", "exemplars", "timeline")
+
+    def __init__(self):
+        self.seen = {}
+        self.exemplars = {}
+        self.timeline = {}
+
+    def record(self, kind, message=None):
+        count = self.seen.get(kind, 0) + 1
+        self.seen[kind] = count
+        if count & (count - 1) == 0 and message:
+            self._add_exemplar(kind, message[:ERROR_EXEMPLAR_LENGTH])
+        bucket = int(time.time() // ERROR_TIMELINE_INTERVAL)
+        counts = self.timeline.get(bucket)
+        if counts is None:
+            counts = self.timeline[bucket] = {}
+        counts[kind] = counts.get(kind, 0) + 1
+
+    def _add_exemplar(self, kind, message):
+        samples = self.exemplars.setdefault(kind, [])
+        if message not in samples:
+            if len(samples) >= ERROR_EXEMPLARS:
+                samples.pop(0)
+            samples.append(message)
+
+    def merge(self, other):
+        for kind, count in other.seen.items():
+            self.seen[kind] = self.seen.get(kind, 0) + count
+        for kind, samples in other.exemplars.items():
+            for message in samples:
+                self._add_exemplar(kind, message)
+        for bucket, counts in other.timeline.items():
+            mine = self.timeline.setdefault(bucket, {})
+            for kind, count in counts.items():
+                mine[kind] = mine.get(kind, 0) + count
+        return self
+
+    def exemplar_summary(self):
+        return {error_name(kind): list(samples) for kind, samples in self.exemplars.items()}
+
+    def timeline_summary(self, start=None):
+        """
+        `[{"t", "errors": {kind name: count}}]` per bucket holding errors, `t`
+        being the bucket's start in seconds after `start` (by default the
+        first bucket's).
+        """
+        if not self.timeline:
+            return []
+        if start is None:
+            start = min(self.timeline) * ERROR_TIMELINE_INTERVAL
+        return [
+            {"t": round(max(0.0, bucket * ERROR_TIMELINE_INTERVAL - start), 3),
+             "errors": {error_name(kind): count for kind, count in counts.items()}}
+            for bucket, counts in sorted(self.timeline.items())
+        ]
+
+    def to_dict(self):
+        return {
+            "seen": list(self.seen.items()),
+            "exemplars": list(self.exemplars.items()),
+            "timeline": [(bucket, list(counts.items()))
+                         for bucket, counts in self.timeline.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        log = cls()
+        log.seen = {kind: count for kind, count in data["seen"]}
+        log.exemplars = {kind: list(samples) for kind, samples in data["exemplars"]}
+        log.timeline = {bucket: dict(counts) for bucket, counts in data["timeline"]}
+        return log
@@ -0,0 +1,311 @@
+# engine/history.py
+
+import json
+import math
+import os
+import time
+import zlib
+from contextlib import closing
+from urllib.parse import urlsplit
+
+from config import RUN_HISTORY_PATH, REGRESSION_Z, REGRESSION_MIN_CHANGE, REGRESSION_MIN_ERROR_RATE
+from .metrics import MetricsRecorder
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    test_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    target TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    completed_at REAL NOT NULL,
+    load TEXT NOT NULL,
+    duration REAL NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    rps REAL,
+    p50 REAL,
+    p95 REAL,
+    p99 REAL,
+    metrics BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_target ON runs (target, completed_at);
+CREATE INDEX IF NOT EXISTS runs_by_user ON runs (user_id, completed_at);
+CREATE TABLE IF NOT EXISTS phases (
+    test_id TEXT NOT NULL,
+    phase INTEGER NOT NULL,
+    step TEXT,
+    requests INTEGER,
+    errors INTEGER,
+    duration REAL,
+    rps REAL,
+    p50 REAL,
+    p95 REAL,
+    p99 REAL,
+    PRIMARY KEY (test_id, phase)
+);
+CREATE TABLE IF NOT EXISTS urls (
+    test_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    requests INTEGER,
+    errors INTEGER,
+    mean REAL,
+    p50 REAL,
+    p95 REAL,
+    p99 REAL,
+    PRIMARY KEY (test_id, url)
+);
+CREATE INDEX IF NOT EXISTS urls_by_url ON urls (url);
+"""
+RUN_COLUMNS = ("test_id", "user_id", "target", "status", "started_at", "completed_at", "load",
+               "duration", "requests", "errors", "rps", "p50", "p95", "p99")
+COMPARED_QUANTILES = (("p95", 0.95), ("p99", 0.99))
+
+
+def target_of(urls):
+    """The hosts a test hits, as one comparable string."""
+    return ",".join(sorted({urlsplit(url).netloc for url in urls}))
+
+
+def _quantile(histogram, q, z):
+    """Estimate of quantile `q` with its order-statistic confidence interval."""
+    rank = histogram.count * q
+    spread = z * math.sqrt(histogram.count * q * (1 - q))
+    return (histogram.value_at(rank), histogram.value_at(rank - spread),
+            histogram.value_at(rank + spread))
+
+
+def latency_change(baseline, candidate, q, z=REGRESSION_Z, min_change=REGRESSION_MIN_CHANGE):
+    """
+    Compare quantile `q` of two latency histograms. A change is significant
+    when the confidence intervals do not overlap and it exceeds `min_change`.
+    """
+    if not baseline.count or not candidate.count:
+        return None
+    base, base_low, base_high = _quantile(baseline, q, z)
+    cand, cand_low, cand_high = _quantile(candidate, q, z)
+    change = (cand - base) / base if base else 0.0
+    verdict = "unchanged"
+    if cand_low > base_high and change >= min_change:
+        verdict = "regressed"
+    elif cand_high < base_low and change <= -min_change:
+        verdict = "improved"
+    return {"baseline": round(base, 6), "candidate": round(cand, 6),
+            "change_percent": round(change * 100, 2), "verdict": verdict}
+
+
+def error_rate_change(baseline, candidate, z=REGRESSION_Z, min_change=REGRESSION_MIN_ERROR_RATE):
+    """Two-proportion z-test on the error rates of two `MetricsAggregate`s (in percent)."""
+    if not baseline.total or not candidate.total:
+        return None
+    base = baseline.error_count / baseline.total
+    cand = candidate.error_count / candidate.total
+    pooled = (baseline.error_count + candidate.error_count) / (baseline.total + candidate.total)
+    error = math.sqrt(pooled * (1 - pooled) * (1 / baseline.total + 1 / candidate.total))
+    score = (cand - base) / error if error else 0.0
+    change = (cand - base) * 100
+    verdict = "unchanged"
+    if score > z and change >= min_change:
+        verdict = "regressed"
+    elif score < -z and change <= -min_change:
+        verdict = "improved"
+    return {"baseline": round(base * 100, 3), "candidate": round(cand * 100, 3),
+            "change_points": round(change, 3), "verdict": verdict}
+
+
+def throughput_change(baseline, candidate, z=REGRESSION_Z, min_change=REGRESSION_MIN_CHANGE):
+    """
+    Compare request rates of two runs (`requests` over `duration` seconds),
+    treating request counts as Poisson.
+    """
+    if not baseline["duration"] or not candidate["duration"] or not baseline["requests"]:
+        return None
+    base = baseline["requests"] / baseline["duration"]
+    cand = candidate["requests"] / candidate["duration"]
+    error = math.sqrt(baseline["requests"] / baseline["duration"] ** 2
+                      + candidate["requests"] / candidate["duration"] ** 2)
+    score = (cand - base) / error if error else 0.0
+    change = (cand - base) / base
+    verdict = "unchanged"
+    if score < -z and change <= -min_change:
+        verdict = "regressed"
+    elif score > z and change >= min_change:
+        verdict = "improved"
+    return {"baseline": round(base, 2), "candidate": round(cand, 2),
+            "change_percent": round(change * 100, 2), "verdict": verdict}
+
+
+def compare_aggregates(baseline, candidate):
+    """p95/p99 latency and error-rate verdicts for two `MetricsAggregate`s."""
+    result = {name: latency_change(baseline.latency, candidate.latency, q)
+              for name, q in COMPARED_QUANTILES}
+    result["error_rate"] = error_rate_change(baseline, candidate)
+    return result
+
+
+def _flag(regressions, scope, metrics):
+    for name, change in metrics.items():
+        if change is not None and change["verdict"] == "regressed":
+            delta = (f"{change['change_points']:+.2f} points" if "change_points" in change
+                     else f"{change['change_percent']:+.1f}%")
+            regressions.append(f"{scope} {name}: {change['baseline']} -> "
+                               f"{change['candidate']} ({delta})")
+
+
+def compare_runs(baseline, candidate):
+    """
+    Diff two runs loaded by `RunHistory` (row dict, `MetricsRecorder`).
+    Returns every verdict plus `regressions`, a readable list of the
+    significant ones; `same_load` tells whether both ran the same steps.
+    """
+    (base_row, base_metrics), (cand_row, cand_metrics) = baseline, candidate
+    overall = compare_aggregates(base_metrics.overall, cand_metrics.overall)
+    overall["throughput"] = throughput_change(base_row, cand_row)
+    per_url = {
+        url: compare_aggregates(aggregate, cand_metrics.per_url[url])
+        for url, aggregate in base_metrics.per_url.items()
+        if url in cand_metrics.per_url
+    }
+
+    regressions = []
+    _flag(regressions, "overall", overall)
+    for url, metrics in per_url.items():
+        _flag(regressions, url, metrics)
+    return {
+        "test_id": cand_row["test_id"],
+        "baseline_id": base_row["test_id"],
+        "target": cand_row["target"],
+        "same_load": base_row["load"] == cand_row["load"],
+        "regressed": bool(regressions),
+        "regressions": regressions,
+        "overall": overall,
+        "per_url": per_url,
+        "new_urls": sorted(set(cand_metrics.per_url) - set(base_metrics.per_url)),
+        "missing_urls": sorted(set(base_metrics.per_url) - set(cand_metrics.per_url)),
+    }
+
+
+class RunHistory:
+    """
+    SQLite index of finished tests. Each run is one row keyed by test_id
+    (indexed by target and user) with its per-phase and per-URL aggregates
+    in side tables, plus its whole-test `MetricsRecorder` histograms stored
+    compressed, so a comparison loads two rows instead of re-reading result
+    files. Connections are opened per call, so any thread may use it.
+    """
+
+    def __init__(self, path=RUN_HISTORY_PATH):
+        self.path = path
+        self._ready = False
+
+    def _connect(self):
+        import sqlite3  # Loaded on first use; the index is optional
+
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    def record(self, test_id, user_id, target, status, started_at, load, duration, recorder,
+               phase_summaries):
+        """Store (or replace) one run from its merged recorder and phase summaries."""
+        overall = recorder.overall
+        percentiles = overall.latency.percentiles()
+        metrics = zlib.compress(json.dumps(recorder.to_dict()).encode("utf-8"))
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM phases WHERE test_id = ?", (test_id,))
+            conn.execute("DELETE FROM urls WHERE test_id = ?", (test_id,))
+            conn.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(RUN_COLUMNS)}, metrics) "
+                f"VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 1))})",
+                (test_id, user_id, target, status, started_at, time.time(), json.dumps(load),
+                 duration, overall.total, overall.error_count,
+                 overall.total / duration if duration else None,
+                 percentiles.get("p50"), percentiles.get("p95"), percentiles.get("p99"), metrics))
+            conn.executemany(
+                "INSERT INTO phases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(test_id, phase["phase"], json.dumps(phase.get("concurrency")),
+                  phase["requests"], phase["error_count"], phase.get("duration"),
+                  phase.get("rps"), *(phase["percentiles"].get(name) for name in ("p50", "p95", "p99")))
+                 for phase in phase_summaries])
+            conn.executemany(
+                "INSERT INTO urls VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(test_id, url, aggregate.total, aggregate.error_count, aggregate.latency.mean,
+                  *(url_percentiles.get(name) for name in ("p50", "p95", "p99")))
+                 for url, aggregate in recorder.per_url.items()
+                 for url_percentiles in [aggregate.latency.percentiles()]])
+
+    def runs(self, target=None, user_id=None, limit=20):
+        """Most recent runs first, optionally for one target or user."""
+        clauses, params = [], []
+        if target is not None:
+            clauses.append("target = ?")
+            params.append(target)
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM runs {where} "
+                f"ORDER BY completed_at DESC LIMIT ?", (*params, int(limit))).fetchall()
+        return [_run_dict(row) for row in rows]
+
+    def run(self, test_id):
+        """One run with its `phases` and `urls`; raises `LookupError` if unknown."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE test_id = ?",
+                (test_id,)).fetchone()
+            if row is None:
+                raise LookupError(f"No recorded run {test_id}")
+            run = _run_dict(row)
+            run["phases"] = [
+                {**dict(phase), "step": json.loads(phase["step"])}
+                for phase in conn.execute(
+                    "SELECT phase, step, requests, errors, duration, rps, p50, p95, p99 "
+                    "FROM phases WHERE test_id = ? ORDER BY phase", (test_id,))]
+            run["urls"] = [dict(url) for url in conn.execute(
+                "SELECT url, requests, errors, mean, p50, p95, p99 FROM urls "
+                "WHERE test_id = ? ORDER BY url", (test_id,))]
+        return run
+
+    def _load(self, conn, test_id):
+        row = conn.execute(
+            f"SELECT {', '.join(RUN_COLUMNS)}, metrics FROM runs WHERE test_id = ?",
+            (test_id,)).fetchone()
+        if row is None:
+            raise LookupError(f"No recorded run {test_id}")
+        metrics = MetricsRecorder.from_dict(json.loads(zlib.decompress(row["metrics"])))
+        return _run_dict(row), metrics
+
+    def compare(self, test_id, baseline_id=None):
+        """
+        Diff run `test_id` against `baseline_id`, by default the latest
+        earlier completed run against the same target (see `compare_runs`).
+        Raises `LookupError` when either run is missing.
+        """
+        with closing(self._connect()) as conn:
+            candidate = self._load(conn, test_id)
+            if baseline_id is None:
+                row = conn.execute(
+                    "SELECT test_id FROM runs WHERE target = ? AND status = 'completed' "
+                    "AND completed_at < ? ORDER BY completed_at DESC LIMIT 1",
+                    (candidate[0]["target"], candidate[0]["completed_at"])).fetchone()
+                if row is None:
+                    raise LookupError(
+                        f"No earlier completed run against {candidate[0]['target']}")
+                baseline_id = row["test_id"]
+            baseline = self._load(conn, baseline_id)
+        return compare_runs(baseline, candidate)
+
+
+def _run_dict(row):
+    run = {name: row[name] for name in RUN_COLUMNS}
+    run["load"] = json.loads(run["load"])
+    return run
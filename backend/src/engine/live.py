@@ -0,0 +1,238 @@
+# engine/live.py
+
+import math
+import os
+import resource
+import threading
+from bisect import bisect_left
+
+from config import METRICS_MAX_URLS, METRICS_LATENCY_BUCKETS
+from .errors import error_name, status_kind
+from .monitor import _open_files
+
+OTHER_URL = "other"  # Label of the URLs past a test's METRICS_MAX_URLS
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class _Shard:
+    """Counters with a single writer: one recording thread, or a sum built for a scrape."""
+
+    __slots__ = ("requests", "errors", "latency", "latency_sum")
+
+    def __init__(self):
+        self.requests = {}     # (url, status code) -> count
+        self.errors = {}       # (url, error kind) -> count
+        self.latency_sum = {}  # url -> seconds
+        self.latency = {}      # url -> count per bucket, the last one past every bound
+
+    def copy(self):
+        # Each dict or list copy is atomic under the GIL, so this is safe while
+        # the owning thread keeps recording. latency_sum gains a URL before
+        # latency does, and is copied after it.
+        shard = _Shard()
+        shard.requests = self.requests.copy()
+        shard.errors = self.errors.copy()
+        shard.latency = {url: list(counts) for url, counts in self.latency.copy().items()}
+        shard.latency_sum = self.latency_sum.copy()
+        return shard
+
+    def add(self, other, sign=1):
+        for key, count in other.requests.items():
+            self.requests[key] = self.requests.get(key, 0) + sign * count
+        for key, count in other.errors.items():
+            self.errors[key] = self.errors.get(key, 0) + sign * count
+        for url, counts in other.latency.items():
+            self.latency_sum[url] = self.latency_sum.get(url, 0.0) + sign * other.latency_sum.get(url, 0.0)
+            mine = self.latency.get(url)
+            if mine is None:
+                mine = self.latency[url] = [0] * len(counts)
+            for index, count in enumerate(counts):
+                mine[index] += sign * count
+        return self
+
+
+class LiveCounters:
+    """
+    Cumulative per-URL request, error-kind and latency-bucket counters of
+    one test, read by the /metrics scrape endpoint while the test runs.
+
+    Every thread that records gets its own shard and is its only writer, so
+    `record` takes no lock and a scrape never stalls the engine: `totals()`
+    copies each shard and adds them up on the scraping thread. Worker
+    processes and cluster nodes `drain()` what they recorded since their
+    last drain and the parent `absorb()`s it, alongside progress deltas.
+
+    Latency buckets count successful requests, like the percentiles. A
+    test's first `max_urls` URLs get series of their own; later ones are
+    counted under `url="other"`.
+    """
+
+    def __init__(self, max_urls=METRICS_MAX_URLS, buckets=METRICS_LATENCY_BUCKETS):
+        self.max_urls = max_urls
+        self.buckets = tuple(buckets)
+        self._urls = set()
+        self._shards = []
+        self._local = threading.local()
+        self._drained = _Shard()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            self._shards.append(shard)
+            return shard
+
+    def _label(self, url):
+        if url in self._urls or url == OTHER_URL:
+            return url
+        # Threads racing here may admit a URL or two past the cap
+        if len(self._urls) >= self.max_urls:
+            return OTHER_URL
+        self._urls.add(url)
+        return url
+
+    def record(self, result):
+        shard = self._shard()
+        url = self._label(result.get("url"))
+        code = result.get("status_code", "error")
+        key = (url, code)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        if result.get("success", False):
+            latency = result["latency"]
+            counts = shard.latency.get(url)
+            if counts is None:
+                shard.latency_sum[url] = 0.0
+                counts = shard.latency[url] = [0] * (len(self.buckets) + 1)
+            counts[bisect_left(self.buckets, latency)] += 1
+            shard.latency_sum[url] += latency
+        else:
+            kind = result.get("error_kind")
+            key = (url, status_kind(code) if kind is None else kind)
+            shard.errors[key] = shard.errors.get(key, 0) + 1
+
+    def totals(self):
+        """All shards added up into one `_Shard`."""
+        total = _Shard()
+        for shard in list(self._shards):
+            total.add(shard.copy())
+        return total
+
+    def drain(self):
+        """
+        What was recorded or absorbed since the last drain, JSON-safe, or
+        None when nothing was. Only one thread may drain.
+        """
+        total = self.totals()
+        delta = _Shard().add(total).add(self._drained, sign=-1)
+        self._drained = total
+        requests = [(url, code, count) for (url, code), count in delta.requests.items() if count]
+        if not requests:
+            return None
+        return {
+            "requests": requests,
+            "errors": [(url, kind, count) for (url, kind), count in delta.errors.items() if count],
+            "latency": [(url, counts, delta.latency_sum[url])
+                        for url, counts in delta.latency.items() if any(counts)],
+        }
+
+    def absorb(self, delta):
+        shard = self._shard()
+        for url, code, count in delta["requests"]:
+            key = (self._label(url), code)
+            shard.requests[key] = shard.requests.get(key, 0) + count
+        for url, kind, count in delta["errors"]:
+            key = (self._label(url), kind)
+            shard.errors[key] = shard.errors.get(key, 0) + count
+        for url, counts, seconds in delta["latency"]:
+            url = self._label(url)
+            mine = shard.latency.get(url)
+            if mine is None:
+                shard.latency_sum[url] = 0.0
+                mine = shard.latency[url] = [0] * (len(self.buckets) + 1)
+            for index, count in enumerate(counts):
+                mine[index] += count
+            shard.latency_sum[url] += seconds
+
+    def expose(self, page, labels):
+        """Add this test's counters and latency histograms to an `OpenMetricsPage`."""
+        total = self.totals()
+        for (url, code), count in total.requests.items():
+            page.add("loadtest_requests", "counter", "Requests completed, by URL and status code",
+                     count, "_total", {**labels, "url": url, "code": str(code)})
+        for (url, kind), count in total.errors.items():
+            page.add("loadtest_errors", "counter", "Failed requests, by URL and error kind",
+                     count, "_total", {**labels, "url": url, "kind": error_name(kind)})
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for url, counts in total.latency.items():
+            url_labels = {**labels, "url": url}
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                page.add("loadtest_request_duration_seconds", "histogram",
+                         "Latency of successful requests", cumulative, "_bucket",
+                         {**url_labels, "le": bound})
+            page.add("loadtest_request_duration_seconds", "histogram", None,
+                     cumulative, "_count", url_labels)
+            page.add("loadtest_request_duration_seconds", "histogram", None,
+                     total.latency_sum.get(url, 0.0), "_sum", url_labels)
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class OpenMetricsPage:
+    """Metric families in OpenMetrics text format, each family's samples kept together."""
+
+    def __init__(self):
+        self._families = {}
+
+    def add(self, name, metric_type, help_text, value, suffix="", labels=None):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (metric_type, help_text, [])
+        label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in (labels or {}).items())
+        family[2].append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}"
+                         if label_text else f"{name}{suffix} {_format_value(value)}")
+
+    def render(self):
+        lines = []
+        for name, (metric_type, help_text, samples) in self._families.items():
+            lines.append(f"# TYPE {name} {metric_type}")
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.extend(samples)
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def expose_process(page):
+    """CPU time (reaped worker processes included), memory and file descriptors of this process."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    page.add("process_cpu_seconds", "counter", "User and system CPU time",
+             own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime, "_total")
+    try:
+        with open("/proc/self/statm") as statm:
+            resident = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        page.add("process_resident_memory_bytes", "gauge", "Resident memory", resident)
+    except OSError:
+        pass
+    fds, sockets = _open_files()
+    if fds is not None:
+        page.add("process_open_fds", "gauge", "Open file descriptors", fds)
+        page.add("loadtest_open_sockets", "gauge", "Open sockets of the load generator", sockets)
+    fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if fd_limit != resource.RLIM_INFINITY:
+        page.add("process_max_fds", "gauge", "File descriptor limit", fd_limit)
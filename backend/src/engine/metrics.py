@@ -1,6 +1,427 @@
+import threading
+import time
 
+from config import KEEP_RAW_RESULTS
+from .errors import ErrorLog, error_name, status_kind
 
-def calculate_metrics(all_results, filter_url=None):
+# Histograms count whole microseconds. Values below SUB_BUCKET_COUNT are
+# exact; above that every power of two is split into SUB_BUCKET_COUNT linear
+# buckets, so a reported percentile is within 1/(2 * SUB_BUCKET_COUNT) of
+# the true value.
+HISTOGRAM_UNIT = 1e-6
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p95", 0.95),
+               ("p99", 0.99), ("p999", 0.999))
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def _bucket_midpoint(index):
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    mantissa = (index & (SUB_BUCKET_COUNT - 1)) + SUB_BUCKET_COUNT
+    return (mantissa << shift) + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram (HDR style). Memory is bounded by the
+    number of buckets, not the number of samples, and two histograms merge
+    by adding bucket counts.
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+    unit = HISTOGRAM_UNIT  # Size of one bucket step at the exact end of the range
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        value = int(seconds / self.unit)
+        index = _bucket_index(value) if value > 0 else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentiles(self):
+        """p50/p90/p95/p99/p99.9 and max in seconds (bytes for sizes), in one sweep."""
+        if not self.count:
+            return {}
+        ranks = [(name, min(int(self.count * q), self.count - 1))
+                 for name, q in PERCENTILES]
+        result = {}
+        seen = 0
+        position = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while position < len(ranks) and seen > ranks[position][1]:
+                value = _bucket_midpoint(index) * self.unit
+                result[ranks[position][0]] = min(max(value, self.min), self.max)
+                position += 1
+            if position == len(ranks):
+                break
+        result["max"] = self.max
+        return result
+
+    def value_at(self, rank):
+        """Value of the sample at 0-based `rank` in sorted order (clamped to the range)."""
+        if not self.count:
+            return None
+        rank = min(max(int(rank), 0), self.count - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return min(max(_bucket_midpoint(index) * self.unit, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "counts": sorted(self.counts.items()),
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"]}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class SizeHistogram(LatencyHistogram):
+    """The same buckets over whole bytes, for response sizes."""
+
+    __slots__ = ()
+    unit = 1
+
+
+def _round_percentiles(percentiles):
+    return {k: round(v, 6) for k, v in percentiles.items()}
+
+
+class MetricsAggregate:
+    """Counters and histograms for one slice of results (a phase or a URL)."""
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.latency = LatencyHistogram()
+        self.service_time = None
+        self.status_codes = {}
+        self.status_latency = {}
+        self.errors = {}  # (status code, error kind) -> count
+        self.timings = {}  # Request phase (dns, connect, tls, ttfb, download) -> histogram
+        self.connections_opened = 0
+        self.body_size = None
+
+    def record(self, result):
+        self.record_values(
+            result["latency"],
+            result.get("status_code", "error"),
+            result.get("success", False),
+            result.get("error_kind"),
+            result.get("service_time"),
+            result.get("timings"),
+            result.get("body_size"))
+
+    def record_values(self, latency, code, success, error_kind=None, service_time=None,
+                      timings=None, body_size=None):
+        self.total += 1
+        self.status_codes[code] = self.status_codes.get(code, 0) + 1
+
+        status_histogram = self.status_latency.get(code)
+        if status_histogram is None:
+            status_histogram = self.status_latency[code] = LatencyHistogram()
+        status_histogram.record(latency)
+
+        if success:
+            self.success += 1
+            self.latency.record(latency)
+            if service_time is not None:
+                if self.service_time is None:
+                    self.service_time = LatencyHistogram()
+                self.service_time.record(service_time)
+            if timings:
+                for name, seconds in timings.items():
+                    histogram = self.timings.get(name)
+                    if histogram is None:
+                        histogram = self.timings[name] = LatencyHistogram()
+                    histogram.record(seconds)
+                if "connect" in timings:
+                    self.connections_opened += 1
+            if body_size is not None:
+                if self.body_size is None:
+                    self.body_size = SizeHistogram()
+                self.body_size.record(body_size)
+        else:
+            key = (code, status_kind(code) if error_kind is None else error_kind)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def merge(self, other):
+        self.total += other.total
+        self.success += other.success
+        self.latency.merge(other.latency)
+        if other.service_time is not None:
+            if self.service_time is None:
+                self.service_time = LatencyHistogram()
+            self.service_time.merge(other.service_time)
+        for code, count in other.status_codes.items():
+            self.status_codes[code] = self.status_codes.get(code, 0) + count
+        for code, histogram in other.status_latency.items():
+            self.status_latency.setdefault(code, LatencyHistogram()).merge(histogram)
+        for key, count in other.errors.items():
+            self.errors[key] = self.errors.get(key, 0) + count
+        for name, histogram in other.timings.items():
+            self.timings.setdefault(name, LatencyHistogram()).merge(histogram)
+        self.connections_opened += other.connections_opened
+        if other.body_size is not None:
+            if self.body_size is None:
+                self.body_size = SizeHistogram()
+            self.body_size.merge(other.body_size)
+        return self
+
+    @property
+    def error_count(self):
+        return self.total - self.success
+
+    def to_dict(self):
+        """Compact JSON-safe form for shipping between processes or nodes."""
+        return {
+            "total": self.total,
+            "success": self.success,
+            "latency": self.latency.to_dict(),
+            "service_time": self.service_time.to_dict() if self.service_time else None,
+            "status_codes": list(self.status_codes.items()),
+            "status_latency": [
+                (code, histogram.to_dict())
+                for code, histogram in self.status_latency.items()
+            ],
+            "errors": [(code, kind, count) for (code, kind), count in self.errors.items()],
+            "timings": [(name, histogram.to_dict()) for name, histogram in self.timings.items()],
+            "connections_opened": self.connections_opened,
+            "body_size": self.body_size.to_dict() if self.body_size else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregate = cls()
+        aggregate.total = data["total"]
+        aggregate.success = data["success"]
+        aggregate.latency = LatencyHistogram.from_dict(data["latency"])
+        if data.get("service_time"):
+            aggregate.service_time = LatencyHistogram.from_dict(data["service_time"])
+        aggregate.status_codes = {code: count for code, count in data["status_codes"]}
+        aggregate.status_latency = {
+            code: LatencyHistogram.from_dict(histogram)
+            for code, histogram in data["status_latency"]
+        }
+        aggregate.errors = {}
+        for code, kind, count in data["errors"]:
+            if not isinstance(kind, int):
+                kind = status_kind(code)  # Raw message, from before error kinds
+            key = (code, kind)
+            aggregate.errors[key] = aggregate.errors.get(key, 0) + count
+        aggregate.timings = {
+            name: LatencyHistogram.from_dict(histogram)
+            for name, histogram in data.get("timings", [])
+        }
+        aggregate.connections_opened = data.get("connections_opened", 0)
+        if data.get("body_size"):
+            aggregate.body_size = SizeHistogram.from_dict(data["body_size"])
+        return aggregate
+
+    def error_list(self):
+        return [
+            {"status_code": code, "error": error_name(kind), "count": count}
+            for (code, kind), count in self.errors.items()
+        ]
+
+    def timing_breakdown(self):
+        """Mean and percentiles per request phase, for successful requests."""
+        return {
+            name: {"mean": round(histogram.mean, 6),
+                   **_round_percentiles(histogram.percentiles())}
+            for name, histogram in self.timings.items()
+        }
+
+    def response_size(self):
+        """Mean and percentiles of response body sizes in bytes, for successful requests."""
+        histogram = self.body_size
+        return {"mean": round(histogram.mean), "total": round(histogram.total),
+                **{name: round(value) for name, value in histogram.percentiles().items()}}
+
+    def summary(self):
+        summary = {
+            "total_requests": self.total,
+            "successful_requests": self.success,
+            "error_requests": self.error_count,
+            "average_time": self.latency.mean,
+            "success_rate": (self.success / self.total) * 100 if self.total else 0,
+            "percentiles": _round_percentiles(self.latency.percentiles()),
+            "status_codes": dict(self.status_codes),
+            "latency_by_status": {
+                code: _round_percentiles(histogram.percentiles())
+                for code, histogram in self.status_latency.items()
+            },
+            "errors": self.error_list(),
+        }
+        if self.service_time is not None:
+            summary["uncorrected_percentiles"] = _round_percentiles(
+                self.service_time.percentiles())
+        if self.timings:
+            summary["timing_breakdown"] = self.timing_breakdown()
+            summary["connections_opened"] = self.connections_opened
+        if self.body_size is not None:
+            summary["response_size"] = self.response_size()
+        return summary
+
+
+class MetricsRecorder:
+    """
+    Streaming sink the runners feed one result at a time. Aggregates overall,
+    per-URL and (for scenario results) per-step metrics in constant memory;
+    raw result dicts are only kept
+    when `keep_raw` is set. Failures also go to an `ErrorLog` for exemplar
+    messages and the error timeline. An optional `ProgressTracker` sees every result
+    for live windowed stats, an optional `LiveCounters` keeps the test-wide
+    counters the /metrics endpoint scrapes, and an optional
+    `ResultStoreWriter` persists every result to the columnar store.
+    """
+
+    def __init__(self, keep_raw=KEEP_RAW_RESULTS, progress=None, store=None, live=None):
+        self.overall = MetricsAggregate()
+        self.per_url = {}
+        self.per_step = {}
+        self.error_log = ErrorLog()
+        self.raw = [] if keep_raw else None
+        self.progress = progress
+        self.store = store
+        self.live = live
+
+    def started(self, count=1):
+        """Called by runners as requests are dispatched, for in-flight tracking."""
+        if self.progress is not None:
+            self.progress.started(count)
+
+    def record(self, result):
+        if self.progress is not None:
+            self.progress.record(result)
+        if self.live is not None:
+            self.live.record(result)
+        self.overall.record(result)
+        if not result.get("success", False):
+            kind = result.get("error_kind")
+            self.error_log.record(status_kind(result.get("status_code")) if kind is None else kind,
+                                  result.get("error"))
+        url_aggregate = self.per_url.get(result["url"])
+        if url_aggregate is None:
+            url_aggregate = self.per_url[result["url"]] = MetricsAggregate()
+        url_aggregate.record(result)
+        step = result.get("step")
+        if step is not None:
+            step_aggregate = self.per_step.get(step)
+            if step_aggregate is None:
+                step_aggregate = self.per_step[step] = MetricsAggregate()
+            step_aggregate.record(result)
+        if self.raw is not None:
+            self.raw.append(result)
+        if self.store is not None:
+            self.store.append(result)
+
+    def merge(self, other):
+        self.overall.merge(other.overall)
+        for url, aggregate in other.per_url.items():
+            self.per_url.setdefault(url, MetricsAggregate()).merge(aggregate)
+        for step, aggregate in other.per_step.items():
+            self.per_step.setdefault(step, MetricsAggregate()).merge(aggregate)
+        self.error_log.merge(other.error_log)
+        if self.raw is not None and other.raw:
+            self.raw.extend(other.raw)
+        return self
+
+    def to_dict(self):
+        return {
+            "overall": self.overall.to_dict(),
+            "per_url": {url: aggregate.to_dict() for url, aggregate in self.per_url.items()},
+            "per_step": {step: aggregate.to_dict() for step, aggregate in self.per_step.items()},
+            "error_log": self.error_log.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        recorder = cls(keep_raw=False)
+        recorder.overall = MetricsAggregate.from_dict(data["overall"])
+        recorder.per_url = {
+            url: MetricsAggregate.from_dict(aggregate)
+            for url, aggregate in data["per_url"].items()
+        }
+        recorder.per_step = {
+            step: MetricsAggregate.from_dict(aggregate)
+            for step, aggregate in data.get("per_step", {}).items()
+        }
+        if data.get("error_log"):
+            recorder.error_log = ErrorLog.from_dict(data["error_log"])
+        return recorder
+
+    def per_url_summary(self):
+        return {url: aggregate.summary() for url, aggregate in self.per_url.items()}
+
+    def per_step_summary(self):
+        return {step: aggregate.summary() for step, aggregate in self.per_step.items()}
+
+
+def calculate_percentiles(times):
+    """Percentiles of an already sorted list of latencies."""
+    if not times:
+        return {}
+    return {
+        "p50": times[int(len(times) * 0.5)],
+        "p90": times[int(len(times) * 0.9)],
+        "p95": times[int(len(times) * 0.95)],
+        "p99": times[int(len(times) * 0.99)] if len(times) >= 100 else times[-1]
+    }
+
+
+def calculate_metrics(all_results, filter_url=None, latency_key="latency"):
 
     if filter_url:
         all_results = [r for r in all_results if r.get('url') == filter_url]
@@ -8,22 +429,15 @@ def calculate_metrics(all_results, filter_url=None):
     success_results = [r for r in all_results if r.get('success', False)]
     error_results = [r for r in all_results if not r.get('success', False)]
 
-    success_times = [r['latency'] for r in success_results]
+    success_times = [r.get(latency_key, r['latency']) for r in success_results]
 
     status_codes = {}
     for r in all_results:
         code = r.get('status_code', 'error')
         status_codes[code] = status_codes.get(code, 0) + 1
 
-    percentiles = {}
-    if success_times:
-        success_times.sort()
-        percentiles = {
-            "p50": success_times[int(len(success_times) * 0.5)],
-            "p90": success_times[int(len(success_times) * 0.9)],
-            "p95": success_times[int(len(success_times) * 0.95)],
-            "p99": success_times[int(len(success_times) * 0.99)] if len(success_times) >= 100 else success_times[-1]
-        }
+    success_times.sort()
+    percentiles = calculate_percentiles(success_times)
 
     return {
         "success_times": success_times,
@@ -33,36 +447,94 @@ def calculate_metrics(all_results, filter_url=None):
     }
 
 
-def calculate_per_url_metrics(all_results):
-    unique_urls = list(set(r.get("url") for r in all_results if r.get("url")))
-    per_url_metrics = {}
-
-    for url in unique_urls:
-        results = [r for r in all_results if r.get("url") == url]
-        metrics = calculate_metrics(results, filter_url=url)
-        success_times = metrics["success_times"]
-        total = len(results)
-        success_count = len(success_times)
-        avg_time = sum(success_times) / \
-            len(success_times) if success_times else None
-        success_rate = (success_count/total) * 100 if total else 0
-
-        error_buckets = {}
-        for r in metrics["error_results"]:
-            key = (r.get("status_code", "error"), r.get("error") or "Unknown error")
-            error_buckets[key] = error_buckets.get(key, 0) + 1
-        errors = [
-            {"status_code": code, "error": msg, "count": count}
-            for (code, msg), count in error_buckets.items()
-        ]
+class ProgressTracker:
+    """
+    Rolling window over a running phase for live `phase_progress` events.
+
+    The engine thread records into it while the event loop takes snapshots;
+    each snapshot drains the current window, so a slow consumer simply gets
+    a longer window instead of a backlog.
+    """
 
-        per_url_metrics[url] = {
-            "total_requests": total,
-            "successful_requests": success_count,
-            "average_time": avg_time,
-            "success_rate": success_rate,
-            "percentiles": {k: round(v, 3) for k, v in metrics["percentiles"].items()},
-            "status_codes": metrics["status_codes"],
-            "errors": errors,
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+        self._reset_window(time.monotonic())
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._started = 0
+        self._requests = 0
+        self._errors = 0
+        self._latency = LatencyHistogram()
+
+    def started(self, count=1):
+        with self._lock:
+            self.in_flight += count
+            self._started += count
+
+    def record(self, result):
+        with self._lock:
+            self.in_flight -= 1
+            self._requests += 1
+            self.total_requests += 1
+            if result.get("success", False):
+                self._latency.record(result["latency"])
+            else:
+                self._errors += 1
+                self.total_errors += 1
+
+    def drain(self):
+        """
+        Take the raw window counters as a picklable delta and start a new
+        window. Used by worker processes to forward progress to the parent's
+        tracker through `absorb`.
+        """
+        with self._lock:
+            delta = {
+                "started": self._started,
+                "requests": self._requests,
+                "errors": self._errors,
+                "latency": self._latency.to_dict(),
+            }
+            self._reset_window(self._window_start)
+        return delta
+
+    def absorb(self, delta):
+        latency = LatencyHistogram.from_dict(delta["latency"])
+        with self._lock:
+            self.in_flight += delta["started"] - delta["requests"]
+            self._started += delta["started"]
+            self._requests += delta["requests"]
+            self._errors += delta["errors"]
+            self.total_requests += delta["requests"]
+            self.total_errors += delta["errors"]
+            self._latency.merge(latency)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._window_start
+            requests = self._requests
+            errors = self._errors
+            latency = self._latency
+            in_flight = self.in_flight
+            total_requests = self.total_requests
+            total_errors = self.total_errors
+            self._reset_window(now)
+
+        percentiles = latency.percentiles()
+        return {
+            "window": round(elapsed, 3),
+            "rps": round(requests / elapsed, 2) if elapsed > 0 else 0,
+            "error_rate": round(errors / requests * 100, 2) if requests else 0,
+            "in_flight": max(in_flight, 0),
+            "percentiles": {k: percentiles[k] for k in ("p50", "p95", "p99")} if percentiles else {},
+            "requests": total_requests,
+            "error_count": total_errors,
         }
-    return per_url_metrics
+
+
+STATUS_ERROR = 0  # Column value for results without an HTTP status ("error")
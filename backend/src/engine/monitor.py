@@ -0,0 +1,191 @@
+# engine/monitor.py
+
+import os
+import resource
+import threading
+import time
+
+from config import (MONITOR_INTERVAL, GENERATOR_CPU_THRESHOLD, GENERATOR_LAG_THRESHOLD,
+                    GENERATOR_SKEW_THRESHOLD, GENERATOR_FD_THRESHOLD)
+
+FD_DIR = "/proc/self/fd"
+
+
+def _open_files():
+    """(open fds, open sockets) for this process, or (None, None) without /proc."""
+    try:
+        fds = os.listdir(FD_DIR)
+    except OSError:
+        return None, None
+    sockets = 0
+    for fd in fds:
+        try:
+            if os.readlink(os.path.join(FD_DIR, fd)).startswith("socket:"):
+                sockets += 1
+        except OSError:
+            pass
+    return len(fds), sockets
+
+
+def _quantile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class GeneratorMonitor:
+    """
+    Samples the load generator itself while a phase runs, so a phase whose
+    latency came from our own saturation can be told apart from one where
+    the target was slow.
+
+    Every `MONITOR_INTERVAL` seconds a background thread records process
+    CPU (100 = one core), open file descriptors and sockets, and probes
+    scheduling lag: how long a callback waits to run on the session's event
+    loop or, without a loop, how late the monitor thread itself wakes up
+    (GIL and OS scheduler delay). The thread pool is not probed, since its
+    workers are busy waiting on the target at high concurrency. `report()` adds the
+    send-schedule skew of arrival-rate phases and flags the phase as
+    `generator_bound` when any threshold is crossed.
+    """
+
+    def __init__(self, loop=None, interval=MONITOR_INTERVAL):
+        self.loop = loop
+        self.interval = interval
+        self.cpu = []
+        self.lags = []
+        self.max_fds = None
+        self.max_sockets = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="generator-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _probe_lag(self, wake_lag):
+        if self.loop is not None and self.loop.is_running():
+            sent = time.perf_counter()
+            self.loop.call_soon_threadsafe(lambda: self.lags.append(time.perf_counter() - sent))
+        elif self.loop is None:
+            self.lags.append(wake_lag)
+
+    def _sample_files(self):
+        fds, sockets = _open_files()
+        if fds is not None:
+            self.max_fds = max(self.max_fds or 0, fds)
+            self.max_sockets = max(self.max_sockets or 0, sockets)
+
+    def _run(self):
+        last_wall, last_cpu = time.perf_counter(), time.process_time()
+        waited = last_wall
+        while not self._stop.wait(self.interval):
+            wall, cpu = time.perf_counter(), time.process_time()
+            self.cpu.append((cpu - last_cpu) / (wall - last_wall) * 100)
+            last_wall, last_cpu = wall, cpu
+            self._sample_files()
+            self._probe_lag(max(0.0, wall - waited - self.interval))
+            waited = time.perf_counter()
+
+    def current(self):
+        """The latest CPU (percent of a core) and scheduling lag samples, None until taken."""
+        return {
+            "cpu_percent": self.cpu[-1] if self.cpu else None,
+            "scheduling_lag": self.lags[-1] if self.lags else None,
+        }
+
+    def report(self, schedule=None):
+        fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        lag_p90 = _quantile(self.lags, 0.9)
+        cpu_mean = sum(self.cpu) / len(self.cpu) if self.cpu else None
+        report = {
+            "samples": len(self.cpu),
+            "cpu_percent": {
+                "mean": round(cpu_mean, 1) if cpu_mean is not None else None,
+                "max": round(max(self.cpu), 1) if self.cpu else None,
+            },
+            "open_fds": self.max_fds,
+            "open_sockets": self.max_sockets,
+            "fd_limit": fd_limit if fd_limit != resource.RLIM_INFINITY else None,
+            "scheduling_lag": {
+                "p90": round(lag_p90, 6) if lag_p90 is not None else None,
+                "max": round(max(self.lags), 6) if self.lags else None,
+            },
+        }
+        if schedule and schedule.get("send_delay"):
+            report["send_skew"] = schedule["send_delay"]
+        return evaluate_report(report)
+
+
+def evaluate_report(report):
+    """Set `generator_bound` and `reasons` on a (possibly merged) report."""
+    reasons = []
+    cpu_mean = report["cpu_percent"]["mean"]
+    if cpu_mean is not None and cpu_mean >= GENERATOR_CPU_THRESHOLD:
+        reasons.append(f"process CPU averaged {cpu_mean:.0f}% of a core")
+    lag = report["scheduling_lag"]["p90"]
+    if lag is not None and lag >= GENERATOR_LAG_THRESHOLD:
+        reasons.append(f"scheduling lag p90 {lag * 1000:.0f}ms")
+    skew = (report.get("send_skew") or {}).get("p99")
+    if skew is not None and skew >= GENERATOR_SKEW_THRESHOLD:
+        reasons.append(f"send-schedule skew p99 {skew * 1000:.0f}ms")
+    if report["open_fds"] and report["fd_limit"] and \
+            report["open_fds"] >= report["fd_limit"] * GENERATOR_FD_THRESHOLD:
+        reasons.append(f"{report['open_fds']} of {report['fd_limit']} file descriptors open")
+    report["generator_bound"] = bool(reasons)
+    report["reasons"] = reasons
+    return report
+
+
+def merge_reports(reports):
+    """
+    Combine the reports of several worker processes or nodes. Each field
+    keeps its worst value, since one saturated generator already skews the
+    merged results.
+    """
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+
+    def worst(values):
+        values = [value for value in values if value is not None]
+        return max(values) if values else None
+
+    merged = {
+        "samples": sum(report["samples"] for report in reports),
+        "cpu_percent": {
+            key: worst(report["cpu_percent"][key] for report in reports)
+            for key in ("mean", "max")
+        },
+        "open_fds": worst(report["open_fds"] for report in reports),
+        "open_sockets": worst(report["open_sockets"] for report in reports),
+        "fd_limit": worst(report["fd_limit"] for report in reports),
+        "scheduling_lag": {
+            key: worst(report["scheduling_lag"][key] for report in reports)
+            for key in ("p90", "max")
+        },
+    }
+    skews = [report["send_skew"] for report in reports if report.get("send_skew")]
+    if skews:
+        merged["send_skew"] = {key: worst(skew.get(key) for skew in skews) for key in skews[0]}
+    evaluate_report(merged)
+    # Keep a shard's own verdict even if the worst-value merge hides it
+    for report in reports:
+        for reason in report["reasons"]:
+            if reason not in merged["reasons"]:
+                merged["reasons"].append(reason)
+    merged["generator_bound"] = bool(merged["reasons"])
+    return merged
@@ -0,0 +1,121 @@
+# engine/profiles.py
+
+import math
+
+PROFILE_MODELS = ("users", "rate")
+
+
+def _number(spec, key, default=None):
+    value = spec.get(key, default)
+    if value is None:
+        raise ValueError(f"load profile '{spec.get('shape')}' requires '{key}'")
+    value = float(value)
+    if value < 0:
+        raise ValueError(f"load profile '{key}' must not be negative")
+    return value
+
+
+def _positive(spec, key, default=None):
+    value = _number(spec, key, default)
+    if value <= 0:
+        raise ValueError(f"load profile '{key}' must be positive")
+    return value
+
+
+def _soak(spec):
+    level = _number(spec, "level")
+    return _number(spec, "duration"), lambda t: level
+
+
+def _linear(spec):
+    start, end = _number(spec, "from"), _number(spec, "to")
+    duration = _number(spec, "duration")
+    return duration, lambda t: start + (end - start) * min(t / duration, 1.0)
+
+
+def _step(spec):
+    levels = [float(level) for level in spec.get("levels") or []]
+    if not levels:
+        raise ValueError("load profile 'step' requires a non-empty 'levels' list")
+    step_duration = _positive(spec, "step_duration")
+    last = len(levels) - 1
+    return (step_duration * len(levels),
+            lambda t: levels[min(int(t // step_duration), last)])
+
+
+def _spike(spec):
+    base, peak = _number(spec, "base"), _number(spec, "peak")
+    duration = _number(spec, "duration")
+    spike_at = _number(spec, "spike_at", duration / 2)
+    if spike_at > duration:
+        raise ValueError("load profile 'spike_at' must lie within the profile duration")
+    spike_duration = _positive(spec, "spike_duration")
+    ramp = _number(spec, "ramp", 0)
+
+    def target(t):
+        # Ramp up to the peak, hold it, then ramp back down to the base
+        if t < spike_at - ramp or t >= spike_at + spike_duration + ramp:
+            return base
+        if t < spike_at:
+            return base + (peak - base) * (t - (spike_at - ramp)) / ramp
+        if t < spike_at + spike_duration:
+            return peak
+        return peak - (peak - base) * (t - spike_at - spike_duration) / ramp
+
+    return duration, target
+
+
+def _sine(spec):
+    mean, amplitude = _number(spec, "mean"), _number(spec, "amplitude")
+    period = _positive(spec, "period")
+    return (_number(spec, "duration"),
+            lambda t: max(0.0, mean + amplitude * math.sin(2 * math.pi * t / period)))
+
+
+_SHAPES = {
+    "soak": _soak,
+    "constant": _soak,
+    "linear": _linear,
+    "step": _step,
+    "spike": _spike,
+    "sine": _sine,
+}
+
+
+class LoadProfile:
+    """
+    Declarative load shape evaluated at any instant of a phase.
+
+    `spec` is a dict such as `{"shape": "linear", "from": 10, "to": 500,
+    "duration": 120}`. `model` is `"users"` (active virtual users) or
+    `"rate"` (requests per second). `shard=(index, count)` returns this
+    shard's part of the target so the shards always add up to the whole.
+    """
+
+    def __init__(self, spec, shard=None):
+        shape = spec.get("shape")
+        if shape not in _SHAPES:
+            raise ValueError(f"load profile shape must be one of {', '.join(_SHAPES)}")
+        self.model = spec.get("model", "users")
+        if self.model not in PROFILE_MODELS:
+            raise ValueError(f"load profile model must be one of {', '.join(PROFILE_MODELS)}")
+        self.spec = spec
+        self.shape = shape
+        self.duration, self._target = _SHAPES[shape](spec)
+        if self.duration <= 0:
+            raise ValueError("load profile duration must be positive")
+        self.shard = tuple(shard) if shard else (0, 1)
+
+    def total(self, elapsed):
+        """Whole-test target at `elapsed` seconds, before sharding."""
+        return self._target(min(elapsed, self.duration))
+
+    def target(self, elapsed):
+        """This shard's target at `elapsed` seconds into the phase."""
+        total = self.total(elapsed)
+        index, count = self.shard
+        if self.model == "rate":
+            return total / count
+        # Split whole users so the shard targets always sum to the total
+        total = round(total)
+        return total * (index + 1) // count - total * index // count
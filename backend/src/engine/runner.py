@@ -1,56 +1,139 @@
+import threading
 import time
 import random
 import requests
+import urllib3
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from config import REQUEST_TIMEOUT, MAX_THREAD_POOL_SIZE, BATCH_SLEEP_MIN, BATCH_SLEEP_MAX
+from config import (REQUEST_TIMEOUT, MAX_THREAD_POOL_SIZE, BATCH_SLEEP_MIN, BATCH_SLEEP_MAX,
+                    HTTP_ERROR_STATUS)
+from .client import BodyPolicy, READ_CHUNK_SIZE
+from .errors import BODY_MISMATCH, classify_exception
+from .metrics import MetricsRecorder
+from .sampling import UrlTable
 
 
-def hit_url(url, request_timeout=REQUEST_TIMEOUT):
-    start = time.time()
+def read_body(response, policy):
+    """
+    Read a streamed `requests` response as `policy` (a `BodyPolicy`) says,
+    then hand its connection back (or close it when the body was left
+    unread). Bytes are counted as they arrive on the wire, before any
+    content decoding. Returns `(size, checksum)` like `ConnectionPool.send`.
+    """
+    declared = response.headers.get("content-length", "")
+    declared = int(declared) if declared.isdigit() else None
+    body = policy.body()
+    complete = False
     try:
-        response = requests.get(url, timeout=request_timeout)
-        latency = time.time() - start
+        if policy.mode != "headers":
+            while True:
+                count = body.wanted(READ_CHUNK_SIZE)
+                if not count:
+                    break
+                chunk = response.raw.read(count, decode_content=False)
+                if not chunk:
+                    complete = True
+                    break
+                body.feed(chunk)
+            complete = complete or body.size == declared
+        elif declared == 0:
+            complete = True
+    finally:
+        if complete:
+            response.raw.release_conn()
+        else:
+            response.close()
+
+    if declared is not None:
+        size = declared
+    elif policy.mode != "headers":
+        size = body.size
+    else:
+        size = None
+    return size, body.digest.hexdigest() if body.digest is not None else None
+
+
+def hit_url(url, request_timeout=REQUEST_TIMEOUT, http=requests, body_policy=None):
+    start = time.perf_counter()
+    body_policy = body_policy or BodyPolicy()
+    try:
+        response = http.get(url, timeout=request_timeout, stream=True)
+        # requests only exposes the time until the headers were parsed,
+        # which includes any connection setup on this thread's socket
+        ttfb = response.elapsed.total_seconds()
+        size, checksum = read_body(response, body_policy)
+        latency = time.perf_counter() - start
+        status_code = response.status_code
+        if status_code >= HTTP_ERROR_STATUS:
+            error, kind = f"HTTP {status_code}", status_code
+        else:
+            error, kind = body_policy.verify(url, size, checksum), BODY_MISMATCH
         return {
             "url": url,
-            "status_code": response.status_code,
+            "status_code": status_code,
             "latency": latency,
-            "success": True,
-            "error": None
+            "success": error is None,
+            "error": error,
+            "error_kind": kind if error is not None else None,
+            "timings": {"ttfb": ttfb, "download": max(0.0, latency - ttfb)},
+            "body_size": size
         }
-    except requests.RequestException as e:
-        latency = time.time() - start
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+        latency = time.perf_counter() - start
         return {
             "url": url,
             "status_code": "error",
             "latency": latency,
             "success": False,
-            "error": str(e)
+            "error": str(e),
+            "error_kind": classify_exception(e)
         }
 
 
-def run_phase(urls, concurrency, duration, request_timeout=REQUEST_TIMEOUT):
-    end_time = time.time() + duration
-    results = []
-
+def run_phase(urls, concurrency, duration, request_timeout=REQUEST_TIMEOUT, recorder=None,
+              executor=None, http=requests, stop=None, body_policy=None):
+    """
+    Batched closed-model phase. `executor` and `http` (e.g. a
+    `requests.Session`) can be shared across phases; when no executor is
+    passed one is created for the duration of this phase. Setting the
+    `stop` event ends the phase early: queued requests of the current batch
+    are cancelled and only those already on the wire are waited for.
+    Response bodies are read as `body_policy` (a `BodyPolicy`) says. URLs
+    are sampled by weight when `urls` is a `UrlTable`.
+    """
     max_threads = min(concurrency, MAX_THREAD_POOL_SIZE)
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            return run_phase(urls, concurrency, duration, request_timeout,
+                             recorder=recorder, executor=executor, http=http, stop=stop,
+                             body_policy=body_policy)
+
+    recorder = recorder or MetricsRecorder()
+    pick = UrlTable.of(urls).pick
+    end_time = time.time() + duration
     batches_needed = max(1, concurrency // max_threads)
+    stop = stop or threading.Event()
+    body_policy = body_policy or BodyPolicy()
 
-    while time.time() < end_time:
+    while time.time() < end_time and not stop.is_set():
         for _ in range(batches_needed):
-            if time.time() >= end_time:
+            if time.time() >= end_time or stop.is_set():
                 break
 
-            batch_urls = [random.choice(urls) for _ in range(max_threads)]
-            with ThreadPoolExecutor(max_workers=max_threads) as executor:
-                future_to_url = {executor.submit(
-                    hit_url, url, request_timeout): url for url in batch_urls}
-                for future in as_completed(future_to_url):
-                    result = future.result()
-                    results.append(result)
+            batch_urls = [pick() for _ in range(max_threads)]
+            recorder.started(len(batch_urls))
+            future_to_url = {executor.submit(
+                hit_url, url, request_timeout, http, body_policy): url for url in batch_urls}
+            for future in as_completed(future_to_url):
+                if stop.is_set():
+                    for pending in future_to_url:
+                        pending.cancel()
+                if not future.cancelled():
+                    recorder.record(future.result())
 
-                remaining_time = end_time - time.time()
-                if remaining_time > 0:
-                    time.sleep(
-                        min(random.uniform(BATCH_SLEEP_MIN, BATCH_SLEEP_MAX), remaining_time))
+            # Sleep between batches, waking up early on stop
+            remaining_time = end_time - time.time()
+            if remaining_time > 0:
+                stop.wait(
+                    min(random.uniform(BATCH_SLEEP_MIN, BATCH_SLEEP_MAX), remaining_time))
 
-    return results
+    return recorder
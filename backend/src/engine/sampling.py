@@ -0,0 +1,73 @@
+# engine/sampling.py
+
+import math
+from array import array
+from random import random
+
+
+class UrlTable:
+    """
+    The URLs a test picks from, each with a relative weight, compiled into
+    an alias table (Vose's method) so `pick()` costs one random draw and two
+    array lookups whatever the number of URLs or the skew of the weights.
+    Besides the URL strings the table holds 12 bytes per URL.
+
+    Iterating or indexing gives the URLs, so a table can stand in for the
+    plain URL list the engines used to take.
+    """
+
+    __slots__ = ("urls", "weights", "_prob", "_alias")
+
+    def __init__(self, urls, weights=None):
+        self.urls = list(urls)
+        count = len(self.urls)
+        self.weights = array("d", [1.0] * count if weights is None else weights)
+        if len(self.weights) != count:
+            raise ValueError("URL table needs one weight per URL")
+        if not all(math.isfinite(weight) and weight >= 0 for weight in self.weights):
+            raise ValueError("URL weights must be finite and not negative")
+        total = sum(self.weights)
+        if count and total <= 0:
+            raise ValueError("At least one URL needs a positive weight")
+
+        self._prob = array("d", [1.0]) * count
+        self._alias = array("I", range(count))
+        scaled = [weight * count / total for weight in self.weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1.0 up to rounding and keeps its own slot
+
+    @classmethod
+    def of(cls, urls):
+        """`urls` itself when it is already a table, else an equal-weight table of it."""
+        return urls if isinstance(urls, cls) else cls(urls)
+
+    def pick(self):
+        # The integer part of one draw picks a slot, the fraction its coin flip
+        position = random() * len(self.urls)
+        index = int(position)
+        if position - index < self._prob[index]:
+            return self.urls[index]
+        return self.urls[self._alias[index]]
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __iter__(self):
+        return iter(self.urls)
+
+    def __getitem__(self, index):
+        return self.urls[index]
+
+    def to_dict(self):
+        return {"urls": self.urls, "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["urls"], data.get("weights"))
@@ -0,0 +1,313 @@
+# engine/scenario.py
+
+import bisect
+import json
+import random
+import re
+from urllib.parse import quote
+
+from .client import split_url, head_lines
+
+VARIABLE = re.compile(r"\$\{(\w+)\}")
+METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+BODY_METHODS = ("POST", "PUT", "PATCH")
+_PATH_SAFE = "".join(chr(code) for code in range(0x21, 0x7f))  # Printable ASCII but space
+
+
+class UnsafeValue(ValueError):
+    """A variable whose value would break out of the request header line it is substituted in."""
+
+
+def _path_value(name, value):
+    # Spaces, CR/LF and other control or non-ASCII characters would end or
+    # split the request line
+    return quote(value, safe=_PATH_SAFE)
+
+
+def _header_value(name, value):
+    if "\r" in value or "\n" in value or "\0" in value:
+        raise UnsafeValue(f"Variable '{name}' holds a line break and cannot go in a header")
+    return value
+
+
+class Template:
+    """
+    A string with `${name}` references, split once into literals and names
+    so rendering is a single join over the context.
+    """
+
+    __slots__ = ("text", "literals", "names", "filters")
+
+    def __init__(self, text):
+        parts = VARIABLE.split(text)
+        self.text = text
+        self.literals = parts[0::2]
+        self.names = parts[1::2]
+        self.filters = None  # Optional `filter(name, value)` per variable
+
+    @property
+    def static(self):
+        return not self.names
+
+    def render(self, context):
+        """Raises `KeyError` with the variable name when it is undefined."""
+        if not self.names:
+            return self.text
+        parts = [self.literals[0]]
+        for index, (name, literal) in enumerate(zip(self.names, self.literals[1:])):
+            value = str(context[name])
+            if self.filters is not None:
+                value = self.filters[index](name, value)
+            parts.append(value)
+            parts.append(literal)
+        return "".join(parts)
+
+
+def _head_filters(template):
+    """Per-variable filters of a request head: the request line's are escaped, the headers' checked."""
+    filters = []
+    in_request_line = True
+    for literal in template.literals[:-1]:
+        in_request_line = in_request_line and "\r\n" not in literal
+        filters.append(_path_value if in_request_line else _header_value)
+    return filters
+
+
+def _number(spec, key, default=None):
+    value = spec.get(key, default)
+    if value is None:
+        raise ValueError(f"think time '{spec.get('distribution')}' requires '{key}'")
+    value = float(value)
+    if value < 0:
+        raise ValueError(f"think time '{key}' must not be negative")
+    return value
+
+
+def compile_think_time(spec):
+    """
+    A zero-argument function returning one think time in seconds, or None
+    for no pause. `spec` is a number (constant seconds) or a dict with a
+    `distribution` of `constant` (`value`), `uniform` (`min`, `max`),
+    `exponential` (`mean`) or `normal` (`mean`, `stddev`, clipped at 0).
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, (int, float)):
+        spec = {"distribution": "constant", "value": spec}
+    distribution = spec.get("distribution", "constant")
+    if distribution == "constant":
+        value = _number(spec, "value")
+        return (lambda: value) if value else None
+    if distribution == "uniform":
+        low, high = _number(spec, "min"), _number(spec, "max")
+        return lambda: random.uniform(low, high)
+    if distribution == "exponential":
+        mean = _number(spec, "mean")
+        return (lambda: random.expovariate(1 / mean)) if mean else None
+    if distribution == "normal":
+        mean, stddev = _number(spec, "mean"), _number(spec, "stddev")
+        return lambda: max(0.0, random.gauss(mean, stddev))
+    raise ValueError(
+        "think time distribution must be one of constant, uniform, exponential, normal")
+
+
+class Extractor:
+    """Pulls one variable out of a response: `json` path, `header` or `regex`."""
+
+    __slots__ = ("variable", "source", "path", "header", "pattern", "group")
+
+    def __init__(self, variable, spec):
+        self.variable = variable
+        self.source = spec.get("from")
+        self.path = self.header = self.pattern = None
+        self.group = spec.get("group", 1)
+        if self.source == "json":
+            self.path = [int(key) if key.isdigit() else key
+                         for key in str(spec["path"]).split(".")]
+        elif self.source == "header":
+            self.header = spec["name"].lower().encode("latin-1")
+        elif self.source == "regex":
+            self.pattern = re.compile(spec["pattern"].encode("utf-8"))
+        else:
+            raise ValueError(f"extract '{variable}' must come from json, header or regex")
+
+    @property
+    def needs_body(self):
+        return self.source != "header"
+
+    def extract(self, response, parsed):
+        """The value as a string, or None when the response does not hold it."""
+        if self.source == "header":
+            value = response["headers"].get(self.header)
+            return value.decode("latin-1") if value is not None else None
+        if self.source == "regex":
+            match = self.pattern.search(response["body"])
+            return match.group(self.group).decode("utf-8", "replace") if match else None
+
+        if "json" not in parsed:
+            try:
+                parsed["json"] = json.loads(response["body"])
+            except ValueError:
+                parsed["json"] = None
+        value = parsed["json"]
+        for key in self.path:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                return None
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, separators=(",", ":"))
+        return None if value is None else str(value)
+
+
+class CompiledStep:
+    """
+    One request of a scenario with everything but variable substitution
+    done up front: the pool key, the request head as a `Template` (or
+    ready-made bytes when nothing in it varies), the body template and the
+    response extractors.
+    """
+
+    def __init__(self, spec, default_think_time=None):
+        if not spec.get("url"):
+            raise ValueError("every scenario step needs a 'url'")
+        self.method = spec.get("method", "GET").upper()
+        if self.method not in METHODS:
+            raise ValueError(f"step method must be one of {', '.join(METHODS)}")
+        self.url = spec["url"]
+        self.name = spec.get("name") or f"{self.method} {self.url}"
+        self.weight = float(spec.get("weight", 1))
+        if self.weight < 0:
+            raise ValueError(f"step '{self.name}' weight must not be negative")
+
+        self.key, host_header, path = split_url(self.url)
+        if VARIABLE.search(host_header):
+            raise ValueError(f"step '{self.name}': the URL host cannot use variables")
+
+        headers = dict(spec.get("headers") or {})
+        body = spec.get("body")
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, separators=(",", ":"))
+            if not any(name.lower() == "content-type" for name in headers):
+                headers["Content-Type"] = "application/json"
+        self.body = Template(body) if body is not None else None
+        self.sends_length = body is not None or self.method in BODY_METHODS
+        # Extracted values come from responses and must not add request or header lines
+        self.head = Template(head_lines(self.method, host_header, path, headers))
+        self.head.filters = _head_filters(self.head)
+        self.raw = None
+        if self.head.static and (self.body is None or self.body.static):
+            self.raw = self._serialize(self.head.text, self.body.text if self.body else None)
+
+        self.extractors = [Extractor(variable, extract)
+                           for variable, extract in (spec.get("extract") or {}).items()]
+        self.needs_body = any(extractor.needs_body for extractor in self.extractors)
+        self.names = set(self.head.names) | set(self.body.names if self.body else ())
+        self.think_time = compile_think_time(spec.get("think_time", default_think_time))
+
+    def _serialize(self, head, body):
+        body = body.encode("utf-8") if body is not None else b""
+        if self.sends_length:
+            head += f"Content-Length: {len(body)}\r\n"
+        return (head + "\r\n").encode("latin-1") + body
+
+    def render(self, context):
+        """
+        Request bytes for this step; raises `KeyError` for an undefined
+        variable and `UnsafeValue` for a line break bound for a header.
+        """
+        if self.raw is not None:
+            return self.raw
+        return self._serialize(
+            self.head.render(context),
+            self.body.render(context) if self.body is not None else None)
+
+    def response_spec(self):
+        """The `response` dict for `ConnectionPool.send`, asking for the body if extractors need it."""
+        return {"body": True} if self.needs_body else {}
+
+    def extract(self, response, context):
+        """Store extracted variables in `context`; returns an error message or None."""
+        parsed = {}
+        missing = []
+        for extractor in self.extractors:
+            value = extractor.extract(response, parsed)
+            if value is None:
+                missing.append(extractor.variable)
+            else:
+                context[extractor.variable] = value
+        if missing:
+            return f"Could not extract {', '.join(missing)} from response"
+        return None
+
+
+class ScenarioPlan:
+    """
+    A compiled scenario definition (raises `ValueError` when it is invalid).
+    Each virtual user runs the `setup` steps once, in
+    order, then repeatedly picks a journey by weight and runs its steps in
+    order. Top-level `steps` form one single-step journey each, so their
+    weights give a task mix.
+    """
+
+    def __init__(self, spec):
+        self.name = spec.get("name", "scenario")
+        self.variables = dict(spec.get("variables") or {})
+        think_time = spec.get("think_time")
+        compile_think_time(think_time)  # Validate once even if every step overrides it
+
+        self.setup = [CompiledStep(step, think_time) for step in spec.get("setup") or []]
+        self.journeys = []
+        weights = []
+        for journey in spec.get("journeys") or []:
+            steps = [CompiledStep(step, think_time) for step in journey.get("steps") or []]
+            if not steps:
+                raise ValueError(f"journey '{journey.get('name')}' has no steps")
+            self.journeys.append(steps)
+            weights.append(float(journey.get("weight", 1)))
+        for step in spec.get("steps") or []:
+            step = CompiledStep(step, think_time)
+            self.journeys.append([step])
+            weights.append(step.weight)
+        if not self.journeys or sum(weights) <= 0:
+            raise ValueError("a scenario needs 'steps' or 'journeys' with a positive weight")
+
+        # Undefined names would fail every request that uses them, unsent
+        known = set(self.variables) | {"user", "iteration"}
+        known.update(extractor.variable for step in self.steps for extractor in step.extractors)
+        for step in self.steps:
+            undefined = step.names - known
+            if undefined:
+                raise ValueError(f"step '{step.name}' uses undefined variables: "
+                                 f"{', '.join(sorted(undefined))}")
+
+        self._cumulative = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self._cumulative.append(total)
+        self._total = total
+
+    @property
+    def steps(self):
+        return self.setup + [step for journey in self.journeys for step in journey]
+
+    @property
+    def urls(self):
+        """URL templates the scenario requests, in definition order."""
+        return list(dict.fromkeys(step.url for step in self.steps))
+
+    def context(self, user):
+        return {**self.variables, "user": user, "iteration": 0}
+
+    def pick(self):
+        index = bisect.bisect_right(self._cumulative, random.random() * self._total)
+        return self.journeys[min(index, len(self.journeys) - 1)]
+
+
+def check_step(step):
+    """Scenarios drive virtual users, so only closed-model and users-profile steps apply."""
+    if isinstance(step, dict) and ("rate" in step or
+                                   step.get("profile", {}).get("model") == "rate"):
+        raise ValueError("scenarios run on concurrency and users-profile phases, "
+                         "not arrival-rate phases")
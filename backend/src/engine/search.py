@@ -0,0 +1,176 @@
+# engine/search.py
+
+from config import (SEARCH_GROWTH, SEARCH_RESOLUTION, SEARCH_MAX_STEPS, SEARCH_DEFAULT_SLO,
+                    SEARCH_MIN_ACHIEVED_RATE)
+
+SEARCH_MODELS = ("concurrency", "rate")
+LATENCY_OBJECTIVES = ("p50", "p90", "p95", "p99", "p999")
+
+
+def evaluate_slo(slo, phase):
+    """
+    Check one phase summary against `slo`, e.g. `{"p95": 0.5, "error_rate": 1}`
+    (latency objectives in seconds, error rate in percent). Returns the list
+    of violated objectives; empty means the phase passed.
+    """
+    violations = []
+    requests = phase.get("requests", 0)
+    if not requests:
+        return ["no requests completed"]
+
+    percentiles = phase.get("percentiles") or {}
+    for name in LATENCY_OBJECTIVES:
+        if name in slo:
+            value = percentiles.get(name)
+            if value is None or value > slo[name]:
+                violations.append(f"{name} {value if value is None else round(value, 4)}s > {slo[name]}s")
+
+    error_rate = phase.get("error_count", 0) / requests * 100
+    if "error_rate" in slo and error_rate > slo["error_rate"]:
+        violations.append(f"error rate {error_rate:.2f}% > {slo['error_rate']}%")
+
+    schedule = phase.get("schedule")
+    if schedule and schedule.get("achieved_rate") is not None:
+        # An open-model step only counts if the rate was actually offered
+        if schedule["achieved_rate"] < phase["target_rate"] * SEARCH_MIN_ACHIEVED_RATE:
+            violations.append(
+                f"achieved {schedule['achieved_rate']} req/s of {phase['target_rate']}")
+    return violations
+
+
+class BreakingPointSearch:
+    """
+    Finds the highest load level that still meets an SLO.
+
+    Levels grow geometrically from `start` by `growth` until a step fails
+    (or `max` is reached), then the gap between the last passing and first
+    failing level is bisected until it is within `resolution` of the
+    passing level. Only levels below the first failure are probed after it,
+    so the target is never pushed harder than the step that broke it.
+
+    Drive it with `steps()`, which yields the next phase step, and call
+    `record()` with each finished phase summary before asking for the next.
+    """
+
+    def __init__(self, spec):
+        self.model = spec.get("model", "concurrency")
+        if self.model not in SEARCH_MODELS:
+            raise ValueError(f"breaking_point model must be one of {', '.join(SEARCH_MODELS)}")
+        self.start = float(spec.get("start", 10))
+        self.growth = float(spec.get("growth", SEARCH_GROWTH))
+        self.max_level = float(spec["max"]) if spec.get("max") else None
+        self.resolution = float(spec.get("resolution", SEARCH_RESOLUTION))
+        self.max_steps = int(spec.get("max_steps", SEARCH_MAX_STEPS))
+        self.slo = dict(spec.get("slo") or SEARCH_DEFAULT_SLO)
+        if self.start <= 0 or self.growth <= 1:
+            raise ValueError("breaking_point needs start > 0 and growth > 1")
+        unknown = set(self.slo) - set(LATENCY_OBJECTIVES) - {"error_rate"}
+        if unknown:
+            raise ValueError(f"unknown SLO objectives: {', '.join(sorted(unknown))}")
+
+        self.passing = None
+        self.failing = None
+        self.results = []
+        self.stopped = None
+        self._level = None
+
+    def _round(self, level):
+        if self.model == "concurrency":
+            return max(1, int(level))
+        return round(level, 2)
+
+    def step_for(self, level):
+        return level if self.model == "concurrency" else {"rate": level}
+
+    def _next_level(self):
+        level = self._candidate_level()
+        # Checked after the candidate so a search that converged on its last
+        # allowed step reports "converged", not "max_steps"
+        if level is not None and len(self.results) >= self.max_steps:
+            self.stopped = "max_steps"
+            return None
+        return level
+
+    def _candidate_level(self):
+        if not self.results:
+            return self._round(self.start)
+
+        if self.failing is None:
+            # Still ramping up
+            if self.max_level is not None and self.passing >= self.max_level:
+                self.stopped = "max_level"
+                return None
+            level = self._round(self.passing * self.growth)
+            if self.max_level is not None:
+                level = min(level, self._round(self.max_level))
+            return level
+
+        if self.passing is None:
+            self.stopped = "failed_at_start"
+            return None
+        gap = self.failing - self.passing
+        if gap <= max(self.passing * self.resolution, 1 if self.model == "concurrency" else 0):
+            self.stopped = "converged"
+            return None
+        level = self._round(self.passing + gap / 2)
+        if level in (self.passing, self.failing):
+            self.stopped = "converged"
+            return None
+        return level
+
+    def steps(self):
+        while True:
+            self._level = self._next_level()
+            if self._level is None:
+                return
+            yield self.step_for(self._level)
+
+    def record(self, phase):
+        """Evaluate the phase that ran at the last yielded level."""
+        level = self._level
+        stage = "ramp" if self.failing is None else "search"
+        violations = evaluate_slo(self.slo, phase)
+        passed = not violations
+        if passed:
+            self.passing = max(self.passing or level, level)
+        else:
+            self.failing = min(self.failing or level, level)
+
+        self.results.append({
+            "phase": phase.get("phase"),
+            "level": level,
+            "stage": stage,
+            "passed": passed,
+            "violations": violations,
+            "requests": phase.get("requests", 0),
+            "error_rate": round(phase.get("error_count", 0) / phase["requests"] * 100, 2)
+            if phase.get("requests") else None,
+            "percentiles": phase.get("percentiles", {}),
+            "achieved_rate": (phase.get("schedule") or {}).get("achieved_rate"),
+            "generator_bound": phase.get("generator_bound", False),
+        })
+        return passed
+
+    def report(self):
+        """Knee point and the per-step evidence for `test_completed`."""
+        knee = None
+        if self.passing is not None:
+            knee_step = max(
+                (r for r in self.results if r["passed"] and r["level"] == self.passing),
+                key=lambda r: r["phase"] or 0)
+            knee = {"level": self.passing, **{
+                key: knee_step[key]
+                for key in ("phase", "requests", "error_rate", "percentiles", "achieved_rate")
+            }}
+        failing_step = next(
+            (r for r in self.results if not r["passed"] and r["level"] == self.failing), None)
+        return {
+            "model": self.model,
+            "slo": self.slo,
+            "knee": knee,
+            "lowest_failing_level": self.failing,
+            "stopped": self.stopped,
+            # A knee found while the generator was saturated is a floor, not a limit
+            "generator_bound": bool(failing_step and failing_step["generator_bound"]),
+            "steps": self.results,
+        }
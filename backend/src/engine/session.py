@@ -0,0 +1,288 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from config import (DEFAULT_ENGINE, MAX_THREAD_POOL_SIZE, ARRIVAL_MAX_IN_FLIGHT,
+                    PREWARM_CONNECTIONS, PREWARM_TIMEOUT)
+from .async_runner import run_phase_async, run_arrival_phase, run_profile_phase, raise_fd_limit
+from .profiles import LoadProfile
+from .scenario import ScenarioPlan, VARIABLE, check_step
+from .client import ConnectionPool, BodyPolicy
+from .metrics import MetricsRecorder
+from .monitor import GeneratorMonitor
+from .workers import WorkerProcesses
+
+
+class TestCancelled(Exception):
+    """Raised by `run_step` when the session was cancelled before or during the phase."""
+
+
+class LoadSession:
+    """
+    Load-generation resources that live for a whole test.
+
+    The threaded engine gets one `ThreadPoolExecutor` and one keep-alive
+    `requests.Session`; the async engine (and arrival-rate phases) get one
+    event loop thread and one `ConnectionPool` with its DNS cache. Every
+    phase runs through `run_step` on the same resources, so connections stay
+    warm across step boundaries. Resources are created on first use (the
+    threaded engine's modules are only imported then) and released by
+    `close()`; `prewarm()` opens connections before the first phase.
+
+    With `processes > 1` phases are sharded across that many worker
+    processes instead, each holding its own session (see `WorkerProcesses`).
+
+    A `scenario` definition is compiled once into a `ScenarioPlan` whose
+    journeys the virtual users run in place of the URL list; scenario
+    phases always use the async client. `body_policy` (see `BodyPolicy`)
+    sets how much of each response body either engine reads.
+
+    `cancel()` may be called from any thread: the running phase stops
+    promptly (in-flight async requests are cancelled, the threaded engine
+    stops dispatching) and `run_step` raises `TestCancelled`.
+    """
+
+    def __init__(self, engine=DEFAULT_ENGINE, processes=1, scenario=None, body_policy=None):
+        self.engine = engine
+        self.processes = processes
+        self.scenario = scenario
+        self.plan = ScenarioPlan(scenario) if scenario else None
+        self.body_policy = body_policy
+        self._body_policy = BodyPolicy(body_policy)
+        self._cancel = threading.Event()
+        self._running = None
+        self._workers = None
+        self._executor = None
+        self._http = None
+        self._loop = None
+        self._loop_thread = None
+        self._pool = None
+        self.monitor = None  # GeneratorMonitor of the running (or last) in-process phase
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _thread_resources(self):
+        if self._executor is None:
+            # Imported here so async tests and worker processes never load requests
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._executor = ThreadPoolExecutor(
+                max_workers=MAX_THREAD_POOL_SIZE, thread_name_prefix="load-worker")
+            self._http = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=MAX_THREAD_POOL_SIZE)
+            self._http.mount("http://", adapter)
+            self._http.mount("https://", adapter)
+        return self._executor, self._http
+
+    def _ensure_loop(self):
+        if self._loop is None:
+            raise_fd_limit()
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(
+                target=self._loop.run_forever, name="load-session-loop", daemon=True)
+            self._loop_thread.start()
+            self._pool = ConnectionPool(body_policy=self._body_policy)
+        return self._loop
+
+    def _run_async(self, phase_func, **kwargs):
+        self._ensure_loop()
+        coro = phase_func(pool=self._pool, **kwargs)
+        self._running = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if self._cancel.is_set():
+            self._running.cancel()
+        try:
+            return self._running.result()
+        finally:
+            self._running = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Stop the running phase and refuse further ones. Does not block."""
+        self._cancel.set()
+        running = self._running
+        if running is not None:
+            running.cancel()
+        if self._workers is not None:
+            self._workers.cancel()
+
+    def run_step(self, urls, step, phase_length, request_timeout, recorder=None):
+        """
+        Run a single phase. `step` is either a concurrency level (closed model),
+        a dict such as `{"rate": 2000}` for a constant-arrival-rate phase, or
+        `{"profile": {...}}` for a `LoadProfile` phase, which sets its own
+        duration in place of `phase_length`.
+
+        Results are streamed into `recorder`. Returns `(recorder, phase_info)`
+        where `phase_info` holds the fields that describe the phase in its
+        summary, including the `generator` report of a `GeneratorMonitor`
+        that watched this process while the phase ran.
+        """
+        if self._cancel.is_set():
+            raise TestCancelled()
+        try:
+            result = self._run_monitored(
+                urls, step, phase_length, request_timeout, recorder or MetricsRecorder())
+        except Exception:
+            if self._cancel.is_set():
+                raise TestCancelled() from None
+            raise
+        if self._cancel.is_set():
+            # The threaded engine winds down without raising
+            raise TestCancelled()
+        return result
+
+    def _run_monitored(self, urls, step, phase_length, request_timeout, recorder):
+        if self.processes > 1:
+            if self._workers is None:
+                self._workers = WorkerProcesses(
+                    self.processes, self.engine, self.scenario, self.body_policy)
+            return self._workers.run_step(
+                urls, step, phase_length, request_timeout, recorder)
+
+        if isinstance(step, dict) or self.engine == "async" or self.plan is not None:
+            monitor = GeneratorMonitor(loop=self._ensure_loop())
+        else:
+            monitor = GeneratorMonitor()
+        self.monitor = monitor
+        with monitor:
+            recorder, phase_info = self._run_step(
+                urls, step, phase_length, request_timeout, recorder)
+        phase_info["generator"] = monitor.report(phase_info.get("schedule"))
+        return recorder, phase_info
+
+    def _run_step(self, urls, step, phase_length, request_timeout, recorder):
+        if self.plan is not None:
+            check_step(step)
+
+        if isinstance(step, dict) and "profile" in step:
+            profile = LoadProfile(step["profile"], shard=step.get("shard"))
+            recorder, info = self._run_async(
+                run_profile_phase,
+                urls=urls,
+                profile=profile,
+                request_timeout=request_timeout,
+                max_in_flight=step["profile"].get("max_in_flight", ARRIVAL_MAX_IN_FLIGHT),
+                recorder=recorder,
+                plan=self.plan
+            )
+            return recorder, {
+                "mode": "profile",
+                "shape": profile.shape,
+                "model": profile.model,
+                "concurrency": info["peak_users"],
+                **info,
+            }
+
+        if isinstance(step, dict) and "rate" in step:
+            recorder, schedule = self._run_async(
+                run_arrival_phase,
+                urls=urls,
+                rate=step["rate"],
+                duration=phase_length,
+                request_timeout=request_timeout,
+                max_in_flight=step.get("max_in_flight", ARRIVAL_MAX_IN_FLIGHT),
+                recorder=recorder
+            )
+            return recorder, {
+                "mode": "arrival_rate",
+                "concurrency": schedule["peak_in_flight"],
+                "target_rate": step["rate"],
+                "schedule": schedule,
+            }
+
+        if self.engine == "async" or self.plan is not None:
+            self._run_async(
+                run_phase_async,
+                urls=urls,
+                concurrency=step,
+                duration=phase_length,
+                request_timeout=request_timeout,
+                recorder=recorder,
+                plan=self.plan
+            )
+        else:
+            from .runner import run_phase
+
+            executor, http = self._thread_resources()
+            run_phase(
+                urls=urls,
+                concurrency=step,
+                duration=phase_length,
+                request_timeout=request_timeout,
+                recorder=recorder,
+                executor=executor,
+                http=http,
+                stop=self._cancel,
+                body_policy=self._body_policy
+            )
+        return recorder, {"mode": "closed", "concurrency": step}
+
+    def prewarm(self, urls, step=None, connections=PREWARM_CONNECTIONS, timeout=PREWARM_TIMEOUT):
+        """
+        Open up to `connections` keep-alive connections per target host in
+        the client the first phase (`step`) will use, so its first requests
+        skip DNS, TCP and TLS setup and it measures the target rather than
+        connection setup. Failed or slow (over `timeout` seconds) connects
+        are left for the phase to report. Returns the number opened.
+
+        Worker processes hold their own clients, so with `processes > 1`
+        this does nothing; hosts of scenario URLs that use variables are
+        skipped.
+        """
+        if self.processes > 1 or connections < 1 or self._cancel.is_set():
+            return 0
+        urls = [url for url in urls if not VARIABLE.search(urlsplit(url).netloc)]
+        if isinstance(step, dict) or self.engine == "async" or self.plan is not None:
+            self._ensure_loop()
+            return asyncio.run_coroutine_threadsafe(
+                self._pool.prewarm(urls, connections, timeout), self._loop).result()
+        return self._prewarm_threads(urls, min(connections, MAX_THREAD_POOL_SIZE), timeout)
+
+    def _prewarm_threads(self, urls, connections, timeout):
+        executor, http = self._thread_resources()
+        deadline = time.monotonic() + timeout
+
+        def warm(url):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Connect and read split what is left, so no request outlives
+            # pre-warming and overlaps the first phase
+            http.head(url, timeout=(remaining / 2, remaining / 2), allow_redirects=False)
+            return True
+
+        # One HEAD per connection to a URL of the test itself, all in flight
+        # at once so each takes its own pooled keep-alive connection
+        first_urls = {}
+        for url in urls:
+            parts = urlsplit(url)
+            first_urls.setdefault((parts.scheme, parts.netloc), url)
+        warming = [executor.submit(warm, url)
+                   for url in first_urls.values() for _ in range(connections)]
+        wait(warming)
+        return sum(future.exception() is None and future.result() for future in warming)
+
+    def close(self):
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._pool.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            self._loop = self._loop_thread = self._pool = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._http.close()
+            self._executor = self._http = None
@@ -0,0 +1,303 @@
+# engine/store.py
+
+import json
+import math
+import mmap
+import os
+import queue
+import sys
+import threading
+import time
+from array import array
+
+from config import RESULT_CHUNK_ROWS, RESULT_WRITE_QUEUE_CHUNKS
+from .errors import ERROR_KINDS, status_kind
+from .metrics import MetricsAggregate, MetricsRecorder, STATUS_ERROR
+
+# One file per column, each a flat array in the writer's native byte order,
+# urls.jsonl with the url table (one JSON string per line, url_id is the line
+# number) and meta.json with the row count and the error kind names.
+COLUMNS = (
+    ("timestamp", "d"),     # Completion time, seconds since the epoch
+    ("phase", "H"),
+    ("url_id", "I"),
+    ("latency", "d"),
+    ("service_time", "d"),  # NaN unless the phase corrects for coordinated omission
+    ("status", "h"),        # STATUS_ERROR for transport errors
+    ("error_id", "i"),      # Error kind (see engine.errors), -1 for successful requests
+)
+STORE_VERSION = 3  # 1 stored interned error messages in error_id, 2 kept the urls in meta.json
+NAN = float("nan")
+
+
+class ResultStoreWriter:
+    """
+    Appends every result of a test to a columnar store directory in chunks
+    of `chunk_rows`. Rows are buffered in typed arrays on the recording
+    thread (usually the event loop); each full chunk is handed to the
+    writer's own thread, which writes it with `array.tofile`, appends the
+    URLs first seen in it to urls.jsonl and rewrites the small meta.json, so
+    a store is readable while the test is still running or after a crash.
+    At most `RESULT_WRITE_QUEUE_CHUNKS` chunks wait to be written; past that
+    `append` waits for the disk.
+
+    With an `S3Uploader`, each written chunk is also handed to it and
+    streamed to `<column>.bin.gz` and `urls.jsonl.gz` objects; `close()`
+    uploads meta.json and finishes the upload in the background.
+    """
+
+    def __init__(self, path, chunk_rows=RESULT_CHUNK_ROWS, uploader=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.uploader = uploader
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.phase = 0
+        self.urls = []
+        self._url_index = {}
+        self._urls_handed_off = 0
+        self._buffers = {name: array(typecode) for name, typecode in COLUMNS}
+        self._files = {
+            name: open(os.path.join(path, f"{name}.bin"), "wb") for name, _ in COLUMNS
+        }
+        self._urls_file = open(os.path.join(path, "urls.jsonl"), "w", encoding="utf-8")
+        self._error = None
+        self.closed = False
+        self._queue = queue.Queue(maxsize=RESULT_WRITE_QUEUE_CHUNKS)
+        self._thread = threading.Thread(target=self._run, name="result-store", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start_phase(self):
+        self.phase += 1
+        return self.phase
+
+    def _intern(self, table, index, value):
+        value_id = index.get(value)
+        if value_id is None:
+            value_id = index[value] = len(table)
+            table.append(value)
+        return value_id
+
+    def append(self, result):
+        buffers = self._buffers
+        buffers["timestamp"].append(time.time())
+        buffers["phase"].append(self.phase)
+        buffers["url_id"].append(self._intern(self.urls, self._url_index, result["url"]))
+        buffers["latency"].append(result["latency"])
+        buffers["service_time"].append(result.get("service_time", NAN))
+        code = result.get("status_code", "error")
+        buffers["status"].append(code if isinstance(code, int) else STATUS_ERROR)
+        if result.get("success", False):
+            buffers["error_id"].append(-1)
+        else:
+            kind = result.get("error_kind")
+            buffers["error_id"].append(status_kind(code) if kind is None else kind)
+        if len(buffers["phase"]) >= self.chunk_rows:
+            self._hand_off()
+
+    def _hand_off(self):
+        if not len(self._buffers["phase"]):
+            return
+        new_urls = self.urls[self._urls_handed_off:]
+        self._urls_handed_off = len(self.urls)
+        self._queue.put((self._buffers, new_urls))
+        self._buffers = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self._error is None:
+                    self._write_chunk(*chunk)
+            except Exception as exc:
+                # Raised to the caller at the next flush() or close()
+                self._error = exc
+                print(f"[STORE] Writing {self.path} failed: {exc}")
+            finally:
+                self._queue.task_done()
+
+    def _write_chunk(self, buffers, new_urls):
+        if new_urls:
+            lines = "".join(json.dumps(url) + "\n" for url in new_urls)
+            self._urls_file.write(lines)
+            self._urls_file.flush()
+            if self.uploader is not None:
+                self.uploader.write("urls.jsonl", lines.encode("utf-8"))
+        for name, buffer in buffers.items():
+            buffer.tofile(self._files[name])
+            self._files[name].flush()
+            if self.uploader is not None:
+                self.uploader.write(f"{name}.bin", buffer.tobytes())
+        self.rows += len(buffers["phase"])
+        self._write_meta()
+
+    def flush(self):
+        """Write every buffered row, waiting until the writer thread has."""
+        self._hand_off()
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def _meta(self):
+        return {
+            "version": STORE_VERSION,
+            "byteorder": sys.byteorder,
+            "rows": self.rows,
+            "phases": self.phase,
+            "columns": dict(COLUMNS),
+            "error_kinds": ERROR_KINDS,
+        }
+
+    def _write_meta(self):
+        meta = self._meta()
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def close(self):
+        """
+        Flush, write the final meta.json and finish the upload. Safe to call
+        again: later calls do nothing, even when the first one raised.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.flush()
+            self._write_meta()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+            for f in self._files.values():
+                f.close()
+            self._urls_file.close()
+            if self.uploader is not None:
+                if self._error is None:
+                    self.uploader.put("meta.json", json.dumps(self._meta()).encode("utf-8"),
+                                      content_type="application/json")
+                self.uploader.finish()
+
+
+def _read_urls(path):
+    urls = []
+    with open(os.path.join(path, "urls.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # Still being written; no stored row refers to it yet
+            urls.append(json.loads(line))
+    return urls
+
+
+class ResultStore:
+    """
+    Read-only view of a store written by `ResultStoreWriter`. Columns are
+    memory-mapped and exposed as typed `memoryview`s, so opening a store
+    costs nothing and summaries are recomputed by sweeping the columns in
+    chunks without materializing per-request dicts.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"result store {path} was written with {meta['byteorder']} byte order")
+        self.path = path
+        self.rows = meta["rows"]
+        self.phases = meta["phases"]
+        self.version = meta.get("version", 1)
+        self.urls = meta["urls"] if "urls" in meta else _read_urls(path)
+        self._maps = []
+        self._views = []
+        self.columns = {}
+        for name, typecode in meta["columns"].items():
+            self.columns[name] = self._map_column(os.path.join(path, f"{name}.bin"), typecode)
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _map_column(self, file_path, typecode):
+        size = self.rows * array(typecode).itemsize
+        if not size:
+            return memoryview(array(typecode))
+        with open(file_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        # Rows past the last meta.json update are ignored
+        raw = memoryview(mapped)
+        window = raw[:size]
+        self._views.extend((window, raw))
+        return window.cast(typecode)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def chunks(self, rows=RESULT_CHUNK_ROWS):
+        """Yield dicts of column slices covering at most `rows` rows each."""
+        for start in range(0, self.rows, rows):
+            yield {name: view[start:start + rows] for name, view in self.columns.items()}
+
+    def recorder(self, phase=None):
+        """Rebuild a `MetricsRecorder` from the stored rows, optionally for one phase."""
+        recorder = MetricsRecorder(keep_raw=False)
+        overall = recorder.overall
+        per_url = [MetricsAggregate() for _ in self.urls]
+        legacy_errors = self.version < 2
+
+        for chunk in self.chunks():
+            for row_phase, url_id, latency, service_time, code, error_id in zip(
+                    chunk["phase"], chunk["url_id"], chunk["latency"],
+                    chunk["service_time"], chunk["status"], chunk["error_id"]):
+                if phase is not None and row_phase != phase:
+                    continue
+                status_code = "error" if code == STATUS_ERROR else code
+                success = error_id < 0
+                kind = None if success or legacy_errors else error_id
+                service_time = None if math.isnan(service_time) else service_time
+                overall.record_values(latency, status_code, success, kind, service_time)
+                per_url[url_id].record_values(latency, status_code, success, kind, service_time)
+
+        recorder.per_url = {
+            url: aggregate for url, aggregate in zip(self.urls, per_url) if aggregate.total
+        }
+        return recorder
+
+    def summary(self, phase=None):
+        """Overall and per-URL summaries in the same shape as a test summary."""
+        recorder = self.recorder(phase)
+        overall = recorder.overall
+        return {
+            "total_requests": overall.total,
+            "success_count": overall.success,
+            "error_count": overall.error_count,
+            "error_results": overall.error_list(),
+            "avg_time": overall.latency.mean,
+            "percentiles": overall.latency.percentiles(),
+            "uncorrected_percentiles":
+                overall.service_time.percentiles() if overall.service_time else None,
+            "status_codes": overall.status_codes,
+            "per_url_metrics": recorder.per_url_summary(),
+        }
+
+    def close(self):
+        for view in list(self.columns.values()) + self._views:
+            view.release()
+        self.columns = {}
+        self._views = []
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
@@ -1,33 +1,207 @@
-# engine/persistence.py
+# engine/upload.py
 
 import json
 import os
-import boto3
-from config import OUTPUT_BUCKET, OUTPUT_PREFIX
+import queue
+import random
+import threading
+import time
+import zlib
 
-s3 = boto3.client("s3")
+from config import (OUTPUT_BUCKET, OUTPUT_PREFIX, RESULT_STORE_DIR, S3_ENDPOINT_URL,
+                    S3_PART_SIZE, S3_UPLOAD_RETRIES, S3_RETRY_BASE_DELAY, S3_QUEUE_ITEMS)
+
+_s3 = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Create the boto3 client on first use, so importing this module stays cheap and offline-safe."""
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                import boto3
+
+                _s3 = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+    return _s3
+
+
+def with_retries(func, *args, **kwargs):
+    """Call an S3 operation, retrying with jittered exponential backoff."""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    for attempt in range(S3_UPLOAD_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except (BotoCoreError, ClientError) as exc:
+            if attempt == S3_UPLOAD_RETRIES:
+                raise
+            delay = S3_RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random())
+            print(f"[S3] {func.__name__} failed ({exc}), retrying in {delay:.2f}s")
+            time.sleep(delay)
 
 
 def save_results_locally(summary, detailed, timestamp):
-    os.makedirs("results", exist_ok=True)
-    with open(f"results/summary_{timestamp}.json", "w") as f:
+    """
+    Write the summary, and the detailed payload when given, under `results/`.
+    The detailed file is written compactly; per-request data belongs in the
+    columnar result store (see engine/store.py), not in this JSON.
+    """
+    os.makedirs(RESULT_STORE_DIR, exist_ok=True)
+    with open(os.path.join(RESULT_STORE_DIR, f"summary_{timestamp}.json"), "w") as f:
         json.dump(summary, f, indent=2)
-    with open(f"results/detailed_{timestamp}.json", "w") as f:
-        json.dump(detailed, f, indent=2)
+    if detailed is not None:
+        with open(os.path.join(RESULT_STORE_DIR, f"detailed_{timestamp}.json"), "w") as f:
+            json.dump(detailed, f, separators=(",", ":"))
     return True
 
 
 def save_results_to_s3(summary, detailed, timestamp):
-    s3.put_object(
-        Bucket=OUTPUT_BUCKET,
-        Key=f"{OUTPUT_PREFIX}summary_{timestamp}.json",
-        Body=json.dumps(summary, indent=2).encode("utf-8"),
-        ContentType="application/json"
-    )
-    s3.put_object(
-        Bucket=OUTPUT_BUCKET,
-        Key=f"{OUTPUT_PREFIX}detailed_{timestamp}.json",
-        Body=json.dumps(detailed, indent=2).encode("utf-8"),
-        ContentType="application/json"
-    )
+    s3 = get_s3_client()
+    for name, payload in (("summary", summary), ("detailed", detailed)):
+        with_retries(
+            s3.put_object,
+            Bucket=OUTPUT_BUCKET,
+            Key=f"{OUTPUT_PREFIX}{name}_{timestamp}.json",
+            Body=json.dumps(payload, separators=(",", ":")).encode("utf-8"),
+            ContentType="application/json"
+        )
     return True
+
+
+class _MultipartStream:
+    """One gzip-compressed object uploaded part by part as data arrives."""
+
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = None
+        self.parts = []
+        self.buffer = bytearray()
+        self.compressor = zlib.compressobj(wbits=31)  # gzip container
+
+    def write(self, s3, data):
+        self.buffer += self.compressor.compress(data)
+        if len(self.buffer) >= S3_PART_SIZE:
+            self._upload_part(s3)
+
+    def _upload_part(self, s3):
+        if self.upload_id is None:
+            self.upload_id = with_retries(
+                s3.create_multipart_upload, Bucket=self.bucket, Key=self.key,
+                ContentEncoding="gzip")["UploadId"]
+        part_number = len(self.parts) + 1
+        response = with_retries(
+            s3.upload_part, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=bytes(self.buffer))
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer.clear()
+
+    def finish(self, s3):
+        self.buffer += self.compressor.flush()
+        if self.upload_id is None:
+            # Never reached a full part: a single put is cheaper
+            with_retries(s3.put_object, Bucket=self.bucket, Key=self.key,
+                         Body=bytes(self.buffer), ContentEncoding="gzip")
+            return
+        self._upload_part(s3)
+        with_retries(
+            s3.complete_multipart_upload, Bucket=self.bucket, Key=self.key,
+            UploadId=self.upload_id, MultipartUpload={"Parts": self.parts})
+
+    def abort(self, s3):
+        if self.upload_id is not None:
+            try:
+                s3.abort_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            except Exception as exc:
+                print(f"[S3] Could not abort upload of {self.key}: {exc}")
+
+
+class S3Uploader:
+    """
+    Background upload pipeline for one test's results.
+
+    `write(name, data)` appends to a gzip-compressed object streamed to S3
+    with multipart upload, `put(name, data)` queues a small whole object.
+    Both only enqueue: compression and network calls happen on the
+    uploader's thread. The queue holds `max_items`; when S3 falls that far
+    behind, callers wait rather than drop a chunk (which would misalign the
+    column objects), and the time they waited is kept in `wait_seconds`.
+    `finish()` completes every stream; `wait()` blocks until done.
+    """
+
+    def __init__(self, prefix, bucket=OUTPUT_BUCKET, max_items=S3_QUEUE_ITEMS):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.failed = False
+        self.wait_seconds = 0.0
+        self._queue = queue.Queue(maxsize=max_items)
+        self._streams = {}
+        self._thread = threading.Thread(target=self._run, name="s3-uploader", daemon=True)
+        self._thread.start()
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        start = time.perf_counter()
+        # A failed uploader stops consuming, so never wait on it for good
+        while not self.failed:
+            try:
+                self._queue.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                pass
+        self.wait_seconds += time.perf_counter() - start
+
+    def write(self, name, data):
+        if not self.failed:
+            self._enqueue(("write", name, data))
+
+    def put(self, name, data, content_type="application/octet-stream"):
+        if not self.failed:
+            self._enqueue(("put", name, data, content_type))
+
+    def finish(self):
+        if not self.failed:
+            self._enqueue(("finish",))
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _key(self, name):
+        return f"{self.prefix}{name}"
+
+    def _run(self):
+        s3 = None
+        try:
+            s3 = get_s3_client()
+            while True:
+                item = self._queue.get()
+                if item[0] == "write":
+                    stream = self._streams.get(item[1])
+                    if stream is None:
+                        stream = self._streams[item[1]] = _MultipartStream(
+                            self.bucket, self._key(item[1] + ".gz"))
+                    stream.write(s3, item[2])
+                elif item[0] == "put":
+                    with_retries(s3.put_object, Bucket=self.bucket, Key=self._key(item[1]),
+                                 Body=item[2], ContentType=item[3])
+                else:
+                    for stream in self._streams.values():
+                        stream.finish(s3)
+                    print(f"[S3] Uploaded results to s3://{self.bucket}/{self.prefix}"
+                          + (f" (writers waited {self.wait_seconds:.2f}s on a full queue)"
+                             if self.wait_seconds else ""))
+                    return
+        except Exception as exc:
+            self.failed = True
+            print(f"[S3] Upload to s3://{self.bucket}/{self.prefix} failed: {exc}")
+            if s3 is not None:
+                for stream in self._streams.values():
+                    stream.abort(s3)
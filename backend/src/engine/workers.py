@@ -0,0 +1,218 @@
+# engine/workers.py
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import WORKER_PROCESSES, ARRIVAL_MAX_IN_FLIGHT, PROGRESS_INTERVAL
+from .live import LiveCounters
+from .metrics import MetricsRecorder, ProgressTracker
+from .monitor import merge_reports
+
+# Per-process state of a worker, set up once by _init_worker
+_worker = {}
+
+
+def resolve_process_count(processes):
+    """`"auto"`, 0 or None mean one worker per CPU (`WORKER_PROCESSES`)."""
+    if processes in (None, 0, "auto"):
+        return WORKER_PROCESSES
+    return max(1, int(processes))
+
+
+def shard_step(step, shards):
+    """Split one phase step into per-worker steps, dropping empty shards."""
+    if isinstance(step, dict) and "profile" in step:
+        max_in_flight = step["profile"].get("max_in_flight", ARRIVAL_MAX_IN_FLIGHT)
+        return [
+            {"profile": {**step["profile"], "max_in_flight": max(1, max_in_flight // shards)},
+             "shard": [index, shards]}
+            for index in range(shards)
+        ]
+    if isinstance(step, dict) and "rate" in step:
+        max_in_flight = step.get("max_in_flight", ARRIVAL_MAX_IN_FLIGHT)
+        return [
+            {**step, "rate": step["rate"] / shards,
+             "max_in_flight": max(1, max_in_flight // shards)}
+            for _ in range(shards)
+        ]
+    base, extra = divmod(step, shards)
+    return [base + 1 for _ in range(extra)] + [base for _ in range(shards - extra) if base]
+
+
+def _merge_send_delay(infos):
+    # Percentiles cannot be added; report the worst shard
+    delays = [info["schedule"].get("send_delay") for info in infos]
+    delays = [delay for delay in delays if delay]
+    if not delays:
+        return None
+    return {key: max(delay[key] for delay in delays) for key in delays[0]}
+
+
+def merge_phase_info(step, infos):
+    """Combine the per-worker `phase_info` dicts into the single-process shape."""
+    if isinstance(step, dict) and "profile" in step:
+        merged = _merge_profile_info(infos)
+    elif isinstance(step, dict) and "rate" in step:
+        schedule = {"target_rate": step["rate"]}
+        for key in ("scheduled", "late", "sent", "dropped"):
+            schedule[key] = sum(info["schedule"][key] for info in infos)
+        rates = [info["schedule"]["achieved_rate"] for info in infos
+                 if info["schedule"]["achieved_rate"] is not None]
+        schedule["achieved_rate"] = round(sum(rates), 2) if rates else None
+        schedule["peak_in_flight"] = sum(info["schedule"]["peak_in_flight"] for info in infos)
+        schedule["send_delay"] = _merge_send_delay(infos)
+        merged = {
+            "mode": "arrival_rate",
+            "concurrency": schedule["peak_in_flight"],
+            "target_rate": step["rate"],
+            "schedule": schedule,
+        }
+    else:
+        merged = {"mode": "closed", "concurrency": step}
+    generator = merge_reports(info.get("generator") for info in infos)
+    if generator is not None:
+        merged["generator"] = generator
+    return merged
+
+
+def _merge_profile_info(infos):
+    # Shards sample on the same interval from a common start, so the n-th
+    # samples line up; targets, users and rates add across shards.
+    timeline = []
+    for samples in zip(*(info["timeline"] for info in infos)):
+        timeline.append({
+            "t": samples[0]["t"],
+            "target": round(sum(sample["target"] for sample in samples), 2),
+            "users": sum(sample["users"] for sample in samples),
+            "rps": round(sum(sample["rps"] for sample in samples), 2),
+        })
+    merged = {
+        "mode": "profile",
+        "shape": infos[0]["shape"],
+        "model": infos[0]["model"],
+        "concurrency": sum(info["concurrency"] for info in infos),
+        "peak_users": sum(info["peak_users"] for info in infos),
+        "timeline": timeline,
+    }
+    if "schedule" in infos[0]:
+        merged["schedule"] = {
+            key: sum(info["schedule"][key] for info in infos)
+            for key in ("scheduled", "late", "dropped", "sent")
+        }
+        merged["schedule"]["send_delay"] = _merge_send_delay(infos)
+    return merged
+
+
+def _init_worker(engine, progress_queue, scenario, body_policy, cancel_event):
+    from .session import LoadSession
+
+    _worker["session"] = LoadSession(engine=engine, scenario=scenario, body_policy=body_policy)
+    _worker["progress"] = ProgressTracker()
+    _worker["live"] = LiveCounters()
+    _worker["queue"] = progress_queue
+    threading.Thread(target=_forward_progress, daemon=True).start()
+    threading.Thread(target=_watch_cancel, args=(cancel_event,), daemon=True).start()
+
+
+def _watch_cancel(cancel_event):
+    cancel_event.wait()
+    _worker["session"].cancel()
+
+
+def _flush_progress():
+    delta = _worker["progress"].drain()
+    delta["live"] = _worker["live"].drain()
+    if delta["started"] or delta["requests"] or delta["live"]:
+        _worker["queue"].put(delta)
+
+
+def _forward_progress():
+    while True:
+        time.sleep(PROGRESS_INTERVAL / 2)
+        _flush_progress()
+
+
+def _run_shard(urls, step, phase_length, request_timeout):
+    recorder = MetricsRecorder(keep_raw=False, progress=_worker["progress"],
+                               live=_worker["live"])
+    recorder, phase_info = _worker["session"].run_step(
+        urls=urls,
+        step=step,
+        phase_length=phase_length,
+        request_timeout=request_timeout,
+        recorder=recorder
+    )
+    _flush_progress()
+    return recorder.to_dict(), phase_info
+
+
+class WorkerProcesses:
+    """
+    Load-generator processes that each run their own `LoadSession`, so
+    response handling and metrics work are spread across cores instead of
+    sharing one GIL. A step's concurrency (or arrival rate) is split evenly
+    across the workers; each returns a compact `MetricsRecorder.to_dict()`
+    summary that is merged here, never per-request dicts. Live progress
+    deltas are relayed from the workers into the caller's `ProgressTracker`
+    and `LiveCounters`.
+    A `scenario` definition and `body_policy` are compiled in each worker.
+    """
+
+    def __init__(self, processes, engine, scenario=None, body_policy=None):
+        context = multiprocessing.get_context("spawn")
+        self.processes = processes
+        self._progress = None
+        self._live = None
+        self._queue = context.Queue()
+        self._cancel = context.Event()
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(engine, self._queue, scenario, body_policy, self._cancel),
+        )
+        self._relay = threading.Thread(target=self._relay_progress, daemon=True)
+        self._relay.start()
+
+    def _relay_progress(self):
+        while True:
+            try:
+                delta = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if delta is None:
+                return
+            progress = self._progress
+            if progress is not None:
+                progress.absorb(delta)
+            live = self._live
+            if live is not None and delta["live"]:
+                live.absorb(delta["live"])
+
+    def run_step(self, urls, step, phase_length, request_timeout, recorder):
+        self._progress = recorder.progress
+        self._live = recorder.live
+        shards = shard_step(step, self.processes)
+        futures = [
+            self._executor.submit(_run_shard, urls, shard, phase_length, request_timeout)
+            for shard in shards
+        ]
+        infos = []
+        for future in futures:
+            data, phase_info = future.result()
+            recorder.merge(MetricsRecorder.from_dict(data))
+            infos.append(phase_info)
+        return recorder, merge_phase_info(step, infos)
+
+    def cancel(self):
+        """Cancel the running shards in every worker; they raise `TestCancelled`."""
+        self._cancel.set()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._queue.put(None)
+        self._relay.join()
+        self._queue.close()
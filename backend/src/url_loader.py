@@ -1,5 +1,14 @@
+import gzip
 import json
 import os
+import re
+
+from config import URL_SOURCE_MAX_URLS, URL_SOURCE_READ_SIZE
+from engine.sampling import UrlTable
+
+_JSON_SEPARATOR = re.compile(r"[\s,]*")
+_JSON_DELIMITER = re.compile(r"[\s,\]}]")
+_DATA_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), "../data"))
 
 def load_urls_from_json(file_path="data/input.json"):
     """Load URLs from JSON file and return as a list."""
@@ -43,6 +52,33 @@ def load_urls_from_json(file_path="data/input.json"):
         print(f"Error parsing JSON: {e}")
         return get_default_urls()
 
+def _data_path(name):
+    """
+    Path of the file `name` in `data/`. Names come from clients, so anything
+    with a path separator, or resolving outside `data/`, is refused.
+    """
+    if not name or "/" in name or "\\" in name or name in (".", ".."):
+        raise ValueError(f"'{name}' must be the name of a file in data/")
+    path = os.path.realpath(os.path.join(_DATA_DIR, name))
+    if os.path.dirname(path) != _DATA_DIR:
+        raise ValueError(f"'{name}' must be the name of a file in data/")
+    if not os.path.isfile(path):
+        raise ValueError(f"data/ has no file '{name}'")
+    return path
+
+def load_scenario(source):
+    """
+    Load a scenario definition: a dict, or the name of a JSON file in
+    `data/` holding one.
+    """
+    if isinstance(source, str):
+        with open(_data_path(source), 'r') as f:
+            source = json.load(f)
+
+    if not isinstance(source, dict) or not (source.get("steps") or source.get("journeys")):
+        raise ValueError("A scenario must be an object with 'steps' or 'journeys'")
+    return source
+
 def get_default_urls():
     """Fallback URLs if JSON file is not available."""
     return [
@@ -54,12 +90,194 @@ def get_default_urls():
         "https://gpglook.gauteng.gov.za:443/Pages/search-box.aspx",
     ]
 
-def validate_urls(urls):
-    """Basic URL validation."""
-    valid_urls = []
-    for url in urls:
-        if url.startswith(('http://', 'https://')):
-            valid_urls.append(url)
+def url_source_format(path):
+    """`sitemap`, `har`, `lines` or `json`, from the file extension (ignoring `.gz`)."""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".xml"):
+        return "sitemap"
+    if name.endswith(".har"):
+        return "har"
+    if name.endswith((".txt", ".ndjson", ".jsonl")):
+        return "lines"
+    return "json"
+
+def _open_source(path, mode="rt"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding=None if "b" in mode else "utf-8")
+    return open(path, mode, encoding=None if "b" in mode else "utf-8")
+
+def iter_json_array(f, key=None, read_size=URL_SOURCE_READ_SIZE):
+    """
+    Yield the items of a JSON array one at a time while reading `f` in
+    `read_size` pieces: the document's first array under `key`, or the
+    top-level array when `key` is None. Only one item is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key) if key else r"\s*\[")
+    buffer = ""
+    while True:
+        match = start.search(buffer) if key else start.match(buffer)
+        if match:
+            break
+        if key is None and buffer.strip():
+            raise ValueError("JSON file must contain a list")
+        chunk = f.read(read_size)
+        if not chunk:
+            return
+        # Keep a tail in case the marker straddles two reads
+        buffer = buffer[-len(key) - 16:] + chunk if key else chunk
+    buffer, position = buffer[match.end():], 0
+    while True:
+        position = _JSON_SEPARATOR.match(buffer, position).end()
+        if position == len(buffer):
+            chunk = f.read(read_size)
+            if not chunk:
+                raise ValueError("JSON array is not terminated")
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Incomplete item: read more, doubling so a huge one stays linear
+            chunk = f.read(max(read_size, len(buffer) - position))
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if (not isinstance(item, (dict, list, str)) and len(buffer) - end <= 2
+                and not _JSON_DELIMITER.match(buffer, end)):
+            # A number near the end of the buffer may continue in the next
+            # read: "1." or "1e-" decode as 1 with the rest left over
+            chunk = f.read(read_size)
+            if chunk:
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+        yield item
+        position = end
+        if position > read_size:
+            buffer, position = buffer[position:], 0
+
+def iter_sitemap_urls(path, _visited=None):
+    """
+    Yield `(url, 1.0)` for every `<url><loc>` of a sitemap (`.xml` or
+    `.xml.gz`), parsed incrementally. A sitemap index is followed into the
+    sitemaps it lists when they sit next to it on disk (matched by file
+    name); others are skipped with a warning, and so is any sitemap already
+    read, so an index that lists itself or a loop of indexes ends.
+    """
+    import xml.etree.ElementTree as ET
+
+    visited = set() if _visited is None else _visited
+    visited.add(os.path.realpath(path))
+    with _open_source(path, "rb") as f:
+        root = None
+        for event, element in ET.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = element
+            if event != "end":
+                continue
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag not in ("url", "sitemap"):
+                continue
+            loc = next((child.text.strip() for child in element
+                        if child.tag.rsplit("}", 1)[-1] == "loc" and child.text), None)
+            root.clear()  # Drop parsed entries so memory stays flat
+            if loc is None:
+                continue
+            if tag == "url":
+                yield loc, 1.0
+                continue
+            nested = os.path.join(os.path.dirname(path), loc.rstrip("/").rsplit("/", 1)[-1])
+            if os.path.realpath(nested) in visited:
+                print(f"[URLS] Skipping sitemap {loc}: already read")
+            elif os.path.exists(nested):
+                yield from iter_sitemap_urls(nested, visited)
+            else:
+                print(f"[URLS] Skipping sitemap {loc}: not found next to {path}")
+
+def iter_har_urls(path):
+    """
+    Yield `(url, 1.0)` for every GET request in a HAR capture, streaming its
+    `entries` one at a time; repeated URLs add up to their observed count.
+    Other methods are skipped, since URL lists are requested with GET.
+    """
+    with _open_source(path) as f:
+        for entry in iter_json_array(f, "entries"):
+            request = entry.get("request") if isinstance(entry, dict) else None
+            if request and request.get("method", "GET").upper() == "GET" and request.get("url"):
+                yield request["url"], 1.0
+
+def iter_line_urls(path):
+    """
+    Yield `(url, weight)` per line of a newline-delimited file: a URL
+    optionally followed by whitespace and a weight, or a JSON object with
+    `url` and an optional `weight` (or `count`). Blank and `#` lines are
+    ignored.
+    """
+    with _open_source(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                yield item.get("url", ""), float(item.get("weight", item.get("count", 1.0)))
+            else:
+                url, *weight = line.split(None, 1)
+                yield url, float(weight[0]) if weight else 1.0
+
+def iter_json_urls(path):
+    """Yield `(url, weight)` from a JSON list of URLs or `{"url", "weight"}` objects, streamed."""
+    with _open_source(path) as f:
+        yield from _iter_list_urls(iter_json_array(f))
+
+def _iter_list_urls(items):
+    for item in items:
+        if isinstance(item, dict) and "url" in item:
+            yield item["url"], float(item.get("weight", 1.0))
+        elif isinstance(item, str):
+            yield item, 1.0
+
+_SOURCE_READERS = {
+    "sitemap": iter_sitemap_urls,
+    "har": iter_har_urls,
+    "lines": iter_line_urls,
+    "json": iter_json_urls,
+}
+
+def load_url_table(source, max_urls=URL_SOURCE_MAX_URLS):
+    """
+    Build the weighted `UrlTable` a test samples from. `source` is a list of
+    URLs or `{"url", "weight"}` objects, or the path of a sitemap, HAR
+    capture, newline-delimited or JSON list file in `data/` (see
+    `url_source_format`), named without any directory and read as a
+    stream. Repeated URLs are merged and their weights summed, so a HAR's
+    weights are its observed request counts. Invalid URLs and entries
+    without a positive weight are skipped.
+    """
+    if isinstance(source, str):
+        path = _data_path(source)
+        entries = _SOURCE_READERS[url_source_format(path)](path)
+    else:
+        entries = _iter_list_urls(source)
+
+    weights = {}
+    skipped = 0
+    for url, weight in entries:
+        url = str(url).strip().split("#", 1)[0]  # Fragments are never sent
+        if not url.startswith(("http://", "https://")) or not weight > 0:
+            skipped += 1
+            continue
+        if url in weights:
+            weights[url] += weight
+        elif len(weights) < max_urls:
+            weights[url] = weight
         else:
-            print(f"Skipping invalid URL: {url}")
-    return valid_urls
\ No newline at end of file
+            raise ValueError(f"URL source has more than {max_urls} distinct URLs")
+    if skipped:
+        print(f"[URLS] Skipped {skipped} invalid URL entries")
+    return UrlTable(weights, weights.values())
@@ -0,0 +1,168 @@
+import asyncio
+import math
+import re
+import threading
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def socket(monkeypatch):
+    """Records what the handlers emit and which rooms clients join, instead of using Socket.IO."""
+    events = {"emits": [], "rooms": []}
+
+    async def emit(event, data=None, to=None):
+        events["emits"].append((event, data, to))
+
+    async def enter_room(sid, room):
+        events["rooms"].append((sid, room))
+
+    monkeypatch.setattr(app.sio, "emit", emit)
+    monkeypatch.setattr(app.sio, "enter_room", enter_room)
+    monkeypatch.setattr(app, "tests", app.TestManager())
+    return events
+
+
+def _running(test_id):
+    run = app.TestRun(sid="owner", test_id=test_id, user_id="u1", users=1, processes=1, options={})
+    app.tests.tests[test_id] = run
+    return run
+
+
+def test_a_duplicate_test_id_does_not_join_the_running_tests_room(socket):
+    run = _running("taken")
+    asyncio.run(app.start_test("intruder", {
+        "test_id": "taken", "user_id": "u2", "urls": ["http://example.com/"], "concurrency": [1]}))
+    assert socket["rooms"] == []
+    assert socket["emits"] == [
+        ("error", {"error": "Test taken is already running or queued"}, "intruder")]
+    assert app.tests.get("taken") is run
+
+
+def test_join_test_needs_the_stop_token(socket):
+    run = _running("mine")
+    asyncio.run(app.join_test("reconnected", {"test_id": "mine", "stop_token": "guess"}))
+    assert socket["rooms"] == []
+    assert socket["emits"][-1] == ("error", {"error": "No running or queued test mine"},
+                                   "reconnected")
+    asyncio.run(app.join_test("reconnected", {"test_id": "mine", "stop_token": run.stop_token}))
+    assert socket["rooms"] == [("reconnected", "test:mine")]
+    assert socket["emits"][-1] == (
+        "test_joined", {"test_id": "mine", "status": "queued", "phase": 0}, "reconnected")
+
+
+@pytest.mark.parametrize("rates", [[10, 0], [-5], ["10"], [float("inf")], [float("nan")], [True], 5])
+def test_arrival_rates_must_be_positive_numbers(socket, rates):
+    asyncio.run(app.start_test("client", {
+        "test_id": "open", "user_id": "u1", "urls": ["http://example.com/"], "arrival_rates": rates}))
+    assert socket["emits"] == [
+        ("error", {"error": "arrival_rates must be a list of positive numbers"}, "client")]
+    assert app.tests.get("open") is None
+
+
+SAMPLE = re.compile(r'([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(,|$)')
+SUFFIXES = {"counter": ("_total",), "gauge": ("",), "histogram": ("_bucket", "_count", "_sum")}
+
+
+def _unescape(match):
+    return "\n" if match.group(1) == "n" else match.group(1)
+
+
+def _parse_openmetrics(text):
+    """
+    Check `text` against the OpenMetrics rules /metrics relies on and return
+    {family: (type, [(sample name, labels, value)])}.
+    """
+    assert text.endswith("# EOF\n") and text.count("# EOF") == 1
+    families = {}
+    current = None
+    for line in text[:-len("# EOF\n")].splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert name not in families, f"family {name} is split or repeated"
+            assert metric_type in SUFFIXES
+            current = name
+            families[name] = (metric_type, [])
+        elif line.startswith("# HELP "):
+            assert line.split(" ")[2] == current and not families[current][1], \
+                "HELP must follow its family's TYPE, before any sample"
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"bad sample line {line!r}"
+            name, label_text, value = match.groups()
+            metric_type, samples = families[current]
+            assert name in [current + suffix for suffix in SUFFIXES[metric_type]], \
+                f"{name} does not belong to {metric_type} {current}"
+            labels = {}
+            if label_text:
+                matched = "".join(m.group(0) for m in LABEL.finditer(label_text))
+                assert matched == label_text, f"bad labels {label_text!r}"
+                for m in LABEL.finditer(label_text):
+                    assert m.group(1) not in labels
+                    labels[m.group(1)] = re.sub(r"\\(.)", _unescape, m.group(2))
+            samples.append((name, labels, float(value)))
+    return families
+
+
+def _check_histogram(name, samples):
+    series = {}
+    for sample, labels, value in samples:
+        key = tuple(sorted((k, v) for k, v in labels.items() if k != "le"))
+        series.setdefault(key, {"buckets": []})
+        if sample == name + "_bucket":
+            series[key]["buckets"].append((float(labels["le"]), value))
+        else:
+            series[key][sample[len(name):]] = value
+    for key, parts in series.items():
+        bounds = [bound for bound, _ in parts["buckets"]]
+        counts = [count for _, count in parts["buckets"]]
+        assert bounds == sorted(bounds) and math.isinf(bounds[-1]), key
+        assert counts == sorted(counts), f"buckets of {key} are not cumulative"
+        assert parts["_count"] == counts[-1]
+    return series
+
+
+def test_metrics_page_is_valid_openmetrics(monkeypatch):
+    monkeypatch.setattr(app, "tests", app.TestManager())
+    run = _running('quote"d')
+    run.task = object()  # Shown as running
+    url = 'http://example.com/a\\b"c'
+
+    def record(offset):
+        for index in range(200):
+            if index % 10 == 9:
+                run.live.record({"url": url, "latency": 1.0, "status_code": 503, "success": False})
+            else:
+                latency = 12.0 if index == 0 else (index + offset) / 1000
+                run.live.record({"url": url, "latency": latency, "status_code": 200,
+                                 "success": True})
+
+    # Two recording threads, so the page adds up two shards
+    threads = [threading.Thread(target=record, args=(offset,)) for offset in (0, 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    response = app.flask_app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("application/openmetrics-text")
+    families = _parse_openmetrics(response.get_data(as_text=True))
+
+    requests = {labels["code"]: value for _, labels, value in families["loadtest_requests"][1]}
+    assert requests == {"200": 360, "503": 40}
+    assert all(labels["test_id"] == 'quote"d' and labels["url"] == url
+               for _, labels, _ in families["loadtest_requests"][1])
+    assert [value for _, _, value in families["loadtest_errors"][1]] == [40]
+
+    metric_type, samples = families["loadtest_request_duration_seconds"]
+    assert metric_type == "histogram"
+    (parts,) = _check_histogram("loadtest_request_duration_seconds", samples).values()
+    assert parts["_count"] == 360
+    assert dict(parts["buckets"])[10.0] == 358  # The two 12s requests are only in +Inf
+    assert parts["_sum"] == pytest.approx(24.0 + sum((index + offset) / 1000
+                                                     for offset in (0, 1)
+                                                     for index in range(1, 200) if index % 10 != 9))
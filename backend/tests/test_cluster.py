@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import engine.cluster as cluster
+from engine.cluster import ClusterCoordinator, _send_message
+
+
+async def _register(coordinator, worker_id, token):
+    reader, writer = await asyncio.open_connection("127.0.0.1", coordinator.port)
+    await _send_message(writer, {"type": "register", "worker_id": worker_id, "token": token})
+    await asyncio.sleep(0.1)
+    return reader, writer
+
+
+def test_coordinator_requires_a_token():
+    with pytest.raises(RuntimeError, match="CLUSTER_TOKEN"):
+        asyncio.run(ClusterCoordinator(token="").start("127.0.0.1", 0))
+
+
+def test_workers_with_a_wrong_token_are_rejected():
+    async def run():
+        coordinator = ClusterCoordinator(token="secret")
+        await coordinator.start("127.0.0.1", 0)
+        _, rejected = await _register(coordinator, "intruder", "guess")
+        _, accepted = await _register(coordinator, "node", "secret")
+        workers = sorted(coordinator.workers)
+        rejected.close()
+        accepted.close()
+        await coordinator.stop()
+        return workers
+
+    assert asyncio.run(run()) == ["node"]
+
+
+def test_a_silent_worker_fails_the_step_at_its_deadline(monkeypatch):
+    monkeypatch.setattr(cluster, "CLUSTER_STEP_MARGIN", 0)
+    monkeypatch.setattr(cluster, "CLUSTER_START_DELAY", 0)
+
+    async def run():
+        coordinator = ClusterCoordinator(token="secret")
+        await coordinator.start("127.0.0.1", 0)
+        _, writer = await _register(coordinator, "hung", "secret")  # Never replies
+        try:
+            with pytest.raises(RuntimeError, match="hung did not finish"):
+                await asyncio.wait_for(coordinator.run_step(
+                    "session", "async", 1, ["http://127.0.0.1:9/"], 1,
+                    phase_length=0.2, request_timeout=0.2), 10)
+        finally:
+            writer.close()
+            await coordinator.stop()
+
+    asyncio.run(run())
+
+
+def test_an_oversized_message_drops_the_worker_and_fails_its_step(monkeypatch):
+    monkeypatch.setattr(cluster, "CLUSTER_MESSAGE_LIMIT", 1024)
+    monkeypatch.setattr(cluster, "CLUSTER_START_DELAY", 0)
+
+    unhandled = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: unhandled.append(context))
+        coordinator = ClusterCoordinator(token="secret")
+        await coordinator.start("127.0.0.1", 0)
+        reader, writer = await _register(coordinator, "chatty", "secret")
+        step = asyncio.create_task(coordinator.run_step(
+            "session", "async", 1, ["http://127.0.0.1:9/"], 1,
+            phase_length=60, request_timeout=60))
+        await reader.readline()  # The run_step request
+        writer.write(b'{"type": "progress", "pad": "' + b"x" * 4096 + b'"}\n')
+        await writer.drain()
+        try:
+            with pytest.raises(RuntimeError, match="chatty disconnected"):
+                await asyncio.wait_for(step, 5)
+            assert coordinator.workers == {}
+            await asyncio.sleep(0.1)
+        finally:
+            writer.close()
+            await coordinator.stop()
+
+    asyncio.run(run())
+    assert unhandled == []
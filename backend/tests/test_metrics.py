@@ -0,0 +1,102 @@
+import json
+import random
+
+import pytest
+
+from engine.metrics import (HISTOGRAM_UNIT, SUB_BUCKET_BITS, SUB_BUCKET_COUNT, LatencyHistogram,
+                            MetricsRecorder)
+
+MAX_RELATIVE_ERROR = 2 ** -SUB_BUCKET_BITS
+
+
+@pytest.mark.parametrize("low,high", [
+    (SUB_BUCKET_COUNT * HISTOGRAM_UNIT, 1e-3),
+    (1e-3, 1e-1),
+    (1e-1, 10.0),
+    (10.0, 3600.0),
+])
+def test_every_rank_is_within_the_relative_error_bound(low, high):
+    draw = random.Random(3)
+    values = sorted(low * (high / low) ** draw.random() for _ in range(5_000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    for rank, value in enumerate(values):
+        assert abs(histogram.value_at(rank) - value) <= value * MAX_RELATIVE_ERROR
+    percentiles = histogram.percentiles()
+    for name, q in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999)):
+        true_value = values[int(len(values) * q)]
+        assert abs(percentiles[name] - true_value) <= true_value * MAX_RELATIVE_ERROR
+    assert percentiles["max"] == values[-1]
+
+
+def test_values_below_the_sub_buckets_are_within_one_unit():
+    draw = random.Random(4)
+    values = sorted(draw.uniform(0, SUB_BUCKET_COUNT * HISTOGRAM_UNIT) for _ in range(1_000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    for rank, value in enumerate(values):
+        assert abs(histogram.value_at(rank) - value) < HISTOGRAM_UNIT
+
+
+def test_memory_is_bounded_by_buckets_not_samples():
+    draw = random.Random(5)
+    histogram = LatencyHistogram()
+    for _ in range(50_000):
+        histogram.record(draw.uniform(0.001, 2.0))
+    # 0.001s..2s spans 11 powers of two of SUB_BUCKET_COUNT buckets each
+    assert histogram.count == 50_000
+    assert len(histogram.counts) <= 12 * SUB_BUCKET_COUNT
+
+
+def _results(seed, count):
+    draw = random.Random(seed)
+    for _ in range(count):
+        url = f"http://example.com/{draw.randrange(4)}"
+        if draw.random() < 0.05:
+            yield {"url": url, "latency": draw.uniform(0.5, 5.0), "status_code": 503,
+                   "success": False}
+        else:
+            yield {"url": url, "latency": draw.lognormvariate(-3, 1), "status_code": 200,
+                   "success": True}
+
+
+def test_merged_histogram_shards_equal_one_histogram():
+    values = [random.Random(6).lognormvariate(-3, 1.5) for _ in range(10_000)]
+    whole = LatencyHistogram()
+    shards = [LatencyHistogram() for _ in range(4)]
+    for index, value in enumerate(values):
+        whole.record(value)
+        shards[index % 4].record(value)
+    merged = LatencyHistogram()
+    for shard in shards:
+        merged.merge(shard)
+    assert merged.counts == whole.counts
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert merged.percentiles() == whole.percentiles()
+
+
+def test_recorders_merged_across_workers_give_exact_whole_test_summaries():
+    results = list(_results(8, 8_000))
+    whole = MetricsRecorder(keep_raw=False)
+    for result in results:
+        whole.record(result)
+    merged = MetricsRecorder(keep_raw=False)
+    for worker in range(3):
+        shard = MetricsRecorder(keep_raw=False)
+        for result in results[worker::3]:
+            shard.record(result)
+        # Shards arrive from other processes or nodes as JSON
+        merged.merge(MetricsRecorder.from_dict(json.loads(json.dumps(shard.to_dict()))))
+
+    def without_mean(summary):
+        return {key: value for key, value in summary.items() if key != "average_time"}
+
+    assert without_mean(merged.overall.summary()) == without_mean(whole.overall.summary())
+    assert merged.overall.latency.mean == pytest.approx(whole.overall.latency.mean)
+    assert merged.per_url.keys() == whole.per_url.keys()
+    for url, aggregate in whole.per_url.items():
+        assert merged.per_url[url].latency.counts == aggregate.latency.counts
+        assert (without_mean(merged.per_url[url].summary())
+                == without_mean(aggregate.summary()))
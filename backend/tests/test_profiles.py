@@ -0,0 +1,30 @@
+import pytest
+
+from engine.profiles import LoadProfile
+
+
+def test_spike_leaves_the_base_for_its_duration():
+    profile = LoadProfile({"shape": "spike", "base": 10, "peak": 100, "duration": 60,
+                           "spike_at": 20, "spike_duration": 10, "ramp": 5})
+    assert profile.total(10) == 10
+    assert profile.total(17.5) == 55
+    assert profile.total(25) == 100
+    assert profile.total(32.5) == 55
+    assert profile.total(50) == 10
+
+
+@pytest.mark.parametrize("spec, message", [
+    ({"shape": "spike", "base": 10, "peak": 100, "duration": 60}, "requires 'spike_duration'"),
+    ({"shape": "spike", "base": 10, "peak": 100, "duration": 60, "spike_duration": 0},
+     "'spike_duration' must be positive"),
+    ({"shape": "spike", "base": 10, "peak": 100, "duration": 60, "spike_duration": 5,
+      "spike_at": 90}, "'spike_at' must lie within"),
+    ({"shape": "spike", "base": 10, "peak": 100, "duration": 60, "spike_duration": 5,
+      "spike_at": -1}, "'spike_at' must not be negative"),
+    ({"shape": "sine", "mean": 50, "amplitude": 20, "period": 0, "duration": 60},
+     "'period' must be positive"),
+    ({"shape": "step", "levels": [1, 2], "step_duration": 0}, "'step_duration' must be positive"),
+])
+def test_invalid_profiles_are_rejected(spec, message):
+    with pytest.raises(ValueError, match=message):
+        LoadProfile(spec)
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from engine.sampling import UrlTable
+
+
+def _probabilities(table):
+    """Exact pick probability of each URL, from the alias table's slots."""
+    count = len(table)
+    probabilities = [0.0] * count
+    for slot in range(count):
+        probabilities[slot] += table._prob[slot] / count
+        probabilities[table._alias[slot]] += (1 - table._prob[slot]) / count
+    return probabilities
+
+
+@pytest.mark.parametrize("weights", [
+    [1, 1, 1, 1],
+    [1, 2, 3, 4, 5],
+    [1000, 1, 1, 1, 0.5],
+    [0, 3, 0, 1],
+    [random.Random(7).expovariate(1) for _ in range(500)],
+])
+def test_alias_table_picks_in_proportion_to_weight(weights):
+    table = UrlTable([f"http://example.com/{index}" for index in range(len(weights))], weights)
+    total = sum(weights)
+    for probability, weight in zip(_probabilities(table), weights):
+        assert probability == pytest.approx(weight / total, abs=1e-9)
+
+
+def test_sampled_frequencies_follow_the_weights(monkeypatch):
+    table = UrlTable(["http://a/", "http://b/", "http://c/"], [6, 3, 1])
+    draw = random.Random(1)
+    monkeypatch.setattr("engine.sampling.random", draw.random)
+    picks = [table.pick() for _ in range(100_000)]
+    for url, share in (("http://a/", 0.6), ("http://b/", 0.3), ("http://c/", 0.1)):
+        assert picks.count(url) / len(picks) == pytest.approx(share, abs=0.01)
+
+
+def test_zero_weight_urls_are_never_picked():
+    table = UrlTable(["http://a/", "http://never/"], [1, 0])
+    assert {table.pick() for _ in range(1000)} == {"http://a/"}
+
+
+@pytest.mark.parametrize("weights, message", [
+    ([1], "one weight per URL"),
+    ([1, -1], "not negative"),
+    ([0, 0], "positive weight"),
+])
+def test_invalid_weights_are_rejected(weights, message):
+    with pytest.raises(ValueError, match=message):
+        UrlTable(["http://a/", "http://b/"], weights)
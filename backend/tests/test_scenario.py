@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from engine.async_runner import run_phase_async
+from engine.metrics import MetricsRecorder
+from engine.scenario import ScenarioPlan, UnsafeValue
+
+REFUSED = "http://127.0.0.1:9"  # Nothing listens on the discard port
+
+
+def test_undefined_variable_is_rejected_at_compile_time():
+    with pytest.raises(ValueError, match="undefined variables: missing"):
+        ScenarioPlan({"steps": [{"url": f"{REFUSED}/x/${{missing}}"}]})
+
+
+def test_variables_user_iteration_and_extract_targets_are_defined():
+    ScenarioPlan({
+        "variables": {"tenant": "acme"},
+        "setup": [{"url": f"{REFUSED}/login", "extract": {"token": {"from": "header", "name": "X-Token"}}}],
+        "steps": [{"url": f"{REFUSED}/${{tenant}}/${{user}}/${{iteration}}",
+                   "headers": {"Authorization": "Bearer ${token}"}}],
+    })
+
+
+def test_failed_setup_extraction_does_not_hang_the_phase():
+    # The setup request fails, so `token` is never set and every journey
+    # step fails before sending anything
+    plan = ScenarioPlan({
+        "setup": [{"url": f"{REFUSED}/login", "extract": {"token": {"from": "header", "name": "X-Token"}}}],
+        "steps": [{"url": f"{REFUSED}/items?token=${{token}}"}],
+    })
+
+    async def run():
+        return await asyncio.wait_for(
+            run_phase_async(plan.urls, 2, 0.5, request_timeout=1,
+                            recorder=MetricsRecorder(keep_raw=False), plan=plan), 10)
+
+    recorder = asyncio.run(run())
+    assert recorder.overall.total == 4  # Per user: the failed setup and one unsent step
+    assert recorder.overall.success == 0
+
+
+def test_values_cannot_add_lines_to_the_request_head():
+    plan = ScenarioPlan({"variables": {"token": "abc", "id": "1", "query": ""}, "steps": [
+        {"url": "http://example.com/items/${id}?q=${query}",
+         "headers": {"Authorization": "Bearer ${token}"}}]})
+    step = plan.journeys[0][0]
+    head = step.render({"id": "1 HTTP/1.1\r\nX-Injected: yes", "query": "a b", "token": "abc"})
+    request_line, rest = head.split(b"\r\n", 1)
+    assert request_line == (b"GET /items/1%20HTTP/1.1%0D%0AX-Injected:%20yes?q=a%20b HTTP/1.1")
+    assert b"X-Injected" not in rest
+    with pytest.raises(UnsafeValue):
+        step.render({"id": "1", "query": "", "token": "abc\r\nX-Injected: yes"})
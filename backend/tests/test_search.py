@@ -0,0 +1,54 @@
+import pytest
+
+from config import SEARCH_MAX_STEPS, SEARCH_RESOLUTION
+from engine.search import BreakingPointSearch
+
+
+def _run(search, capacity):
+    """Stub phase runner: p95 blows the SLO once the level is past `capacity`."""
+    levels = []
+    for number, step in enumerate(search.steps(), start=1):
+        level = step if search.model == "concurrency" else step["rate"]
+        levels.append(level)
+        search.record({"phase": number, "requests": 1000, "error_count": 0,
+                       "percentiles": {"p95": 0.1 if level <= capacity else 2.0}})
+    return levels
+
+
+# With the default growth and resolution, ramping plus bisecting fits in
+# SEARCH_MAX_STEPS while capacity is within ~2^7 of the start level
+@pytest.mark.parametrize("model,start,capacity", [
+    ("concurrency", 10, 37),
+    ("concurrency", 10, 1000),
+    ("concurrency", 50, 4999),
+    ("rate", 10, 12.5),
+    ("rate", 10, 730.0),
+    ("rate", 0.5, 3.3),
+])
+def test_search_converges_to_the_resolution_within_max_steps(model, start, capacity):
+    search = BreakingPointSearch({"model": model, "start": start})
+    levels = _run(search, capacity)
+
+    assert search.stopped == "converged"
+    assert len(levels) <= SEARCH_MAX_STEPS
+    knee = search.report()["knee"]["level"]
+    assert knee <= capacity < search.failing
+    assert search.failing - knee <= max(knee * SEARCH_RESOLUTION,
+                                        1 if model == "concurrency" else 0)
+    # Nothing after the first failure pushes harder than it did
+    first_failure = next(level for level in levels if level > capacity)
+    assert max(levels[levels.index(first_failure):]) == first_failure
+
+
+def test_search_stops_at_max_steps_before_converging():
+    search = BreakingPointSearch({"model": "rate", "start": 1, "resolution": 1e-9})
+    levels = _run(search, 5000.0)
+    assert search.stopped == "max_steps"
+    assert len(levels) == SEARCH_MAX_STEPS
+
+
+def test_search_reports_no_knee_when_the_first_step_fails():
+    search = BreakingPointSearch({"start": 10})
+    assert _run(search, 5) == [10]
+    assert search.stopped == "failed_at_start"
+    assert search.report()["knee"] is None
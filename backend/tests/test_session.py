@@ -0,0 +1,57 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from engine.session import LoadSession
+
+
+class _Recorder(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.server.requests.append((self.command, self.path))
+        if self.path.startswith("/slow"):
+            time.sleep(3)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def target():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Recorder)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_thread_prewarm_only_requests_urls_of_the_test(target):
+    base = f"http://127.0.0.1:{target.server_address[1]}"
+    session = LoadSession(engine="thread")
+    try:
+        opened = session.prewarm([f"{base}/first?q=1", f"{base}/second"], connections=3)
+    finally:
+        session.close()
+    assert opened == 3
+    assert target.requests == [("HEAD", "/first?q=1")] * 3
+
+
+def test_thread_prewarm_leaves_nothing_running_past_its_timeout(target):
+    base = f"http://127.0.0.1:{target.server_address[1]}"
+    session = LoadSession(engine="thread")
+    try:
+        start = time.perf_counter()
+        opened = session.prewarm([f"{base}/slow"], connections=2, timeout=0.5)
+        # prewarm waits for every request, so they all gave up by its timeout
+        elapsed = time.perf_counter() - start
+    finally:
+        session.close()
+    assert opened == 0
+    assert elapsed < 1
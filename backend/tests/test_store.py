@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from engine.store import ResultStore, ResultStoreWriter
+
+
+def _result(index):
+    return {"url": f"http://example.com/{index % 3}", "latency": 0.01 * index,
+            "status_code": 200, "success": True}
+
+
+def test_store_is_readable_after_each_chunk_and_after_close(tmp_path):
+    path = str(tmp_path / "store")
+    writer = ResultStoreWriter(path, chunk_rows=4)
+    writer.start_phase()
+    for index in range(10):
+        writer.append(_result(index))
+    writer.flush()
+    with ResultStore(path) as store:
+        assert len(store) == 10
+        assert store.urls == [f"http://example.com/{index}" for index in range(3)]
+    writer.append({"url": "http://example.com/new", "latency": 0.5, "status_code": "error",
+                   "success": False, "error_kind": 1})
+    writer.close()
+    with ResultStore(path) as store:
+        assert len(store) == 11
+        assert store.urls[-1] == "http://example.com/new"
+        summary = store.summary()
+    assert summary["total_requests"] == 11 and summary["error_count"] == 1
+
+
+def test_a_url_line_still_being_written_is_ignored(tmp_path):
+    path = str(tmp_path / "store")
+    with ResultStoreWriter(path) as writer:
+        writer.append(_result(0))
+    with open(os.path.join(path, "urls.jsonl"), "a") as f:
+        f.write('"http://exa')
+    with ResultStore(path) as store:
+        assert store.urls == ["http://example.com/0"]
+
+
+def test_version_2_stores_with_urls_in_meta_still_open(tmp_path):
+    path = str(tmp_path / "store")
+    with ResultStoreWriter(path) as writer:
+        writer.append(_result(0))
+    meta_path = os.path.join(path, "meta.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta.update(version=2, urls=["http://example.com/legacy"])
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    os.remove(os.path.join(path, "urls.jsonl"))
+    with ResultStore(path) as store:
+        assert store.urls == ["http://example.com/legacy"]
+        assert store.summary()["total_requests"] == 1
+
+
+def test_close_raises_a_write_failure_once(tmp_path):
+    path = str(tmp_path / "store")
+    writer = ResultStoreWriter(path, chunk_rows=1)
+
+    def fail(buffers, new_urls):
+        raise OSError("disk full")
+
+    writer._write_chunk = fail
+    writer.append(_result(0))
+    with pytest.raises(OSError, match="disk full"):
+        writer.close()
+    assert writer.closed
+    writer.close()  # A second close does nothing instead of raising again
@@ -0,0 +1,42 @@
+import threading
+import time
+
+import engine.upload as upload
+from engine.upload import S3Uploader
+
+
+class _SlowS3:
+    def __init__(self):
+        self.release = threading.Event()
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.release.wait()
+        self.objects[Key] = Body
+
+
+def test_writers_wait_on_a_full_queue_and_the_wait_is_counted(monkeypatch):
+    s3 = _SlowS3()
+    monkeypatch.setattr(upload, "get_s3_client", lambda: s3)
+    uploader = S3Uploader("test/", bucket="bucket", max_items=1)
+    threading.Timer(0.3, s3.release.set).start()
+    for index in range(3):
+        uploader.put(f"object-{index}", b"data")
+    uploader.finish()
+    assert uploader.wait(5)
+    assert sorted(s3.objects) == ["test/object-0", "test/object-1", "test/object-2"]
+    assert uploader.wait_seconds > 0.1
+
+
+def test_a_failed_uploader_never_blocks_writers(monkeypatch):
+    def broken():
+        raise RuntimeError("no credentials")
+
+    monkeypatch.setattr(upload, "get_s3_client", broken)
+    uploader = S3Uploader("test/", bucket="bucket", max_items=1)
+    start = time.perf_counter()
+    for _ in range(5):
+        uploader.put("object", b"data")
+    uploader.finish()
+    assert uploader.wait(5) and uploader.failed
+    assert time.perf_counter() - start < 2
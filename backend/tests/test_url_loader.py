@@ -0,0 +1,130 @@
+import gzip
+import io
+import json
+
+import pytest
+
+import url_loader
+from url_loader import iter_json_array, load_scenario, load_url_table
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    data.mkdir()
+    monkeypatch.setattr(url_loader, "_DATA_DIR", str(data))
+    return data
+
+
+def test_scenarios_load_by_name_from_data(data_dir):
+    scenario = {"steps": [{"url": "http://example.com/"}]}
+    (data_dir / "journey.json").write_text(json.dumps(scenario))
+    assert load_scenario("journey.json") == scenario
+
+
+@pytest.mark.parametrize("name", [
+    "../secret.json", "/etc/passwd", "sub/journey.json", "..\\secret.json", "..", "", "missing.json",
+])
+def test_scenario_names_outside_data_are_refused(data_dir, name):
+    (data_dir.parent / "secret.json").write_text(json.dumps({"steps": [{"url": "http://x/"}]}))
+    with pytest.raises(ValueError, match="data/"):
+        load_scenario(name)
+
+
+def test_symlinks_out_of_data_are_refused(data_dir):
+    secret = data_dir.parent / "secret.json"
+    secret.write_text(json.dumps({"steps": [{"url": "http://x/"}]}))
+    (data_dir / "link.json").symlink_to(secret)
+    with pytest.raises(ValueError, match="data/"):
+        load_scenario("link.json")
+
+
+def test_url_sources_load_by_name_from_data(data_dir):
+    (data_dir / "urls.txt").write_text("http://example.com/a\nhttp://example.com/b\n")
+    assert sorted(load_url_table("urls.txt").urls) == ["http://example.com/a", "http://example.com/b"]
+
+
+@pytest.mark.parametrize("name", ["../urls.txt", "/etc/hosts", "sub/urls.txt", "missing.txt"])
+def test_url_source_names_outside_data_are_refused(data_dir, name):
+    (data_dir.parent / "urls.txt").write_text("http://example.com/\n")
+    with pytest.raises(ValueError, match="data/"):
+        load_url_table(name)
+
+
+def _read_all(text, key=None, read_size=1):
+    return list(iter_json_array(io.StringIO(text), key, read_size=read_size))
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5, 64])
+def test_json_array_items_survive_any_read_boundary(read_size):
+    text = ' [ "http://a/", {"url": "http://b/", "weight": 2.5}, 1.5, -3e-2, 10, true, null, [1, 2] ] '
+    assert _read_all(text, read_size=read_size) == [
+        "http://a/", {"url": "http://b/", "weight": 2.5}, 1.5, -0.03, 10, True, None, [1, 2]]
+
+
+def test_json_array_is_found_under_its_key():
+    text = '{"log": {"version": "1.2", "entries": [{"n": 1}, {"n": 2}], "pages": [3]}}'
+    assert _read_all(text, "entries", read_size=4) == [{"n": 1}, {"n": 2}]
+
+
+@pytest.mark.parametrize("text, message", [
+    ('{"urls": []}', "must contain a list"),
+    ('["http://a/", "http://b/"', "not terminated"),
+])
+def test_malformed_json_arrays_are_rejected(text, message):
+    with pytest.raises(ValueError, match=message):
+        _read_all(text, read_size=4)
+
+
+def test_json_sources_merge_repeated_urls_and_skip_invalid_ones(data_dir):
+    (data_dir / "urls.json").write_text(json.dumps([
+        "http://example.com/a", {"url": "http://example.com/b", "weight": 3},
+        "http://example.com/a#top", "ftp://example.com/", {"url": "http://example.com/c", "weight": 0}]))
+    table = load_url_table("urls.json")
+    assert dict(zip(table.urls, table.weights)) == {"http://example.com/a": 2.0,
+                                                    "http://example.com/b": 3.0}
+
+
+def test_har_sources_weigh_get_requests_by_count(data_dir):
+    entries = [{"request": {"method": method, "url": url}} for method, url in [
+        ("GET", "http://example.com/a"), ("POST", "http://example.com/form"),
+        ("GET", "http://example.com/a"), ("GET", "http://example.com/b")]]
+    with gzip.open(data_dir / "capture.har.gz", "wt") as f:
+        json.dump({"log": {"version": "1.2", "entries": entries}}, f)
+    table = load_url_table("capture.har.gz")
+    assert dict(zip(table.urls, table.weights)) == {"http://example.com/a": 2.0,
+                                                    "http://example.com/b": 1.0}
+
+
+def test_sitemap_sources_follow_an_index_to_local_sitemaps(data_dir):
+    namespace = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    (data_dir / "pages.xml").write_text(
+        f'<urlset {namespace}><url><loc>http://example.com/a</loc></url>'
+        f'<url><loc> http://example.com/b </loc></url></urlset>')
+    (data_dir / "sitemap.xml").write_text(
+        f'<sitemapindex {namespace}><sitemap><loc>http://example.com/pages.xml</loc></sitemap>'
+        f'<sitemap><loc>http://example.com/remote.xml</loc></sitemap></sitemapindex>')
+    assert load_url_table("sitemap.xml").urls == ["http://example.com/a", "http://example.com/b"]
+
+
+def test_line_sources_take_weights_and_json_objects(data_dir):
+    (data_dir / "urls.ndjson").write_text(
+        "# comment\nhttp://example.com/a 4\n\n"
+        '{"url": "http://example.com/b", "count": 2}\nhttp://example.com/c\n')
+    table = load_url_table("urls.ndjson")
+    assert dict(zip(table.urls, table.weights)) == {"http://example.com/a": 4.0,
+                                                    "http://example.com/b": 2.0,
+                                                    "http://example.com/c": 1.0}
+
+
+def test_sitemap_index_loops_are_read_once(data_dir):
+    namespace = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+    (data_dir / "self.xml").write_text(
+        f'<sitemapindex {namespace}><sitemap><loc>http://example.com/self.xml</loc></sitemap>'
+        f'<sitemap><loc>http://example.com/other.xml</loc></sitemap></sitemapindex>')
+    (data_dir / "other.xml").write_text(
+        f'<sitemapindex {namespace}><sitemap><loc>http://example.com/self.xml</loc></sitemap>'
+        f'<sitemap><loc>http://example.com/pages.xml</loc></sitemap></sitemapindex>')
+    (data_dir / "pages.xml").write_text(
+        f'<urlset {namespace}><url><loc>http://example.com/a</loc></url></urlset>')
+    assert load_url_table("self.xml").urls == ["http://example.com/a"]
@@ -3,7 +3,7 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "~/components/ui/card"
 import { Badge } from "~/components/ui/badge"
 import { Progress } from "~/components/ui/progress"
-import { Activity, Clock, TrendingUp, AlertCircle, CheckCircle2, Loader2 } from "lucide-react"
+import { Activity, Clock, TrendingUp, AlertCircle, CheckCircle2, Loader2, Square } from "lucide-react"
 import { useLiveTestTracking, type LiveTestData } from "~/hooks/useLiveTestTracking"
 
 export function LiveTracking() {
@@ -18,6 +18,13 @@ export function LiveTracking() {
             Running
           </Badge>
         )
+      case "queued":
+        return (
+          <Badge className="bg-amber-100 text-amber-700 hover:bg-amber-100">
+            <Clock className="mr-1 h-3 w-3" />
+            Queued
+          </Badge>
+        )
       case "completed":
         return (
           <Badge className="bg-green-100 text-green-700 hover:bg-green-100">
@@ -25,6 +32,13 @@ export function LiveTracking() {
             Completed
           </Badge>
         )
+      case "stopped":
+        return (
+          <Badge className="bg-gray-100 text-gray-700 hover:bg-gray-100">
+            <Square className="mr-1 h-3 w-3" />
+            Stopped
+          </Badge>
+        )
       case "failed":
         return (
           <Badge className="bg-red-100 text-red-700 hover:bg-red-100">
@@ -55,7 +69,11 @@ export function LiveTracking() {
         ? "Test Complete"
         : test.status === "failed"
           ? "Test Failed"
-          : "Waiting for data..."
+          : test.status === "stopped"
+            ? "Test Stopped"
+            : test.status === "queued"
+              ? `Queued${test.queuePosition ? ` at position ${test.queuePosition}` : ""}`
+              : "Waiting for data..."
 
     const metrics = test.currentPhase
       ? {
@@ -150,6 +168,21 @@ export function LiveTracking() {
               </div>
             </div>
           )}
+
+          {test.status === "running" && test.liveProgress && (
+            <div className="flex flex-wrap gap-x-6 gap-y-1 text-sm text-gray-600">
+              <span>Live: {test.liveProgress.rps.toLocaleString()} req/s</span>
+              <span>Errors: {test.liveProgress.error_rate.toFixed(1)}%</span>
+              <span>In flight: {test.liveProgress.in_flight.toLocaleString()}</span>
+              <span>
+                p50/p95/p99:{" "}
+                {[test.liveProgress.percentiles.p50, test.liveProgress.percentiles.p95, test.liveProgress.percentiles.p99]
+                  .map((v) => (v != null ? `${Math.round(v * 1000)}` : "-"))
+                  .join(" / ")}
+                ms
+              </span>
+            </div>
+          )}
         </CardContent>
       </Card>
     )
@@ -223,19 +256,17 @@ export function LiveTracking() {
                   </h2>
                 </div>
               )}
-              {tests
-                .filter((t) => t.status === "running")
-                .map((test) => renderTestCard(test))}
+              {runningTests.map((test) => renderTestCard(test))}
 
-              {tests.filter((t) => t.status !== "running").length > 0 && (
+              {tests.filter((t) => !runningTests.includes(t)).length > 0 && (
                 <div className="mt-8 mb-4">
                   <h2 className="text-lg font-semibold text-gray-900">
-                    Recent Tests ({tests.filter((t) => t.status !== "running").length})
+                    Recent Tests ({tests.filter((t) => !runningTests.includes(t)).length})
                   </h2>
                 </div>
               )}
               {tests
-                .filter((t) => t.status !== "running")
+                .filter((t) => !runningTests.includes(t))
                 .map((test) => renderTestCard(test))}
             </>
           )}
@@ -23,6 +23,9 @@ interface TestResultsProps {
       requests: number;
       avgResponseTime: number;
       successRate: number;
+      p50ResponseTime?: number;
+      p95ResponseTime?: number;
+      p99ResponseTime?: number;
       errors?: Array<{
         statusCode: number | string;
         message: string;
@@ -209,6 +212,14 @@ export const  TestResults: React.FC<TestResultsProps> = ({ results, phases }) =>
                       <span className="text-gray-600">Avg Time:</span>
                       <span className="ml-2 font-medium text-gray-900">{urlMetric.avgResponseTime || 0}ms</span>
                     </div>
+                    {urlMetric.p50ResponseTime != null && (
+                      <div className="col-span-2">
+                        <span className="text-gray-600">P50 / P95 / P99:</span>
+                        <span className="ml-2 font-medium text-gray-900">
+                          {urlMetric.p50ResponseTime}ms / {urlMetric.p95ResponseTime}ms / {urlMetric.p99ResponseTime}ms
+                        </span>
+                      </div>
+                    )}
                   </div>
                   {Array.isArray(urlMetric.errors) && urlMetric.errors.length > 0 && (
                     <div className="mt-3 border-t border-gray-200 pt-3">
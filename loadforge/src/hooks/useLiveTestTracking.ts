@@ -13,11 +13,27 @@ export interface TestProgress {
   test_id?: string;
 }
 
+export interface PhaseProgress {
+  phase: number;
+  total_phases: number;
+  window: number;
+  rps: number;
+  error_rate: number;
+  in_flight: number;
+  requests: number;
+  error_count: number;
+  percentiles: { p50?: number; p95?: number; p99?: number };
+}
+
 export interface TestEvent {
   type:
+    | "test_queued"
     | "test_started"
+    | "test_joined"
+    | "phase_progress"
     | "phase_complete"
     | "test_completed"
+    | "test_stopped"
     | "error"
     | "connected";
   data: any;
@@ -26,8 +42,10 @@ export interface TestEvent {
 export interface LiveTestData {
   test_id: string;
   name: string;
-  status: "running" | "completed" | "failed";
+  status: "queued" | "running" | "completed" | "stopped" | "failed";
+  queuePosition?: number | null;
   currentPhase: TestProgress | null;
+  liveProgress?: PhaseProgress | null;
   startTime: Date;
   error: string | null;
 }
@@ -120,7 +138,7 @@ export function useLiveTestTracking() {
     onData(trackedData) {
       const data = trackedData.data as TestEvent;
 
-      if (data.type === "test_started") {
+      if (data.type === "test_queued") {
         const testId = data.data.test_id;
         if (testId) {
           setTests((prev) => {
@@ -128,7 +146,27 @@ export function useLiveTestTracking() {
             newMap.set(testId, {
               test_id: testId,
               name: "", // Will be fetched
+              status: "queued",
+              queuePosition: data.data.position ?? null,
+              currentPhase: null,
+              startTime: new Date(),
+              error: null,
+            });
+            return newMap;
+          });
+          fetchTestName(testId);
+          setError(null);
+        }
+      } else if (data.type === "test_started") {
+        const testId = data.data.test_id;
+        if (testId) {
+          setTests((prev) => {
+            const newMap = new Map(prev);
+            newMap.set(testId, {
+              test_id: testId,
+              name: prev.get(testId)?.name ?? "", // Will be fetched
               status: "running",
+              queuePosition: null,
               currentPhase: null,
               startTime: new Date(),
               error: null,
@@ -138,6 +176,32 @@ export function useLiveTestTracking() {
           fetchTestName(testId);
           setError(null);
         }
+      } else if (data.type === "test_joined") {
+        // Rejoined after a reconnect: the test's events resume from here
+        const testId = data.data.test_id;
+        if (testId) {
+          setTests((prev) => {
+            const existing = prev.get(testId);
+            if (!existing) return prev;
+            const newMap = new Map(prev);
+            newMap.set(testId, { ...existing, status: data.data.status });
+            return newMap;
+          });
+        }
+      } else if (data.type === "phase_progress") {
+        const testId = data.data.test_id;
+        if (testId) {
+          setTests((prev) => {
+            const existing = prev.get(testId);
+            if (!existing) return prev;
+            const newMap = new Map(prev);
+            newMap.set(testId, {
+              ...existing,
+              liveProgress: data.data as PhaseProgress,
+            });
+            return newMap;
+          });
+        }
       } else if (data.type === "phase_complete") {
         const testId = data.data.test_id;
         if (testId) {
@@ -182,11 +246,28 @@ export function useLiveTestTracking() {
                 ...existing,
                 status: "completed",
                 currentPhase: null,
+                liveProgress: null,
               });
             }
             return newMap;
           });
         }
+      } else if (data.type === "test_stopped") {
+        const testId = data.data.test_id;
+        if (testId) {
+          setTests((prev) => {
+            const existing = prev.get(testId);
+            if (!existing) return prev;
+            const newMap = new Map(prev);
+            newMap.set(testId, {
+              ...existing,
+              status: "stopped",
+              queuePosition: null,
+              liveProgress: null,
+            });
+            return newMap;
+          });
+        }
       } else if (data.type === "error") {
         const testId = data.data.test_id;
         const errorMessage = data.data.error || "An unknown error occurred";
@@ -217,7 +298,7 @@ export function useLiveTestTracking() {
 
   // Convert Map to array for easier consumption
   const testsArray = Array.from(tests.values());
-  const runningTests = testsArray.filter((t) => t.status === "running");
+  const runningTests = testsArray.filter((t) => t.status === "running" || t.status === "queued");
   runningTests.reverse()
   const isTestRunning = runningTests.length > 0;
 
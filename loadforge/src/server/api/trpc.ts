@@ -4,6 +4,7 @@ import { ZodError } from "zod";
 import { eventBind } from "../socket/events.bind";
 import { onPhaseComplete } from "../socket/phase.complete";
 import { onTestComplete } from "../socket/test.complete";
+import { onTestStopped } from "../socket/test.stopped";
 import { db } from "../db/index";
 import { CreateWSSContextFnOptions } from "@trpc/server/adapters/ws";
 import { type CreateNextContextOptions } from "@trpc/server/adapters/next";
@@ -13,6 +14,7 @@ import { auth } from "~/lib/auth";
 eventBind();
 onPhaseComplete();
 onTestComplete();
+onTestStopped();
 function toHeaders(headers: IncomingHttpHeaders): Headers {
   const result = new Headers();
   for (const [key, value] of Object.entries(headers)) {
@@ -128,7 +128,7 @@ export const completeTests = createTable("load_test", {
   duration: integer("duration").notNull(), // in seconds
   ramp_up_time: integer("ramp_up_time").notNull(), // in seconds
   ramp_down_time: integer("ramp_down_time").notNull(), // in seconds
-  status: varchar("status", { length: 50 }).default("pending").notNull(), // pending, running, completed, failed
+  status: varchar("status", { length: 50 }).default("pending").notNull(), // pending, running, completed, stopped, failed
   created_at: timestamp("created_at")
     .default(sql`CURRENT_TIMESTAMP`)
     .notNull(),
@@ -1,24 +1,63 @@
 import { getSocket } from "./engine.socket";
 import { publish } from "./eventbus";
 
+// stop_token of every test this server started and has not seen end. A
+// reconnect gives the socket a new sid in no room, so on every connect the
+// tests are rejoined with their tokens or their events would stop arriving.
+const stopTokens = new Map<string, string>();
+
+const rememberTest = (data: any) => {
+  if (data?.test_id && data?.stop_token) {
+    stopTokens.set(data.test_id, data.stop_token);
+  }
+};
+
+const forgetTest = (data: any) => {
+  if (data?.test_id) {
+    stopTokens.delete(data.test_id);
+  }
+};
 
 export const eventBind = () => {
   const socket = getSocket();
 
+  socket.on("connect", () => {
+    for (const [testId, stopToken] of stopTokens) {
+      socket.emit("join_test", { test_id: testId, stop_token: stopToken });
+    }
+  });
+
   socket.on("connected", (data) => {
     publish({ type: "connected", data });
   });
 
+  socket.on("test_queued", (data) => {
+    rememberTest(data);
+    publish({ type: "test_queued", data });
+  });
   socket.on("test_started", (data) => {
+    rememberTest(data);
     publish({ type: "test_started", data });
   });
+  socket.on("test_joined", (data) => {
+    publish({ type: "test_joined", data });
+  });
+  socket.on("phase_progress", (data) => {
+    publish({ type: "phase_progress", data });
+  });
   socket.on("phase_complete", (data) => {
     publish({ type: "phase_complete", data });
   });
   socket.on("test_completed", (data) => {
+    forgetTest(data);
     publish({ type: "test_completed", data });
   });
+  socket.on("test_stopped", (data) => {
+    forgetTest(data);
+    publish({ type: "test_stopped", data });
+  });
   socket.on("error", (err) => {
+    forgetTest(err);
     publish({ type: "error", data: err });
   });
 };
@@ -35,55 +35,15 @@ export const onTestComplete = () => {
       const failedRequests = testData.error_count || 0;
       const userId = testData.user_id || "unknown_user";
 
-      const allPercentiles = phaseSummaries
-        .map((p: any) => p.percentiles || {})
-        .filter((p: any) => Object.keys(p).length > 0);
-
-      // Convert percentiles from seconds to milliseconds
-      const avgP50 =
-        allPercentiles.length > 0
-          ? secondsToMs(
-              allPercentiles.reduce(
-                (sum: number, p: any) => sum + (p.p50 || 0),
-                0
-              ) / allPercentiles.length
-            )
-          : 0;
-      const avgP95 =
-        allPercentiles.length > 0
-          ? secondsToMs(
-              allPercentiles.reduce(
-                (sum: number, p: any) => sum + (p.p95 || 0),
-                0
-              ) / allPercentiles.length
-            )
-          : 0;
-      const avgP99 =
-        allPercentiles.length > 0
-          ? secondsToMs(
-              allPercentiles.reduce(
-                (sum: number, p: any) => sum + (p.p99 || 0),
-                0
-              ) / allPercentiles.length
-            )
-          : 0;
-
-      // Extract all response times and convert from seconds to milliseconds
-      const allResponseTimes = phaseSummaries
-        .flatMap((p: any) =>
-          p.percentiles
-            ? [p.percentiles.p50, p.percentiles.p95, p.percentiles.p99].filter(
-                (t: any) => t != null
-              )
-            : []
-        )
-        .map((seconds: number) => secondsToMs(seconds));
-
-      const minResponseTime =
-        allResponseTimes.length > 0 ? Math.min(...allResponseTimes) : 0;
-      const maxResponseTime =
-        allResponseTimes.length > 0 ? Math.max(...allResponseTimes) : 0;
-      const avgResponseTime = avgP50; // Use P50 as average
+      // Whole-test latency stats come from the backend's merged histograms;
+      // percentiles of different phases cannot be averaged into a true one
+      const percentiles = testData.percentiles || {};
+      const p50 = secondsToMs(percentiles.p50 || 0);
+      const p95 = secondsToMs(percentiles.p95 || 0);
+      const p99 = secondsToMs(percentiles.p99 || 0);
+      const minResponseTime = secondsToMs(testData.min_time || 0);
+      const maxResponseTime = secondsToMs(percentiles.max || 0);
+      const avgResponseTime = secondsToMs(testData.average_time || 0);
 
       // Calculate requests per second
       const phaseLength = phaseSummaries[0]?.phase_length || 60;
@@ -117,6 +77,9 @@ export const onTestComplete = () => {
           requests: urlMetric.total_requests || 0,
           avgResponseTime: Math.round((urlMetric.average_time || 0) * 1000), // Convert to ms
           successRate: Number((urlMetric.success_rate || 0).toFixed(1)),
+          p50ResponseTime: secondsToMs(urlMetric.percentiles?.p50 || 0),
+          p95ResponseTime: secondsToMs(urlMetric.percentiles?.p95 || 0),
+          p99ResponseTime: secondsToMs(urlMetric.percentiles?.p99 || 0),
           errors: Array.isArray(urlMetric.errors)
             ? urlMetric.errors.map((e: any) => ({
                 statusCode: e.status_code,
@@ -153,9 +116,9 @@ export const onTestComplete = () => {
         avg_response_time: avgResponseTime,
         min_response_time: minResponseTime,
         max_response_time: maxResponseTime,
-        p50_response_time: avgP50,
-        p95_response_time: avgP95,
-        p99_response_time: avgP99,
+        p50_response_time: p50,
+        p95_response_time: p95,
+        p99_response_time: p99,
         requests_per_second: requestsPerSecond,
         url_breakdown: urlBreakdown,
         phase_metrics: phaseMetrics,
@@ -0,0 +1,20 @@
+import { subscribe } from "./eventbus";
+import { db } from "../db/index";
+import { completeTests } from "../db/schema";
+import { eq } from "drizzle-orm";
+
+export const onTestStopped = () => {
+  return subscribe(async (event) => {
+    if (event.type !== "test_stopped" || !event.data?.test_id) return;
+
+    try {
+      await db
+        .update(completeTests)
+        .set({ status: "stopped", completed_at: new Date() })
+        .where(eq(completeTests.id, event.data.test_id));
+      console.log(`✅ [DB] Test ${event.data.test_id} marked stopped`);
+    } catch (error: any) {
+      console.error("❌ [DB] Failed to mark test stopped:", error?.message);
+    }
+  });
+};